@@ -0,0 +1,286 @@
+import argparse
+import glob
+import json
+import math
+import os
+import pathlib
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+import ocr_core
+
+#File extensions picked up when a directory is given as input
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".bmp", ".gif", ".tif", ".tiff", ".webp", ".pbm", ".pgm", ".ppm", ".pdf"}
+#Number of jobs submitted per worker process before waiting for results, bounds memory of in-flight work
+JOBS_PER_WORKER = 2
+#Worker crashes an image may cause while it is read on its own before it is reported as failed
+MAX_CRASHES = 2
+
+#OCR engine of the current worker process, created once by init_worker
+worker_engine = None
+
+
+def build_parser(default_lang) -> argparse.ArgumentParser:
+    """Return parser of the command-line arguments for batch mode."""
+    parser = argparse.ArgumentParser(prog="screenshot_ocr.py",
+                                     description="Run without arguments to open the GUI. "
+                                                 "Give image files, globs or directories to OCR them without the GUI.")
+    parser.add_argument("inputs", nargs="+", help="image files, glob patterns or directories")
+    parser.add_argument("-l", "--lang", default=default_lang,
+                        help=f"Tesseract language parameters, e.g. 'eng+deu' (default: {default_lang})")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1,
+                        help="number of OCR worker processes (default: number of cores)")
+    parser.add_argument("-r", "--recursive", action="store_true", help="also read images in subdirectories")
+    parser.add_argument("--preprocess", metavar="STAGES",
+                        help="comma separated preprocessing stages (grayscale, invert, upscale, threshold), "
+                             "'' for none (default: stages saved for the language parameters)")
+    output = parser.add_mutually_exclusive_group()
+    output.add_argument("--jsonl", metavar="FILE", help="append one JSON object per image to FILE (default: stdout)")
+    output.add_argument("--txt-dir", metavar="DIR", help="save the output of every image as a .txt file in DIR")
+    parser.add_argument("--manifest", metavar="FILE",
+                        help="progress file used to skip already read images after a crash "
+                             "(default: FILE.progress for --jsonl, DIR/.ssocr-progress for --txt-dir)")
+    return parser
+
+
+def collect_files(inputs, recursive=False) -> list:
+    """Return sorted list of image paths from files, glob patterns and directories."""
+    files = []
+    for item in inputs:
+        path = pathlib.Path(item)
+        if path.is_dir():
+            pattern = "**/*" if recursive else "*"
+            files += [p for p in path.glob(pattern) if p.is_file() and p.suffix.lower() in IMAGE_EXTENSIONS]
+        elif path.is_file():
+            files.append(path)
+        else:
+            files += [pathlib.Path(p) for p in glob.glob(item, recursive=recursive) if os.path.isfile(p)]
+    #Remove duplicates while keeping a stable order
+    return sorted({str(p.resolve()): p for p in files}.values())
+
+
+def read_manifest(manifest_path) -> set:
+    """Return set of image paths already recorded as done in the progress manifest."""
+    if manifest_path is None or not pathlib.Path(manifest_path).exists():
+        return set()
+    with open(manifest_path, encoding="utf-8") as file:
+        return {line.rstrip("\n") for line in file if line.strip()}
+
+
+def init_worker(config_path):
+    """Create the OCR engine of a worker process from the settings in config.ini."""
+    global worker_engine
+    #Every worker process is already one reader, so the "pool" engine's pool_engine is used directly
+    worker_engine = ocr_core.create_engine(ocr_core.load_config(config_path), allow_pool=False)
+    if getattr(worker_engine, "fallback_reason", None) is not None:
+        print(worker_engine.fallback_reason, file=sys.stderr)
+
+
+def ocr_file(path, lang, preprocess_stages=()) -> dict:
+    """Read image file at path in a worker process and return result with timing."""
+    start_time = time.perf_counter()
+    try:
+        #Every page of PDFs and multi-page images is read, one decoded page at a time
+        text = ocr_core.read_file(path, lang, worker_engine, preprocess_stages=preprocess_stages)
+        error = None
+    except Exception as e:
+        text = ""
+        error = str(e) or type(e).__name__
+    return {"path": path, "lang": lang, "text": text, "error": error, "seconds": time.perf_counter() - start_time}
+
+
+class OcrProcessPool:
+    """
+    Pool of worker processes reading image files with ocr_file, which survives worker processes crashing.
+
+    A crashing worker breaks the whole pool and every file in flight fails with it, though only one of them caused
+    it. Those files are read again one at a time before new ones are taken, and only a file that crashes its worker
+    while it is the only one being read is charged with the crash. After max_crashes of those it is reported as
+    failed, the others are read normally.
+    """
+    def __init__(self, workers, config_path, lang, preprocess_stages=(), max_crashes=MAX_CRASHES):
+        self.workers = max(1, workers)
+        self.config_path = config_path
+        self.lang = lang
+        self.preprocess_stages = preprocess_stages
+        self.max_crashes = max_crashes
+        self.executor = self.create_executor()
+        #Files being read (k = Future, v = path)
+        self.in_flight = {}
+        #Files in flight when the pool broke, read one at a time before new files are submitted
+        self.suspects = deque()
+        #Number of crashes every suspect caused while it was read on its own
+        self.crashes = {}
+
+    def create_executor(self) -> ProcessPoolExecutor:
+        """Return new pool of worker processes."""
+        return ProcessPoolExecutor(self.workers, initializer=init_worker, initargs=(self.config_path,))
+
+    def wants_more(self) -> bool:
+        """Return True if another file may be submitted without piling up work in memory."""
+        return not self.suspects and len(self.in_flight) < self.workers * JOBS_PER_WORKER
+
+    def busy(self) -> bool:
+        """Return True if files are being read or waiting to be read again."""
+        return bool(self.in_flight or self.suspects)
+
+    def submit(self, path):
+        """Start reading image file at path."""
+        self.in_flight[self.executor.submit(ocr_file, path, self.lang, self.preprocess_stages)] = path
+
+    def error_result(self, path, error) -> dict:
+        """Return result of file at path that could not be read, in the format of ocr_file."""
+        return {"path": path, "lang": self.lang, "text": "", "error": error, "seconds": 0.0}
+
+    def wait(self, timeout=None) -> list:
+        """Wait up to timeout seconds (None for no limit) for files to be read, return results of the finished ones."""
+        if self.suspects and not self.in_flight:
+            self.submit(self.suspects.popleft())
+        finished = wait(self.in_flight, timeout, return_when=FIRST_COMPLETED)[0]
+        if any(isinstance(future.exception(), BrokenProcessPool) for future in finished):
+            return self.recover()
+        results = []
+        for future in finished:
+            path = self.in_flight.pop(future)
+            if future.exception() is not None:
+                results.append(self.error_result(path, str(future.exception()) or type(future.exception()).__name__))
+            else:
+                self.crashes.pop(path, None)
+                results.append(future.result())
+        return results
+
+    def recover(self) -> list:
+        """Start a new pool after a worker crashed, return results of the files that were read before it did."""
+        #Every file in flight fails with the broken pool, wait for all of them so the pool is only replaced once
+        wait(self.in_flight)
+        alone = len(self.in_flight) == 1
+        results = []
+        for future, path in self.in_flight.items():
+            if future.exception() is None:
+                self.crashes.pop(path, None)
+                results.append(future.result())
+            elif not alone:
+                self.suspects.append(path)
+            else:
+                #Nothing else was being read, so this file crashed the worker
+                self.crashes[path] = self.crashes.get(path, 0) + 1
+                if self.crashes[path] >= self.max_crashes:
+                    del self.crashes[path]
+                    results.append(self.error_result(path, "OCR worker process crashed while reading the file"))
+                else:
+                    self.suspects.append(path)
+        self.in_flight.clear()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.executor = self.create_executor()
+        return results
+
+    def close(self) -> list:
+        """Stop the worker processes, dropping files not read yet, return results of the files read meanwhile."""
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        results = [future.result() for future in self.in_flight
+                   if not future.cancelled() and future.exception() is None]
+        self.in_flight.clear()
+        self.suspects.clear()
+        return results
+
+
+def percentile(values, fraction) -> float:
+    """Return value at fraction (0-1) of sorted values using nearest rank."""
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, math.ceil(fraction * len(values)) - 1))
+    return values[index]
+
+
+def main(argv=None, config_path=ocr_core.CONFIG_PATH) -> int:
+    """Read images given on the command line with a pool of worker processes, return exit code."""
+    import ocr_preprocess
+    config = ocr_core.load_config(config_path)
+    args = build_parser(ocr_core.get_default_lang_param(config)).parse_args(argv)
+    files = collect_files(args.inputs, args.recursive)
+    if args.preprocess is None:
+        preprocess_stages = ocr_core.get_preprocess_stages(config, args.lang)
+    else:
+        preprocess_stages = ocr_preprocess.parse_stages(args.preprocess)
+
+    manifest_path = args.manifest
+    if manifest_path is None and args.jsonl:
+        manifest_path = f"{args.jsonl}.progress"
+    elif manifest_path is None and args.txt_dir:
+        manifest_path = str(pathlib.Path(args.txt_dir) / ".ssocr-progress")
+    done = read_manifest(manifest_path)
+    pending = [str(p.resolve()) for p in files if str(p.resolve()) not in done]
+    skipped = len(files) - len(pending)
+    print(f"{len(pending)} images to read ({skipped} already done)", file=sys.stderr)
+
+    if args.txt_dir:
+        pathlib.Path(args.txt_dir).mkdir(parents=True, exist_ok=True)
+    output = open(args.jsonl, "a", encoding="utf-8") if args.jsonl else sys.stdout
+    manifest = open(manifest_path, "a", encoding="utf-8") if manifest_path else None
+
+    latencies = []
+    failed = 0
+
+    def finish(result):
+        """Write result of one image to the outputs and the manifest."""
+        nonlocal failed
+        latencies.append(result["seconds"])
+        if result["error"] is not None:
+            failed += 1
+            print(f"{result['path']}: {result['error']}", file=sys.stderr)
+        if args.txt_dir:
+            if result["error"] is None and result["text"] != "":
+                #Same naming as text files saved from the GUI
+                date_string = ocr_core.get_time_string()
+                txt_path = pathlib.Path(args.txt_dir) / f"{date_string}.txt"
+                counter = 1
+                while txt_path.exists():
+                    #Clock resolution can give several images the same timestamp
+                    txt_path = pathlib.Path(args.txt_dir) / f"{date_string}-{counter}.txt"
+                    counter += 1
+                with open(txt_path, "w", encoding="utf-8") as file:
+                    file.write(result["text"])
+        else:
+            output.write(json.dumps(result, ensure_ascii=False) + "\n")
+            output.flush()
+        if manifest is not None and result["error"] is None:
+            #Only successful images are skipped when resuming, failed ones are retried
+            manifest.write(result["path"] + "\n")
+            manifest.flush()
+
+    start_time = time.perf_counter()
+    workers = max(1, args.workers)
+    pool = OcrProcessPool(workers, config_path, args.lang, preprocess_stages)
+    try:
+        queue = iter(pending)
+        while True:
+            #Keep a bounded number of jobs submitted so huge batches don't pile up in memory
+            while pool.wants_more():
+                path = next(queue, None)
+                if path is None:
+                    break
+                pool.submit(path)
+            if not pool.busy():
+                break
+            for result in pool.wait():
+                finish(result)
+    finally:
+        pool.close()
+        if output is not sys.stdout:
+            output.close()
+        if manifest is not None:
+            manifest.close()
+
+    elapsed = time.perf_counter() - start_time
+    latencies.sort()
+    print(f"Read {len(latencies)} images in {elapsed:.2f} s with {workers} workers "
+          f"({len(latencies) / elapsed if elapsed > 0 else 0:.2f} images/s), {failed} failed\n"
+          f"Latency p50: {percentile(latencies, 0.5) * 1000:.0f} ms, p95: {percentile(latencies, 0.95) * 1000:.0f} ms",
+          file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+"""
+Measure search latency of the OCR history with a large number of entries.
+
+A history file is filled with synthetic OCR results (random sentences from a fixed vocabulary, like snippets of
+screen text) unless it already holds enough, then prefix, word and phrase searches as typed in the history panel
+are timed. p50/p95/max latency of every kind of search is printed as JSON. Run from the repository root:
+    python benchmarks/bench_history.py [--entries 1000000] [--path bench_history.sqlite] [--runs 50]
+"""
+import argparse
+import json
+import pathlib
+import random
+import sys
+import time
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from batch_ocr import percentile
+from ocr_history import OcrHistory
+
+#Words the synthetic results are made of, common ones are drawn far more often than rare ones
+VOCABULARY = ("the of and to in is for on that with as are this be by from at or an it not your can all will have "
+              "error warning file open save settings window screen text image page line column value total invoice "
+              "number date customer account password update download install version system network server "
+              "connection request response timeout failed success message report order payment address "
+              "receipt shipping quantity price amount balance transfer reference signature document").split()
+#Searches timed, as they would be typed (the last word is matched as a prefix)
+SEARCHES = {
+    "prefix_2": ["in", "co", "pa", "re"],
+    "prefix_4": ["invo", "conn", "paym", "tran"],
+    "word": ["invoice ", "timeout ", "signature ", "balance "],
+    "two_words": ["payment fail", "server timeo", "invoice num", "account bala"],
+    "phrase": ['"invoice number"', '"connection failed"', '"shipping address"', '"update version"'],
+    "rare": ["xylophone", "quartz"],
+}
+
+
+def random_text(rng) -> str:
+    """Return a few lines of random words, weighted so early vocabulary words are the most common."""
+    lines = []
+    for _ in range(rng.randint(1, 4)):
+        words = rng.choices(VOCABULARY, weights=[1 / (rank + 1) for rank in range(len(VOCABULARY))],
+                            k=rng.randint(3, 12))
+        lines.append(" ".join(words))
+    return "\n".join(lines)
+
+
+def fill(history, entries, seed=0):
+    """Add synthetic entries until history holds entries of them."""
+    rng = random.Random(seed)
+    count = history.count()
+    db = history.connect()
+    start_time = time.perf_counter()
+    now = time.time()
+    while count < entries:
+        batch = [(now - (entries - index), "eng", "snippet", None, random_text(rng))
+                 for index in range(count, min(entries, count + 10000))]
+        OcrHistory.write(db, batch)
+        count += len(batch)
+    db.close()
+    return time.perf_counter() - start_time
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--entries", type=int, default=1000000, help="entries in the history (default: 1000000)")
+    parser.add_argument("--path", default="bench_history.sqlite", help="history file, reused between runs")
+    parser.add_argument("--runs", type=int, default=50, help="timed runs of every search (default: 50)")
+    parser.add_argument("--limit", type=int, default=100, help="results per search, like the history panel")
+    args = parser.parse_args()
+
+    history = OcrHistory(args.path)
+    try:
+        fill_seconds = fill(history, args.entries)
+        results = {}
+        for kind, searches in SEARCHES.items():
+            durations = []
+            for search in searches:
+                #The first search of a term warms the page cache like earlier keystrokes would
+                history.search(search, args.limit)
+                for _ in range(args.runs):
+                    start_time = time.perf_counter()
+                    matches = history.search(search, args.limit)
+                    durations.append(time.perf_counter() - start_time)
+            durations.sort()
+            results[kind] = {"searches": searches, "last_matches": len(matches),
+                             "p50_ms": percentile(durations, 0.5) * 1000, "p95_ms": percentile(durations, 0.95) * 1000,
+                             "max_ms": durations[-1] * 1000}
+        print(json.dumps({"entries": history.count(), "fill_seconds": fill_seconds, "results": results}, indent=1))
+    finally:
+        history.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
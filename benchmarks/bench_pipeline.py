@@ -0,0 +1,298 @@
+"""
+Measure every stage between releasing the snippet rubber band and the text showing up, and of reading a file.
+
+Synthetic text images are rendered with PIL at several sizes, fonts and language combinations and driven through
+the same stages the GUI runs, on the offscreen Qt platform. Per-stage p50/p95/max and peak RSS are written as JSON
+so results can be diffed across versions. Run from the repository root:
+    python benchmarks/bench_pipeline.py [--engine pipe] [--tesseract PATH] [--runs 10] [--output results.json]
+
+Without a working Tesseract installation use --no-ocr to measure every stage except reading the text.
+"""
+import argparse
+import json
+import os
+import pathlib
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QGuiApplication, QImage, QPixmap
+from PyQt5.QtWidgets import QApplication, QLabel, QPlainTextEdit
+from PIL import Image, ImageDraw, ImageFont
+import ocr_engine
+import ocr_preprocess
+import page_reader
+from batch_ocr import percentile
+from qimage_convert import qimage_to_pil
+from save_writer import SaveWriter
+
+#Image sizes rendered (width, height), from a single line snippet to a full screen
+SIZES = [(480, 120), (1280, 400), (1920, 1080)]
+#Font families rendered, each with the font files tried in order (Windows, then common Linux and macOS fonts)
+FONTS = {
+    "sans": ("arial.ttf", "DejaVuSans.ttf", "Arial.ttf"),
+    "serif": ("times.ttf", "DejaVuSerif.ttf", "Times New Roman.ttf"),
+    "mono": ("cour.ttf", "DejaVuSansMono.ttf", "Courier New.ttf"),
+}
+#Language parameters rendered, lines alternate between the languages of a combination
+LANGS = ["eng", "eng+deu"]
+#Sample sentence for each language
+SAMPLE_TEXT = {
+    "eng": "The quick brown fox jumps over the lazy dog 0123456789",
+    "deu": "Falsches Üben von Xylophonmusik quält jeden größeren Zwerg",
+    "fra": "Portez ce vieux whisky au juge blond qui fume à Noël",
+    "spa": "El veloz murciélago hindú comía feliz cardillo y kiwi",
+}
+#Height of the rendered text in pixels
+FONT_SIZE = 18
+#Stages of the snippet pipeline in the order they run, followed by the file pipeline
+STAGES = ("grab", "convert", "preprocess", "ocr", "set_text", "clipboard", "autosave_submit", "autosave_write",
+          "file_decode", "file_ocr")
+
+
+def load_font(family):
+    """Return (FreeTypeFont, file name) for font family, or PIL's default font if none of its files are found."""
+    for file_name in FONTS[family]:
+        try:
+            return ImageFont.truetype(file_name, FONT_SIZE), file_name
+        except OSError:
+            continue
+    return ImageFont.load_default(FONT_SIZE), "default"
+
+
+def render_text_image(width, height, font, lang) -> Image.Image:
+    """Return RGB image of lines of sample text in the languages of the language parameter."""
+    image = Image.new("RGB", (width, height), (255, 255, 255))
+    draw = ImageDraw.Draw(image)
+    langs = [SAMPLE_TEXT.get(code, SAMPLE_TEXT["eng"]) for code in lang.split("+")]
+    line_height = int(FONT_SIZE * 1.6)
+    for line, y in enumerate(range(10, height - line_height + 1, line_height)):
+        draw.text((10, y), langs[line % len(langs)], fill=(0, 0, 0), font=font)
+    return image
+
+
+def pil_to_pixmap(image) -> QPixmap:
+    """Return QPixmap with the pixels of RGB PIL Image."""
+    data = image.tobytes("raw", "RGB")
+    qimage = QImage(data, image.width, image.height, image.width * 3, QImage.Format_RGB888)
+    #copy() detaches the QImage from data, which is freed when this function returns
+    return QPixmap.fromImage(qimage.copy())
+
+
+def get_peak_rss() -> int:
+    """Return peak resident set size of this process in bytes, or 0 if it can't be measured."""
+    try:
+        import resource
+    except ImportError:
+        return get_peak_rss_windows()
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    #Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def get_peak_rss_windows() -> int:
+    """Return peak working set of this process in bytes on Windows, or 0 if it can't be measured."""
+    import ctypes
+    from ctypes import wintypes
+
+    class ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                    ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                    ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                    ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+    try:
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return 0
+        return counters.PeakWorkingSetSize
+    except (AttributeError, OSError):
+        return 0
+
+
+def get_version() -> str:
+    """Return git description of the measured tree, or "unknown" outside a git checkout."""
+    try:
+        result = subprocess.run(["git", "describe", "--always", "--dirty"], cwd=ROOT, capture_output=True, text=True)
+    except OSError:
+        return "unknown"
+    return result.stdout.strip() or "unknown"
+
+
+class PipelineBench:
+    """Drives the stages of the snippet and file pipelines on offscreen widgets and records their timings."""
+    def __init__(self, engine, preprocess_stages, save_folder):
+        self.engine = engine
+        #Language parameters of the case being run
+        self.lang = None
+        self.preprocess_stages = preprocess_stages
+        self.save_folder = save_folder
+        #Shows the rendered image so it can be grabbed like a part of the screen
+        self.label = QLabel()
+        self.label.setWindowFlags(Qt.FramelessWindowHint)
+        self.label.move(0, 0)
+        self.textbox = QPlainTextEdit()
+        self.textbox.resize(500, 200)
+        self.textbox.show()
+        self.save_writer = SaveWriter()
+        self.save_errors = []
+        self.save_writer.on_error = lambda path, error: self.save_errors.append(f"{path}: {error}")
+        self.counter = 0
+
+    def show_image(self, image):
+        """Show PIL Image in the grabbed window at its native size."""
+        self.label.setPixmap(pil_to_pixmap(image))
+        self.label.resize(image.width, image.height)
+        self.label.show()
+        QApplication.processEvents()
+
+    def grab(self, width, height) -> QPixmap:
+        """Capture the shown image the way CreateSnippet does, falling back to rendering the widget."""
+        screen = QGuiApplication.primaryScreen()
+        pixmap = screen.grabWindow(self.label.winId(), 0, 0, width, height)
+        if pixmap.isNull() or pixmap.width() < width or pixmap.height() < height:
+            #Some platforms (e.g. offscreen) can't read back window contents
+            pixmap = self.label.grab()
+        return pixmap
+
+    def run_once(self, image, file_path, ocr) -> dict:
+        """Run every stage once on PIL Image (already shown) and the same image saved at file_path."""
+        timings = {}
+
+        def timed(stage, function, *args):
+            start = time.perf_counter()
+            result = function(*args)
+            timings[stage] = time.perf_counter() - start
+            return result
+
+        pixmap = timed("grab", self.grab, image.width, image.height)
+        pil_image = timed("convert", lambda: qimage_to_pil(pixmap.toImage()))
+        if self.preprocess_stages:
+            pil_image = timed("preprocess", lambda: ocr_preprocess.preprocess(pil_image, self.preprocess_stages)[0])
+        text = timed("ocr", self.engine.image_to_string, pil_image, self.lang).strip() if ocr else SAMPLE_TEXT["eng"]
+
+        def set_text():
+            self.textbox.setPlainText(text)
+            #Include layout and painting of the new text
+            QApplication.processEvents()
+        timed("set_text", set_text)
+        timed("clipboard", QApplication.clipboard().setText, text)
+
+        self.counter += 1
+        snapshot = pixmap.toImage()
+
+        def submit():
+            self.save_writer.save_text(self.save_folder, f"bench-{self.counter}.txt", text)
+            self.save_writer.save_image(self.save_folder, f"bench-{self.counter}.png", snapshot)
+        timed("autosave_submit", submit)
+        timed("autosave_write", self.save_writer.flush)
+        timings["autosave_write"] += timings["autosave_submit"]
+
+        page = timed("file_decode", lambda: next(page_reader.iter_pages(file_path)))
+        if ocr:
+            timed("file_ocr", self.engine.image_to_string, page, self.lang)
+        return timings
+
+    def run_case(self, image, lang, runs, ocr) -> dict:
+        """Return per-stage p50/p95/max in milliseconds over runs of the pipelines on PIL Image."""
+        self.lang = lang
+        self.show_image(image)
+        file_path = os.path.join(self.save_folder, "input.png")
+        image.save(file_path)
+        #Untimed warm-up run (loads language models, fonts and codecs)
+        self.run_once(image, file_path, ocr)
+        samples = {}
+        for _ in range(runs):
+            for stage, seconds in self.run_once(image, file_path, ocr).items():
+                samples.setdefault(stage, []).append(seconds)
+        stages = {}
+        for stage in STAGES:
+            if stage not in samples:
+                continue
+            values = sorted(samples[stage])
+            stages[stage] = {"p50_ms": round(percentile(values, 0.5) * 1000, 3),
+                             "p95_ms": round(percentile(values, 0.95) * 1000, 3),
+                             "max_ms": round(values[-1] * 1000, 3)}
+        return stages
+
+    def close(self):
+        """Stop the save writer."""
+        self.save_writer.close()
+
+
+def main() -> int:
+    """Run every case and write the results as JSON."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--engine", default="pytesseract", help="OCR engine (pytesseract, pipe or capi)")
+    parser.add_argument("--tesseract", default="tesseract", help="path to the Tesseract executable")
+    parser.add_argument("--langs", nargs="+", default=LANGS, help=f"language parameters (default: {' '.join(LANGS)})")
+    parser.add_argument("--fonts", nargs="+", default=list(FONTS), choices=list(FONTS), help="font families")
+    parser.add_argument("--sizes", nargs="+", default=[f"{w}x{h}" for w, h in SIZES],
+                        help="image sizes as WIDTHxHEIGHT")
+    parser.add_argument("--preprocess", default="", metavar="STAGES",
+                        help="comma separated preprocessing stages applied before OCR (default: none)")
+    parser.add_argument("--runs", type=int, default=10, help="timed runs per case (default: 10)")
+    parser.add_argument("--no-ocr", action="store_true", help="skip the Tesseract stages")
+    parser.add_argument("--output", metavar="FILE", help="write JSON to FILE instead of stdout")
+    args = parser.parse_args()
+
+    app = QApplication([])
+    engine = ocr_engine.get_engine(args.engine, args.tesseract)
+    ocr_engine.ocr.pytesseract.tesseract_cmd = args.tesseract
+    sizes = [tuple(int(value) for value in size.lower().split("x")) for size in args.sizes]
+    results = {
+        "version": get_version(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "qt_platform": QGuiApplication.platformName(),
+        "engine": "none" if args.no_ocr else engine.name,
+        "preprocess": list(ocr_preprocess.parse_stages(args.preprocess)),
+        "runs": max(1, args.runs),
+        "cases": [],
+    }
+    with tempfile.TemporaryDirectory(prefix="ssocr-bench-") as save_folder:
+        bench = PipelineBench(engine, ocr_preprocess.parse_stages(args.preprocess), save_folder)
+        try:
+            for width, height in sizes:
+                for family in args.fonts:
+                    font, font_file = load_font(family)
+                    for lang in args.langs:
+                        image = render_text_image(width, height, font, lang)
+                        case = {"size": [width, height], "font": font_file, "lang": lang}
+                        print(f"{width}x{height} {font_file} {lang}", file=sys.stderr)
+                        try:
+                            case["stages"] = bench.run_case(image, lang, results["runs"], not args.no_ocr)
+                        except (ocr_engine.EngineError, ocr_engine.ocr.TesseractError,
+                                ocr_engine.ocr.TesseractNotFoundError, OSError) as e:
+                            case["error"] = str(e) or type(e).__name__
+                        case["peak_rss_mib"] = round(get_peak_rss() / 2**20, 1)
+                        results["cases"].append(case)
+        finally:
+            bench.close()
+            engine.close()
+        if bench.save_errors:
+            results["save_errors"] = bench.save_errors
+    results["peak_rss_mib"] = round(get_peak_rss() / 2**20, 1)
+    del app
+
+    output = json.dumps(results, indent=1, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
+    return 1 if any("error" in case for case in results["cases"]) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
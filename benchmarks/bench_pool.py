@@ -0,0 +1,80 @@
+"""
+Measure how throughput of the "pool" OCR engine scales with the number of worker processes.
+
+A batch of synthetic snippet images is read by the pool at every size from 1 to the number of cores (doubling),
+with as many threads submitting images as there are workers, like the GUI's thread pool does. Workers are started
+and warmed up for the language parameters before timing. Images per second and the speedup over one worker are
+printed as JSON. Run from the repository root:
+    python benchmarks/bench_pool.py [--worker-engine capi] [--tesseract PATH] [--images 64] [--lang eng]
+"""
+import argparse
+import json
+import os
+import pathlib
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from PIL import Image, ImageDraw
+from worker_pool import WorkerPool
+
+#Text rendered into the snippets, one line each
+SAMPLE_TEXT = "The quick brown fox jumps over the lazy dog 0123456789"
+
+
+def render_snippets(count) -> list:
+    """Return count grayscale images of a numbered line of text, like small screen snippets."""
+    images = []
+    for index in range(count):
+        image = Image.new("L", (640, 48), 255)
+        ImageDraw.Draw(image).text((8, 16), f"{index} {SAMPLE_TEXT}", fill=0)
+        images.append(image)
+    return images
+
+
+def pool_sizes(cores) -> list:
+    """Return 1, 2, 4 ... up to cores, always ending with cores."""
+    sizes = [1]
+    while sizes[-1] * 2 < cores:
+        sizes.append(sizes[-1] * 2)
+    if sizes[-1] != cores:
+        sizes.append(cores)
+    return sizes
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--worker-engine", default="capi", help="engine of every worker (capi, pipe or pytesseract)")
+    parser.add_argument("--tesseract", default="tesseract", help="path to the Tesseract executable")
+    parser.add_argument("--images", type=int, default=64, help="snippets per batch (default: 64)")
+    parser.add_argument("--lang", default="eng", help="language parameters (default: eng)")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1,
+                        help="largest pool size measured (default: number of cores)")
+    args = parser.parse_args()
+
+    images = render_snippets(args.images)
+    results = []
+    for size in pool_sizes(args.max_workers):
+        pool = WorkerPool(args.worker_engine, args.tesseract, size, idle_timeout=0)
+        try:
+            with ThreadPoolExecutor(size) as executor:
+                #Start every worker and load the models before timing
+                list(executor.map(lambda image: pool.image_to_string(image, args.lang), images[:size * 2]))
+                start_time = time.perf_counter()
+                list(executor.map(lambda image: pool.image_to_string(image, args.lang), images))
+                elapsed = time.perf_counter() - start_time
+        finally:
+            pool.close()
+        results.append({"workers": size, "seconds": elapsed, "images_per_second": len(images) / elapsed})
+    for result in results:
+        result["speedup"] = result["images_per_second"] / results[0]["images_per_second"]
+    print(json.dumps({"worker_engine": args.worker_engine, "lang": args.lang, "images": len(images),
+                      "cores": os.cpu_count(), "results": results}, indent=1))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
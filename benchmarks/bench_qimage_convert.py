@@ -0,0 +1,87 @@
+"""
+Compare the old PNG round-trip in read_image_buffer with qimage_to_pil on snippet sized images.
+
+Run from the repository root:
+    python benchmarks/bench_qimage_convert.py
+"""
+import io
+import os
+import pathlib
+import sys
+import time
+import tracemalloc
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from PyQt5.QtCore import QBuffer, Qt
+from PyQt5.QtGui import QGuiApplication, QImage, QPainter, QFont, QColor
+from PIL import Image
+from qimage_convert import qimage_to_pil, qimage_to_array
+
+#Snippet sizes to measure (width, height)
+SIZES = [(640, 360), (1920, 1080), (3840, 2160)]
+#Number of timed runs per size and path
+REPEATS = 10
+
+
+def make_snippet(width, height):
+    """Return a QImage in the format grabWindow produces with lines of text painted on it."""
+    image = QImage(width, height, QImage.Format_RGB32)
+    image.fill(QColor(255, 255, 255))
+    painter = QPainter(image)
+    painter.setFont(QFont("arial", 14))
+    painter.setPen(Qt.black)
+    for y in range(20, height, 24):
+        painter.drawText(10, y, "The quick brown fox jumps over the lazy dog 0123456789 " * 4)
+    painter.end()
+    return image
+
+
+def png_round_trip(image):
+    """Convert QImage to PIL Image the way read_image_buffer used to."""
+    buffer = QBuffer()
+    buffer.open(QBuffer.ReadWrite)
+    image.save(buffer, "PNG")
+    pil_image = Image.open(io.BytesIO(buffer.data()))
+    pil_image.load()
+    buffer.close()
+    return pil_image
+
+
+def measure(function, image):
+    """Return median seconds and peak traced Python allocation in bytes of function(image)."""
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        function(image)
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    function(image)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    timings.sort()
+    return timings[len(timings) // 2], peak
+
+
+def main():
+    """Print a table of timings and allocations for each snippet size."""
+    app = QGuiApplication([])
+    print(f"{'size':>11} {'path':>14} {'median ms':>10} {'py alloc MiB':>13}")
+    for width, height in SIZES:
+        image = make_snippet(width, height)
+        results = [("png", png_round_trip), ("qimage_to_pil", qimage_to_pil), ("qimage_to_array", qimage_to_array)]
+        baseline = None
+        for name, function in results:
+            seconds, peak = measure(function, image)
+            if baseline is None:
+                baseline = seconds
+            speedup = f"  x{baseline / seconds:.1f}" if seconds > 0 else ""
+            print(f"{width:>5}x{height:<5} {name:>14} {seconds * 1000:>10.2f} {peak / 2**20:>13.2f}{speedup}")
+    #PIL and Qt allocate pixel memory outside of the Python allocator, so the traced numbers only
+    #show the extra Python-side copies (PNG bytes and BytesIO) that the direct paths avoid
+    del app
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Compare handing images to a worker process through shared memory with pickling their pixels into a pipe.
+
+A worker process is started once, then images of several sizes are sent to it both ways: as raw pixel bytes
+pickled into a multiprocessing pipe (how the "pool" engine sent them before) and written into a pooled shared memory
+slot whose name is sent instead. The worker touches every pixel row of the image it receives and replies, so the
+measured round trip includes making the pixels available to the worker. Per size, p50/p95 round trip, throughput
+and the number of shared memory blocks created are printed as JSON. Run from the repository root:
+    python benchmarks/bench_shm.py [--runs 50] [--sizes 1920x1080 3840x2160]
+"""
+import argparse
+import json
+import multiprocessing
+import pathlib
+import sys
+import time
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from PIL import Image
+from batch_ocr import percentile
+from shm_transport import SharedImagePool
+
+#Image sizes sent (width, height), from a single line snippet to a 4K screen
+SIZES = [(640, 48), (1920, 1080), (3840, 2160)]
+
+
+def run_echo(conn):
+    """Reply to every received image with the sum of its first column, until None is received."""
+    import numpy as np
+    from shm_transport import AttachedBlocks
+    attached = AttachedBlocks()
+    while True:
+        job = conn.recv()
+        if job is None:
+            break
+        mode, size, data = job
+        if isinstance(data, str):
+            pixels = attached.view(data, mode, size)
+        else:
+            image = Image.frombytes(mode, size, data)
+            pixels = np.asarray(image)
+        conn.send(int(pixels[:, 0].sum()))
+        del pixels
+    attached.close()
+
+
+def measure(conn, image, runs, shared_images=None) -> list:
+    """Return round trip seconds of sending image runs times, through shared_images if given."""
+    durations = []
+    for run in range(runs):
+        start_time = time.perf_counter()
+        if shared_images is not None:
+            slot, mode, size = shared_images.write(image)
+            conn.send((mode, size, slot.name))
+            conn.recv()
+            slot.release()
+        else:
+            conn.send((image.mode, image.size, image.tobytes()))
+            conn.recv()
+        durations.append(time.perf_counter() - start_time)
+    return sorted(durations)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=50, help="timed sends per size and transport (default: 50)")
+    parser.add_argument("--sizes", nargs="+", default=[f"{w}x{h}" for w, h in SIZES],
+                        help="image sizes as WIDTHxHEIGHT")
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    conn, child_conn = context.Pipe()
+    process = context.Process(target=run_echo, args=(child_conn,), daemon=True)
+    process.start()
+    shared_images = SharedImagePool(2)
+    results = []
+    try:
+        for size in args.sizes:
+            width, height = (int(value) for value in size.split("x"))
+            image = Image.radial_gradient("L").resize((width, height)).convert("RGB")
+            megabytes = width * height * 3 / 1e6
+            #Warm up both paths so block creation and the worker's first mapping aren't timed
+            measure(conn, image, 2)
+            measure(conn, image, 2, shared_images)
+            created_before = shared_images.created
+            for transport, durations in (("pickle", measure(conn, image, args.runs)),
+                                         ("shared_memory", measure(conn, image, args.runs, shared_images))):
+                p50 = percentile(durations, 0.5)
+                results.append({"size": size, "transport": transport, "megabytes": megabytes,
+                                "p50_seconds": p50, "p95_seconds": percentile(durations, 0.95),
+                                "megabytes_per_second": megabytes / p50 if p50 > 0 else 0.0})
+            results[-1]["blocks_created_while_timed"] = shared_images.created - created_before
+    finally:
+        conn.send(None)
+        process.join()
+        shared_images.close()
+    print(json.dumps(results, indent=1))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
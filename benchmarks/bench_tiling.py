@@ -0,0 +1,59 @@
+"""
+Compare reading large images in one Tesseract pass with reading them in tiles on all cores.
+
+Needs a working Tesseract installation. Run from the repository root:
+    python benchmarks/bench_tiling.py [--engine pipe] [--tesseract PATH] [image ...]
+
+Without image arguments a synthetic two-column page at 300 DPI A3 size is used.
+"""
+import argparse
+import pathlib
+import sys
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from PIL import Image, ImageDraw, ImageFont
+import ocr_engine
+import ocr_tiling
+
+#Size of an A3 page scanned at 300 DPI
+A3_300_DPI = (3508, 4961)
+
+
+def make_page():
+    """Return a synthetic two-column A3 page of text."""
+    image = Image.new("L", A3_300_DPI, 255)
+    draw = ImageDraw.Draw(image)
+    try:
+        font = ImageFont.truetype("DejaVuSans.ttf", 36)
+    except OSError:
+        font = ImageFont.load_default()
+    column_width = A3_300_DPI[0] // 2
+    for column in range(2):
+        for line, y in enumerate(range(150, A3_300_DPI[1] - 150, 60)):
+            draw.text((100 + column * column_width, y), f"Column {column + 1} line {line + 1} quick brown fox jumps",
+                      fill=0, font=font)
+    return image
+
+
+def main():
+    """Print single-pass and tiled timings for every image."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("images", nargs="*")
+    parser.add_argument("--engine", default="pytesseract")
+    parser.add_argument("--tesseract", default="tesseract")
+    parser.add_argument("--lang", default="eng")
+    parser.add_argument("--workers", type=int, default=0)
+    args = parser.parse_args()
+    ocr_engine.ocr.pytesseract.tesseract_cmd = args.tesseract
+    engine = ocr_engine.get_engine(args.engine, args.tesseract)
+    images = [(path, Image.open(path)) for path in args.images] or [("synthetic A3 page", make_page())]
+    for name, image in images:
+        result = ocr_tiling.compare_with_single_pass(engine, image, args.lang, args.workers)
+        print(f"{name}: {image.width}x{image.height}, {result['tiles']} tiles, "
+              f"single pass {result['single_seconds']:.2f} s, tiled {result['tiled_seconds']:.2f} s, "
+              f"speedup x{result['speedup']:.2f}, same words: {result['same_text']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Check that importing the GUI-free OCR core stays cheap.
+
+Runs 'python -X importtime -c "import ocr_core"' in fresh interpreters, fails if the best cumulative import time
+of ocr_core is over the budget or if any heavy dependency was imported with it. Run from the repository root:
+    python benchmarks/import_budget.py [--budget-ms 50] [--runs 5]
+"""
+import argparse
+import pathlib
+import re
+import subprocess
+import sys
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+#Modules only the GUI or the OCR functions may import, never 'import ocr_core' itself
+HEAVY_MODULES = ("PyQt5", "PIL", "pytesseract", "numpy", "sqlite3", "ctypes")
+#Default budget for the cumulative import time of ocr_core in milliseconds
+DEFAULT_BUDGET_MS = 50.0
+
+
+def measure_import() -> tuple:
+    """Return cumulative import time of ocr_core in milliseconds and set of top-level modules it imported."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import ocr_core"],
+                            cwd=ROOT, capture_output=True, text=True, check=True)
+    #Lines look like 'import time:  self [us] | cumulative | imported package'
+    cumulative_us = None
+    modules = set()
+    for line in result.stderr.splitlines():
+        match = re.match(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|\s+(\S.*)$", line)
+        if match is None:
+            continue
+        name = match.group(3).strip()
+        modules.add(name.split(".")[0])
+        if name == "ocr_core":
+            cumulative_us = int(match.group(2))
+    if cumulative_us is None:
+        raise RuntimeError("ocr_core missing from -X importtime output")
+    return cumulative_us / 1000, modules
+
+
+def main() -> int:
+    """Print import time of ocr_core and return 1 if it is over budget or imports a heavy module."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS,
+                        help=f"maximum cumulative import time of ocr_core (default: {DEFAULT_BUDGET_MS:g})")
+    parser.add_argument("--runs", type=int, default=5, help="number of fresh interpreters measured (default: 5)")
+    args = parser.parse_args()
+
+    timings = []
+    heavy = set()
+    for _ in range(max(1, args.runs)):
+        milliseconds, modules = measure_import()
+        timings.append(milliseconds)
+        heavy |= modules.intersection(HEAVY_MODULES)
+    #The best run is the least disturbed by other processes and disk caches
+    best = min(timings)
+    print(f"import ocr_core: best {best:.1f} ms, worst {max(timings):.1f} ms over {len(timings)} runs "
+          f"(budget {args.budget_ms:g} ms)")
+    failed = False
+    if best > args.budget_ms:
+        print(f"FAIL: import time over budget by {best - args.budget_ms:.1f} ms")
+        failed = True
+    if heavy:
+        print(f"FAIL: importing ocr_core also imported {', '.join(sorted(heavy))}")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+"""
+Load-test a running OCR service (ocr_service.py) with several kept-alive connections.
+
+Every connection sends batches of pipelined requests and waits for their responses before sending the next batch.
+Requests per second, latency percentiles of the batches and the number of error responses are printed as JSON.
+Run from the repository root while the service is running:
+    python benchmarks/load_service.py [--socket PATH | --port 8765] [--connections 8] [--depth 4] [--seconds 10]
+
+Without --image a synthetic line of text is rendered with PIL. The same image is sent every time, so use --no-cache
+to measure reading instead of the OCR cache.
+"""
+import argparse
+import io
+import json
+import pathlib
+import sys
+import threading
+import time
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from batch_ocr import percentile
+from ocr_client import OcrClient, DEFAULT_PORT
+
+#Text rendered into the synthetic image
+SAMPLE_TEXT = "The quick brown fox jumps over the lazy dog 0123456789"
+
+
+def render_image() -> bytes:
+    """Return PNG bytes of a line of black text on white."""
+    from PIL import Image, ImageDraw
+    image = Image.new("L", (640, 48), 255)
+    ImageDraw.Draw(image).text((8, 16), SAMPLE_TEXT, fill=0)
+    output = io.BytesIO()
+    image.save(output, "PNG")
+    return output.getvalue()
+
+
+def run_connection(args, path, data, deadline, results):
+    """Send pipelined batches on one connection until deadline, appending batch latencies and errors to results."""
+    latencies = []
+    errors = 0
+    requests = 0
+    with OcrClient(args.socket, args.port) as client:
+        while time.perf_counter() < deadline:
+            start_time = time.perf_counter()
+            try:
+                responses = client.pipeline([("POST", path, data)] * args.depth)
+            except OSError:
+                #The connection broke, count the batch as failed and go on with a new connection
+                errors += args.depth
+                client.close()
+                try:
+                    client.connect()
+                except OSError:
+                    #The service can't be reached any more, stop instead of counting errors until the deadline
+                    break
+                continue
+            latencies.append(time.perf_counter() - start_time)
+            requests += len(responses)
+            errors += args.depth - len(responses) + sum(1 for status, body in responses if status != 200)
+    results.append((latencies, requests, errors))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    address = parser.add_mutually_exclusive_group()
+    address.add_argument("--socket", metavar="PATH", help="Unix domain socket of the service")
+    address.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"port of the service (default: {DEFAULT_PORT})")
+    parser.add_argument("--image", metavar="FILE", help="image file sent with every request")
+    parser.add_argument("--combo", help="saved language combination requested")
+    parser.add_argument("-l", "--lang", help="language parameters requested")
+    parser.add_argument("--no-cache", action="store_true", help="read every image even if the OCR cache has it")
+    parser.add_argument("--connections", type=int, default=8, help="concurrent connections (default: 8)")
+    parser.add_argument("--depth", type=int, default=1, help="requests pipelined per batch (default: 1)")
+    parser.add_argument("--seconds", type=float, default=10.0, help="duration of the test (default: 10)")
+    args = parser.parse_args()
+
+    data = pathlib.Path(args.image).read_bytes() if args.image else render_image()
+    path = OcrClient.ocr_path(args.combo, args.lang, use_cache=not args.no_cache)
+    #One request first so the first batches don't measure loading models
+    with OcrClient(args.socket, args.port) as client:
+        client.ocr(data, args.combo, args.lang)
+
+    results = []
+    start_time = time.perf_counter()
+    deadline = start_time + args.seconds
+    threads = [threading.Thread(target=run_connection, args=(args, path, data, deadline, results))
+               for connection in range(args.connections)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start_time
+
+    latencies = sorted(latency for batch_latencies, requests, errors in results for latency in batch_latencies)
+    requests = sum(requests for batch_latencies, requests, errors in results)
+    summary = {
+        "connections": args.connections,
+        "depth": args.depth,
+        "seconds": elapsed,
+        "requests": requests,
+        "errors": sum(errors for batch_latencies, requests, errors in results),
+        "requests_per_second": requests / elapsed if elapsed > 0 else 0.0,
+        "batch_p50_seconds": percentile(latencies, 0.5),
+        "batch_p95_seconds": percentile(latencies, 0.95),
+        "batch_max_seconds": latencies[-1] if latencies else 0.0,
+    }
+    print(json.dumps(summary, indent=1))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
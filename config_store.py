@@ -0,0 +1,192 @@
+import atexit
+import os
+import threading
+import time
+from configparser import ConfigParser
+from contextlib import contextmanager
+
+#Seconds without further changes before pending changes are written to disk
+DEFAULT_FLUSH_DELAY = 1.0
+#Longest time in seconds a change waits while a burst of changes keeps postponing the flush
+MAX_FLUSH_DELAY = 5.0
+#Number of attempts at replacing config.ini while another process has it open (Windows only)
+REPLACE_ATTEMPTS = 10
+#Marks an option removed with remove_option in the pending changes
+REMOVED = object()
+
+
+@contextmanager
+def lock_file(path):
+    """Hold an exclusive advisory lock on the file at path, waiting until other processes release it."""
+    with open(path, "a+b") as file:
+        if os.name == "nt":
+            import msvcrt
+            file.seek(0)
+            #LK_LOCK retries for 10 seconds before raising OSError
+            msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                file.seek(0)
+                msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+
+
+def replace_file(source, destination):
+    """Atomically replace destination with source, retrying while another process holds destination open."""
+    for attempt in range(REPLACE_ATTEMPTS):
+        try:
+            os.replace(source, destination)
+            return
+        except PermissionError:
+            if attempt == REPLACE_ATTEMPTS - 1:
+                raise
+            time.sleep(0.05)
+
+
+class ConfigStore(ConfigParser):
+    """
+    ConfigParser that keeps settings in memory and writes changes to its file in the background.
+
+    Every set, remove_option and add_section is recorded and a flush is scheduled after flush_delay seconds
+    without further changes, so a burst of changes is written once. A flush takes an advisory lock, reads the
+    file again, applies only the changes of this store on top of it and replaces the file atomically, so settings
+    changed by other running instances are kept and merged into this store instead of being overwritten.
+    """
+    def __init__(self, path, flush_delay=DEFAULT_FLUSH_DELAY):
+        super().__init__(default_section=None, dict_type=dict, allow_no_value=True)
+        self.path = str(path)
+        self.flush_delay = flush_delay
+        #Changes not written to disk yet (k = (section, option), v = value or REMOVED)
+        self.pending = {}
+        self.pending_sections = []
+        self.first_pending_time = None
+        self.last_change_time = None
+        self.timer = None
+        #Changes come from the GUI thread while flushes run on the timer thread
+        self.lock = threading.RLock()
+        #Write changes made just before the application exits
+        atexit.register(self.flush)
+
+    def load(self) -> bool:
+        """Read settings from the file, return False if it doesn't exist."""
+        with self.lock:
+            return len(self.read(self.path)) > 0
+
+    def add_section(self, section):
+        """Add section and schedule it to be written."""
+        with self.lock:
+            super().add_section(section)
+            self.pending_sections.append(section)
+            self.schedule_flush()
+
+    def set(self, section, option, value=None):
+        """Set option and schedule it to be written."""
+        with self.lock:
+            super().set(section, option, value)
+            self.pending[(section, self.optionxform(option))] = value
+            self.schedule_flush()
+
+    def remove_option(self, section, option) -> bool:
+        """Remove option and schedule its removal to be written."""
+        with self.lock:
+            existed = super().remove_option(section, option)
+            self.pending[(section, self.optionxform(option))] = REMOVED
+            self.schedule_flush()
+            return existed
+
+    def has_pending_changes(self) -> bool:
+        """Return True if there are changes that haven't been written yet."""
+        return len(self.pending) > 0 or len(self.pending_sections) > 0
+
+    def schedule_flush(self):
+        """Postpone the flush until flush_delay seconds after the last change, or MAX_FLUSH_DELAY after the first."""
+        with self.lock:
+            self.last_change_time = time.monotonic()
+            if self.first_pending_time is None:
+                self.first_pending_time = self.last_change_time
+            if self.timer is None:
+                self.start_timer(self.flush_delay)
+
+    def start_timer(self, delay):
+        """Start timer that calls flush_from_timer after delay seconds."""
+        self.timer = threading.Timer(delay, self.flush_from_timer)
+        #A sleeping timer must not keep the application alive, the atexit hook writes the remaining changes
+        self.timer.daemon = True
+        self.timer.start()
+
+    def flush_from_timer(self):
+        """Flush on the timer thread, keeping the changes pending for the next flush if writing fails."""
+        with self.lock:
+            if self.timer is not threading.current_thread():
+                #Cancelled by a flush after this timer had already fired
+                return
+            due = min(self.last_change_time + self.flush_delay, self.first_pending_time + MAX_FLUSH_DELAY)
+            if time.monotonic() < due:
+                #Changes arrived since the timer was started, wait for the burst to end
+                self.start_timer(due - time.monotonic())
+                return
+            try:
+                self.flush()
+            except OSError:
+                pass
+
+    def flush(self):
+        """Merge pending changes into the file now and load the changes other instances made to it."""
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            if not self.has_pending_changes():
+                return
+            with lock_file(f"{self.path}.lock"):
+                disk = ConfigParser(default_section=None, dict_type=dict, allow_no_value=True)
+                disk.read(self.path)
+                for section in self.pending_sections:
+                    if not disk.has_section(section):
+                        disk.add_section(section)
+                for (section, option), value in self.pending.items():
+                    if value is REMOVED:
+                        if disk.has_section(section):
+                            disk.remove_option(section, option)
+                        continue
+                    if not disk.has_section(section):
+                        disk.add_section(section)
+                    disk.set(section, option, value)
+                temp_path = f"{self.path}.{os.getpid()}.tmp"
+                try:
+                    with open(temp_path, "w") as configfile:
+                        disk.write(configfile)
+                        configfile.flush()
+                        os.fsync(configfile.fileno())
+                    replace_file(temp_path, self.path)
+                except OSError:
+                    if os.path.exists(temp_path):
+                        os.remove(temp_path)
+                    raise
+            self.pending.clear()
+            self.pending_sections.clear()
+            self.first_pending_time = None
+            self.merge(disk)
+
+    def merge(self, disk):
+        """Make settings equal to disk without recording them as changes."""
+        for section in disk.sections():
+            if not self.has_section(section):
+                ConfigParser.add_section(self, section)
+            for option, value in disk.items(section, raw=True):
+                if not self.has_option(section, option) or self.get(section, option, raw=True) != value:
+                    ConfigParser.set(self, section, option, value)
+        for section in self.sections():
+            if not disk.has_section(section):
+                #Removed by another instance, sections are never removed by this application
+                continue
+            for option in list(self.options(section)):
+                if not disk.has_option(section, option):
+                    ConfigParser.remove_option(self, section, option)
@@ -0,0 +1,331 @@
+"""
+Hot folder mode: read every image dropped into a folder, save its text to savetxtpath and move it out of the folder.
+
+New files are noticed with inotify on Linux and by listing the folder every few seconds elsewhere (or with --poll,
+needed for network shares written to by other machines). A file is only read once its size and modification time
+have stopped changing for settle seconds, so files that are still being copied in are never read half-written.
+
+Files travel from the folder to the OCR worker processes through a bounded queue. While it is full the watcher
+stops looking for more files, so a burst of thousands of files waits in the folder instead of in memory.
+"""
+import argparse
+import ctypes
+import ctypes.util
+import os
+import pathlib
+import queue
+import select
+import shutil
+import signal
+import stat
+import struct
+import sys
+import threading
+import time
+import batch_ocr
+import ocr_core
+
+#Seconds a file's size and modification time must stay the same before it is read
+DEFAULT_SETTLE = 2.0
+#Seconds between listings of the folder when inotify isn't used
+DEFAULT_POLL_INTERVAL = 2.0
+#Number of files waiting for a worker before the watcher stops looking for new ones
+DEFAULT_MAX_QUEUED = 256
+#Names of the folders processed files are moved to, inside the watched folder unless set in config.ini
+DONE_FOLDER = "done"
+FAILED_FOLDER = "failed"
+
+#inotify constants from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+#struct inotify_event without its variable-length name (wd, mask, cookie, len)
+INOTIFY_EVENT = struct.Struct("iIII")
+
+
+class InotifyWatcher:
+    """Reports names of files closed after writing or moved into folder, using Linux inotify through libc."""
+    def __init__(self, folder):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(self.fd, os.fsencode(folder), IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+            error = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(error, f"Could not watch '{folder}' with inotify")
+
+    def changes(self, timeout):
+        """
+        Wait up to timeout seconds for events, return set of changed file names.
+
+        Returns None if the kernel dropped events, then the folder has to be listed again to find every file.
+        """
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return set()
+        names = set()
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return names
+            offset = 0
+            while offset < len(data):
+                wd, mask, cookie, length = INOTIFY_EVENT.unpack_from(data, offset)
+                offset += INOTIFY_EVENT.size
+                if mask & IN_Q_OVERFLOW:
+                    return None
+                names.add(os.fsdecode(data[offset:offset + length].rstrip(b"\0")))
+                offset += length
+
+    def close(self):
+        """Stop watching the folder."""
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """Asks for the folder to be listed again every interval seconds."""
+    def __init__(self, interval=DEFAULT_POLL_INTERVAL):
+        self.interval = interval
+        self.next_scan = 0.0
+
+    def changes(self, timeout):
+        """Wait up to timeout seconds, return None when the folder is due to be listed and an empty set otherwise."""
+        wait_time = self.next_scan - time.monotonic()
+        if wait_time > timeout:
+            time.sleep(timeout)
+            return set()
+        time.sleep(max(0.0, wait_time))
+        self.next_scan = time.monotonic() + self.interval
+        return None
+
+    def close(self):
+        pass
+
+
+def create_watcher(folder, poll=False, poll_interval=DEFAULT_POLL_INTERVAL):
+    """Return InotifyWatcher of folder on Linux, or PollingWatcher if poll is True or inotify isn't available."""
+    if not poll and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(folder)
+        except (OSError, AttributeError):
+            #AttributeError if libc has no inotify functions
+            pass
+    return PollingWatcher(poll_interval)
+
+
+class FileCollector:
+    """
+    Thread that finds settled image files in folder and puts their paths into a bounded queue.
+
+    At most max_tracked files that haven't settled yet are remembered. Files beyond that, or found while the queue
+    was full, are picked up when the folder is listed again.
+    """
+    def __init__(self, folder, watcher, settle=DEFAULT_SETTLE, max_queued=DEFAULT_MAX_QUEUED):
+        self.folder = pathlib.Path(folder)
+        self.watcher = watcher
+        self.settle = settle
+        self.queue = queue.Queue(max_queued)
+        self.max_tracked = max_queued * 4
+        #Files that haven't settled yet (k = file name, v = ((size, modification time), time first seen like that))
+        self.tracked = {}
+        #Whether files were skipped because max_tracked files were already tracked
+        self.missed = False
+        #Names of files put into the queue and not yet moved out of the folder
+        self.claimed = set()
+        self.claimed_lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="FileCollector", daemon=True)
+
+    def start(self):
+        """Start looking for files."""
+        self.thread.start()
+
+    def release(self, name):
+        """Forget file name after it was moved out of the folder, so a new file with the same name is read too."""
+        with self.claimed_lock:
+            self.claimed.discard(name)
+
+    def check(self, name, now):
+        """Track file name until it has settled, return its path once it has (None before that)."""
+        if name.startswith(".") or pathlib.PurePath(name).suffix.lower() not in batch_ocr.IMAGE_EXTENSIONS:
+            return None
+        tracked = self.tracked.get(name)
+        if tracked is None and len(self.tracked) >= self.max_tracked:
+            self.missed = True
+            return None
+        path = self.folder / name
+        try:
+            file_stat = path.stat()
+        except OSError:
+            #Removed or renamed since it was noticed
+            self.tracked.pop(name, None)
+            return None
+        if not stat.S_ISREG(file_stat.st_mode):
+            return None
+        state = (file_stat.st_size, file_stat.st_mtime_ns)
+        if tracked is None or tracked[0] != state:
+            self.tracked[name] = (state, now)
+            return None
+        if now - tracked[1] < self.settle:
+            return None
+        del self.tracked[name]
+        return path
+
+    def scan(self, names):
+        """Check names (every file in the folder if None), put settled files into the queue, return False if stopped."""
+        if names is None:
+            self.missed = False
+            with os.scandir(self.folder) as entries:
+                names = [entry.name for entry in entries if entry.name not in self.tracked]
+        names = set(names) | set(self.tracked)
+        now = time.monotonic()
+        for name in names:
+            with self.claimed_lock:
+                if name in self.claimed:
+                    continue
+            path = self.check(name, now)
+            if path is None:
+                continue
+            with self.claimed_lock:
+                self.claimed.add(name)
+            #Blocks while the queue is full, new files wait in the folder until workers catch up
+            while not self.stopping.is_set():
+                try:
+                    self.queue.put(str(path), timeout=0.5)
+                    break
+                except queue.Full:
+                    pass
+            if self.stopping.is_set():
+                return False
+        return True
+
+    def run(self):
+        """List the folder once, then check changed files until stop is called."""
+        names = None
+        while not self.stopping.is_set():
+            if not self.scan(names):
+                return
+            if self.missed and len(self.tracked) < self.max_tracked:
+                #Some files weren't tracked while the limit was reached, list the folder again to find them
+                names = None
+                continue
+            #Wake up when the earliest tracked file may have settled
+            timeout = min([since + self.settle - time.monotonic() for state, since in self.tracked.values()]
+                          + [self.settle])
+            names = self.watcher.changes(max(0.05, timeout))
+
+    def stop(self):
+        """Stop looking for files."""
+        self.stopping.set()
+        self.thread.join()
+        self.watcher.close()
+
+
+def unique_path(folder, file_name) -> pathlib.Path:
+    """Return path of file_name in folder, adding a counter to the name if a file with that name exists."""
+    path = pathlib.Path(folder) / file_name
+    counter = 1
+    while path.exists():
+        path = path.with_name(f"{pathlib.PurePath(file_name).stem}-{counter}{pathlib.PurePath(file_name).suffix}")
+        counter += 1
+    return path
+
+
+def build_parser(default_lang) -> argparse.ArgumentParser:
+    """Return parser of the command-line arguments for hot folder mode."""
+    parser = argparse.ArgumentParser(prog="hot_folder.py",
+                                     description="Read every image dropped into a folder until stopped with Ctrl+C.")
+    parser.add_argument("folder", help="folder to watch")
+    parser.add_argument("-l", "--lang", default=default_lang,
+                        help=f"Tesseract language parameters, e.g. 'eng+deu' (default: {default_lang})")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1,
+                        help="number of OCR worker processes (default: number of cores)")
+    parser.add_argument("--preprocess", metavar="STAGES",
+                        help="comma separated preprocessing stages, '' for none "
+                             "(default: stages saved for the language parameters)")
+    parser.add_argument("--poll", action="store_true",
+                        help="list the folder periodically instead of using inotify (needed for network shares)")
+    return parser
+
+
+def main(argv=None, config_path=ocr_core.CONFIG_PATH) -> int:
+    """Watch the folder given on the command line and read new images with a pool of worker processes."""
+    import ocr_preprocess
+    config = ocr_core.load_config(config_path)
+    args = build_parser(ocr_core.get_default_lang_param(config)).parse_args(argv)
+    if args.preprocess is None:
+        preprocess_stages = ocr_core.get_preprocess_stages(config, args.lang)
+    else:
+        preprocess_stages = ocr_preprocess.parse_stages(args.preprocess)
+    folder = pathlib.Path(args.folder)
+    if not folder.is_dir():
+        print(f"'{folder}' is not a folder", file=sys.stderr)
+        return 2
+    txt_folder = ocr_core.get_save_folder(config, "savetxtpath") or "."
+    done_folder = pathlib.Path(config.get("USERCONFIG", "hot_folder_done_path", fallback="") or folder / DONE_FOLDER)
+    failed_folder = pathlib.Path(config.get("USERCONFIG", "hot_folder_failed_path", fallback="")
+                                 or folder / FAILED_FOLDER)
+    done_folder.mkdir(parents=True, exist_ok=True)
+    failed_folder.mkdir(parents=True, exist_ok=True)
+
+    watcher = create_watcher(folder, args.poll, config.getfloat("USERCONFIG", "hot_folder_poll_interval",
+                                                                fallback=DEFAULT_POLL_INTERVAL))
+    collector = FileCollector(folder, watcher, config.getfloat("USERCONFIG", "hot_folder_settle",
+                                                               fallback=DEFAULT_SETTLE),
+                              config.getint("USERCONFIG", "hot_folder_max_queued", fallback=DEFAULT_MAX_QUEUED))
+    workers = max(1, args.workers)
+    mode = "inotify" if isinstance(watcher, InotifyWatcher) else "polling"
+    print(f"Watching '{folder}' ({mode}) with {workers} workers, text is saved to '{txt_folder}'", file=sys.stderr)
+
+    stopping = threading.Event()
+    #Stop cleanly when the service manager asks, like with Ctrl+C
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+
+    def finish(path, text, error):
+        """Save text of file at path and move it to the done folder, or move it to the failed folder on error."""
+        source = pathlib.Path(path)
+        try:
+            if error is None:
+                with open(unique_path(txt_folder, f"{source.stem}.txt"), "w", encoding="utf-8") as file:
+                    file.write(text)
+                shutil.move(path, unique_path(done_folder, source.name))
+                print(f"{source.name}: done", file=sys.stderr)
+            else:
+                shutil.move(path, unique_path(failed_folder, source.name))
+                print(f"{source.name}: {error}", file=sys.stderr)
+        except OSError as e:
+            print(f"{source.name}: {e}", file=sys.stderr)
+        collector.release(source.name)
+
+    #Files that crash their worker process on their own are moved to the failed folder
+    pool = batch_ocr.OcrProcessPool(workers, config_path, args.lang, preprocess_stages)
+    collector.start()
+    try:
+        while not stopping.is_set():
+            #Only take as many files from the queue as the workers can start on soon
+            while pool.wants_more():
+                try:
+                    path = collector.queue.get(timeout=0 if pool.busy() else 0.5)
+                except queue.Empty:
+                    break
+                pool.submit(path)
+            if not pool.busy():
+                continue
+            for result in pool.wait(timeout=0.5):
+                finish(result["path"], result["text"], result["error"])
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print("Stopping, files not read yet stay in the folder", file=sys.stderr)
+        collector.stop()
+        #Files finished while shutting down are saved, the others are read again on the next start
+        for result in pool.close():
+            finish(result["path"], result["text"], result["error"])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,179 @@
+"""
+Content-addressed archive of saved snippet images, packed into a few large tar shards instead of one file each.
+
+Every image is keyed by a hash of its pixels, so a snippet identical to one already archived is not encoded or
+written again, only its name is recorded. New images are encoded to PNG once and appended to the current shard,
+a plain tar file that can be extracted with any tar tool; a new shard is started once it reaches shard_size bytes.
+An SQLite index maps every key to its shard and offset and every saved name to its key. Data is appended before
+the index row is committed, so a crash can at worst leave unindexed bytes at the end of a shard, which the next
+image overwrites.
+"""
+import hashlib
+import os
+import sqlite3
+import tarfile
+import threading
+import time
+
+#Size a shard may grow to before the next one is started
+DEFAULT_SHARD_SIZE = 256 * 1024 * 1024
+#Index file in the archive folder
+INDEX_NAME = "images.sqlite"
+#Name of shard number n in the archive folder
+SHARD_NAME = "images-{:05d}.tar"
+#Prefix of the image path recorded in the OCR history for a snippet saved to an archive, followed by the
+#archive folder and the saved name
+REFERENCE_PREFIX = "archive:"
+#Two zero blocks mark the end of a tar file, they are overwritten by the next image
+END_OF_ARCHIVE = bytes(2 * tarfile.BLOCKSIZE)
+
+SCHEMA = [
+    #Every archived image (k = hash of its pixels), data is the PNG at offset in shard
+    "CREATE TABLE IF NOT EXISTS images (key TEXT PRIMARY KEY, shard INTEGER NOT NULL, offset INTEGER NOT NULL, "
+    "size INTEGER NOT NULL, width INTEGER NOT NULL, height INTEGER NOT NULL, created REAL NOT NULL)",
+    #Every saved name and the image it was saved as, identical snippets share one image
+    "CREATE TABLE IF NOT EXISTS saves (name TEXT PRIMARY KEY, key TEXT NOT NULL, created REAL NOT NULL)",
+    #Offset new images are appended at in every shard
+    "CREATE TABLE IF NOT EXISTS shards (shard INTEGER PRIMARY KEY, end_offset INTEGER NOT NULL)",
+]
+
+
+def image_key(width, height, bytes_per_line, image_format, pixels) -> str:
+    """Return hash of an image's size, pixel format and pixel buffer (anything supporting the buffer protocol)."""
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(f"{width}x{height}:{bytes_per_line}:{image_format}".encode("ascii"))
+    digest.update(pixels)
+    return digest.hexdigest()
+
+
+class ImageArchive:
+    """
+    Archive in folder ("" is the application folder), opened the first time it is used.
+
+    Adding images is meant for one thread (the SaveWriter thread), reading them may happen from any thread.
+    """
+    def __init__(self, folder, shard_size=DEFAULT_SHARD_SIZE):
+        self.folder = folder
+        self.shard_size = shard_size
+        self.lock = threading.Lock()
+        self.db = None
+        #Open shard new images are appended to and its number
+        self.shard_file = None
+        self.shard = None
+        #Counters of images written and duplicates skipped since the archive was opened
+        self.written = 0
+        self.duplicates = 0
+
+    def open(self):
+        """Open the index, creating the folder and index if they don't exist yet."""
+        if self.db is not None:
+            return
+        if self.folder != "":
+            os.makedirs(self.folder, exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(self.folder, INDEX_NAME), check_same_thread=False)
+        with self.db:
+            for statement in SCHEMA:
+                self.db.execute(statement)
+
+    def shard_path(self, shard) -> str:
+        """Return path of shard number shard."""
+        return os.path.join(self.folder, SHARD_NAME.format(shard))
+
+    def add(self, name, key, encode, width, height) -> bool:
+        """
+        Record image key as saved under name, return True if it was new and written.
+
+        encode() returns the PNG bytes of the image and is only called if no image with key is archived.
+        """
+        with self.lock:
+            self.open()
+            now = time.time()
+            if self.db.execute("SELECT 1 FROM images WHERE key = ?", (key,)).fetchone() is not None:
+                with self.db:
+                    self.db.execute("INSERT OR REPLACE INTO saves VALUES (?, ?, ?)", (name, key, now))
+                self.duplicates += 1
+                return False
+            data = encode()
+            shard, offset, end_offset = self.append(f"{key}.png", data, now)
+            with self.db:
+                self.db.execute("INSERT INTO images VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                (key, shard, offset, len(data), width, height, now))
+                self.db.execute("INSERT OR REPLACE INTO saves VALUES (?, ?, ?)", (name, key, now))
+                self.db.execute("INSERT OR REPLACE INTO shards VALUES (?, ?)", (shard, end_offset))
+            self.written += 1
+            return True
+
+    def append(self, member_name, data, mtime) -> tuple:
+        """Append data as tar member to the current shard, return shard number, offset of data and new end."""
+        row = self.db.execute("SELECT shard, end_offset FROM shards ORDER BY shard DESC LIMIT 1").fetchone()
+        shard, end_offset = row if row is not None else (0, 0)
+        info = tarfile.TarInfo(member_name)
+        info.size = len(data)
+        info.mtime = int(mtime)
+        info.mode = 0o644
+        header = info.tobuf(tarfile.USTAR_FORMAT)
+        padding = -len(data) % tarfile.BLOCKSIZE
+        if end_offset > 0 and end_offset + len(header) + len(data) + padding > self.shard_size:
+            #Start the next shard, the current one already ends with its end-of-archive marker
+            shard, end_offset = shard + 1, 0
+        file = self.get_shard_file(shard)
+        file.seek(end_offset)
+        file.write(header)
+        file.write(data)
+        file.write(bytes(padding))
+        new_end = file.tell()
+        file.write(END_OF_ARCHIVE)
+        file.flush()
+        #The data must be on disk before the index row pointing at it is committed
+        os.fsync(file.fileno())
+        return shard, end_offset + len(header), new_end
+
+    def get_shard_file(self, shard):
+        """Return shard number shard opened for writing, closing the previously open shard."""
+        if self.shard != shard:
+            if self.shard_file is not None:
+                self.shard_file.close()
+            path = self.shard_path(shard)
+            self.shard_file = open(path, "r+b" if os.path.exists(path) else "w+b")
+            self.shard = shard
+        return self.shard_file
+
+    def lookup(self, name_or_key):
+        """Return (shard, offset, size) of the image saved as name or with key, or None if there is none."""
+        with self.lock:
+            self.open()
+            row = self.db.execute("SELECT images.shard, images.offset, images.size FROM images "
+                                  "WHERE key = COALESCE((SELECT key FROM saves WHERE name = ?), ?)",
+                                  (name_or_key, name_or_key)).fetchone()
+        return row
+
+    def read(self, name_or_key):
+        """Return PNG bytes of the image saved as name or with key, or None if there is none."""
+        location = self.lookup(name_or_key)
+        if location is None:
+            return None
+        shard, offset, size = location
+        with open(self.shard_path(shard), "rb") as file:
+            file.seek(offset)
+            return file.read(size)
+
+    def stats(self) -> dict:
+        """Return number of archived images, saves and shards, and bytes of image data."""
+        with self.lock:
+            self.open()
+            images, data_bytes = self.db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM images").fetchone()
+            saves = self.db.execute("SELECT COUNT(*) FROM saves").fetchone()[0]
+            shards = self.db.execute("SELECT COUNT(*) FROM shards").fetchone()[0]
+        return {"images": images, "saves": saves, "shards": shards, "bytes": data_bytes,
+                "written": self.written, "duplicates": self.duplicates}
+
+    def close(self):
+        """Close the open shard and the index."""
+        with self.lock:
+            if self.shard_file is not None:
+                self.shard_file.close()
+                self.shard_file = None
+                self.shard = None
+            if self.db is not None:
+                self.db.close()
+                self.db = None
@@ -0,0 +1,69 @@
+import json
+import os
+import pathlib
+import shutil
+
+#File next to config.ini where the languages found in the Tesseract installation are cached
+DEFAULT_CACHE_PATH = "langs_cache.json"
+#Places Tesseract installations keep their language data on Linux and macOS
+TESSDATA_DIRS = ["/usr/share/tesseract-ocr/5/tessdata", "/usr/share/tesseract-ocr/4.00/tessdata",
+                 "/usr/share/tessdata", "/usr/local/share/tessdata", "/opt/homebrew/share/tessdata"]
+
+
+def find_tessdata_dir(tesseract_cmd):
+    """Return folder with the .traineddata files of the Tesseract installation, or None if it can't be found."""
+    candidates = []
+    if os.environ.get("TESSDATA_PREFIX"):
+        prefix = pathlib.Path(os.environ["TESSDATA_PREFIX"])
+        candidates += [prefix, prefix / "tessdata"]
+    if tesseract_cmd:
+        #Windows installations keep tessdata next to tesseract.exe
+        candidates.append(pathlib.Path(tesseract_cmd).parent / "tessdata")
+    candidates += [pathlib.Path(folder) for folder in TESSDATA_DIRS]
+    for folder in candidates:
+        if folder.is_dir() and any(folder.glob("*.traineddata")):
+            return folder
+    return None
+
+
+def get_mtime(path):
+    """Return modification time of path, or None if it doesn't exist."""
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+def get_fingerprint(tesseract_cmd) -> dict:
+    """Return values that change whenever the languages of the Tesseract installation might have changed."""
+    tessdata = find_tessdata_dir(tesseract_cmd)
+    return {
+        "tesseract_cmd": str(tesseract_cmd),
+        #Resolve commands found on PATH, such as 'tesseract' on Linux
+        "tesseract_mtime": get_mtime(shutil.which(tesseract_cmd) or tesseract_cmd),
+        "tessdata": str(tessdata) if tessdata else None,
+        "tessdata_mtime": get_mtime(tessdata) if tessdata else None,
+        "traineddata": sorted(path.name for path in tessdata.glob("*.traineddata")) if tessdata else [],
+    }
+
+
+def load_languages(tesseract_cmd, cache_path=DEFAULT_CACHE_PATH):
+    """Return cached list of languages, or None if there is no cache or the installation has changed since."""
+    try:
+        with open(cache_path, encoding="utf-8") as file:
+            cache = json.load(file)
+    except (OSError, ValueError):
+        return None
+    fingerprint = get_fingerprint(tesseract_cmd)
+    if fingerprint["tesseract_mtime"] is None:
+        #A missing tesseract executable is never served from the cache, so its error is still shown
+        return None
+    if cache.get("fingerprint") != fingerprint:
+        return None
+    return cache.get("languages")
+
+
+def save_languages(tesseract_cmd, languages, cache_path=DEFAULT_CACHE_PATH):
+    """Save list of languages with the current fingerprint of the Tesseract installation."""
+    with open(cache_path, "w", encoding="utf-8") as file:
+        json.dump({"fingerprint": get_fingerprint(tesseract_cmd), "languages": list(languages)}, file, indent=1)
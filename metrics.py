@@ -0,0 +1,193 @@
+"""
+Timing spans around the hot paths of Screenshot OCR.
+
+Spans record their duration into a fixed-size ring buffer per name. While recording is disabled span() returns a
+shared no-op context manager, so instrumented code only pays for one global lookup and an attribute check.
+"""
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+
+#Number of most recent durations kept per span name
+DEFAULT_RING_SIZE = 512
+#Seconds between writes of the metrics file
+DEFAULT_EXPORT_INTERVAL = 15.0
+#Prefix of the metric names in Prometheus text format
+PROMETHEUS_PREFIX = "ssocr"
+
+#Whether spans are recorded, changed with configure
+enabled = False
+ring_size = DEFAULT_RING_SIZE
+#Recorded spans (k = span name, v = SpanStats)
+spans = {}
+spans_lock = threading.Lock()
+#Returned by span() while recording is disabled
+NULL_SPAN = nullcontext()
+
+
+def percentile(values, fraction) -> float:
+    """Return value at fraction (0-1) of sorted values using nearest rank."""
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, math.ceil(fraction * len(values)) - 1))
+    return values[index]
+
+
+class SpanStats:
+    """Durations of the most recent spans with one name, plus totals since recording started."""
+    def __init__(self, size):
+        self.durations = deque(maxlen=size)
+        self.count = 0
+        self.total = 0.0
+        self.lock = threading.Lock()
+
+    def add(self, seconds):
+        """Record one duration."""
+        with self.lock:
+            self.durations.append(seconds)
+            self.count += 1
+            self.total += seconds
+
+    def summary(self) -> dict:
+        """Return count and total since recording started, and p50/p95/max/last of the buffered durations."""
+        with self.lock:
+            durations = list(self.durations)
+            count, total = self.count, self.total
+        ordered = sorted(durations)
+        return {
+            "count": count,
+            "total_seconds": total,
+            "p50_seconds": percentile(ordered, 0.5),
+            "p95_seconds": percentile(ordered, 0.95),
+            "max_seconds": ordered[-1] if ordered else 0.0,
+            "last_seconds": durations[-1] if durations else 0.0,
+        }
+
+
+class Span:
+    """Context manager that records the time spent inside it under name."""
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+def configure(record_spans, size=DEFAULT_RING_SIZE):
+    """Turn recording on or off and set the ring buffer size used for span names recorded from now on."""
+    global enabled, ring_size
+    ring_size = max(1, size)
+    enabled = record_spans
+
+
+def span(name):
+    """Return context manager that records the time spent inside it, or a no-op one while recording is disabled."""
+    if not enabled:
+        return NULL_SPAN
+    return Span(name)
+
+
+def record(name, seconds):
+    """Record a duration measured elsewhere."""
+    if not enabled:
+        return
+    stats = spans.get(name)
+    if stats is None:
+        with spans_lock:
+            stats = spans.setdefault(name, SpanStats(ring_size))
+    stats.add(seconds)
+
+
+def reset():
+    """Forget every recorded span."""
+    with spans_lock:
+        spans.clear()
+
+
+def snapshot() -> dict:
+    """Return summary of every recorded span name, sorted by name."""
+    with spans_lock:
+        items = sorted(spans.items())
+    return {name: stats.summary() for name, stats in items}
+
+
+def to_json() -> str:
+    """Return recorded spans as a JSON document."""
+    return json.dumps({"timestamp": time.time(), "enabled": enabled, "spans": snapshot()}, indent=1)
+
+
+def to_prometheus() -> str:
+    """Return recorded spans in Prometheus text exposition format."""
+    lines = []
+    summaries = snapshot()
+    metrics = [
+        ("span_seconds", "summary", "Duration of instrumented spans"),
+        ("span_max_seconds", "gauge", "Longest buffered duration of instrumented spans"),
+    ]
+    for metric, metric_type, help_text in metrics:
+        name = f"{PROMETHEUS_PREFIX}_{metric}"
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        for span_name, summary in summaries.items():
+            label = span_name.replace("\\", "\\\\").replace('"', '\\"')
+            if metric_type == "summary":
+                lines.append(f'{name}{{span="{label}",quantile="0.5"}} {summary["p50_seconds"]:.6f}')
+                lines.append(f'{name}{{span="{label}",quantile="0.95"}} {summary["p95_seconds"]:.6f}')
+                lines.append(f'{name}_sum{{span="{label}"}} {summary["total_seconds"]:.6f}')
+                lines.append(f'{name}_count{{span="{label}"}} {summary["count"]}')
+            else:
+                lines.append(f'{name}{{span="{label}"}} {summary["max_seconds"]:.6f}')
+    return "\n".join(lines) + "\n"
+
+
+def write_file(path):
+    """Write recorded spans to path atomically, as JSON if it ends in .json and as Prometheus text otherwise."""
+    content = to_json() if str(path).lower().endswith(".json") else to_prometheus()
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as file:
+        file.write(content)
+    #Scrapers never see a half-written file
+    os.replace(temp_path, path)
+
+
+class MetricsExporter:
+    """Writes recorded spans to a file every interval seconds on a background thread, and once more on stop."""
+    def __init__(self, path, interval=DEFAULT_EXPORT_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="MetricsExporter", daemon=True)
+
+    def start(self):
+        """Start writing the file periodically."""
+        self.thread.start()
+
+    def run(self):
+        """Write the file until stop is called."""
+        while not self.stopping.wait(self.interval):
+            self.export()
+
+    def export(self):
+        """Write the file, ignoring errors so an unavailable folder doesn't stop later writes."""
+        try:
+            write_file(self.path)
+        except OSError:
+            pass
+
+    def stop(self):
+        """Stop the thread and write the final values."""
+        self.stopping.set()
+        if self.thread.is_alive():
+            self.thread.join()
+        self.export()
@@ -0,0 +1,113 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class OcrCache:
+    """
+    Cache of OCR output keyed by the pixels of an image, its language parameters and engine options.
+
+    Results are kept in an in-memory LRU and, if db_path is given, in an SQLite file so they survive restarts.
+    Both tiers evict their least recently used results when they grow past their size limit.
+    """
+    def __init__(self, max_entries=256, db_path=None, max_db_entries=10000):
+        self.max_entries = max_entries
+        self.max_db_entries = max_db_entries
+        #In-memory results ordered from least to most recently used (k = cache key, v = (text, seconds))
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        #Counters of lookups served from memory, from disk and not found
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        #Seconds of OCR that cache hits made unnecessary
+        self.seconds_saved = 0.0
+        self.db = None
+        if db_path is not None:
+            self.db = sqlite3.connect(str(db_path), check_same_thread=False)
+            self.db.execute("CREATE TABLE IF NOT EXISTS results "
+                            "(key TEXT PRIMARY KEY, text TEXT NOT NULL, seconds REAL NOT NULL, last_used REAL NOT NULL)")
+            self.db.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)")
+            self.db.commit()
+
+    @staticmethod
+    def make_key(image, lang, options="") -> str:
+        """Return cache key of PIL Image read with language parameter string lang and engine options."""
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(f"{image.mode}:{image.width}x{image.height}:{lang}:{options}".encode("utf-8"))
+        digest.update(image.tobytes())
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Return cached text for key, or None if it has not been read before."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.memory_hits += 1
+                self.seconds_saved += entry[1]
+                return entry[0]
+            if self.db is not None:
+                row = self.db.execute("SELECT text, seconds FROM results WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    self.db.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key))
+                    self.db.commit()
+                    self.disk_hits += 1
+                    self.seconds_saved += row[1]
+                    self.remember(key, row[0], row[1])
+                    return row[0]
+            self.misses += 1
+            return None
+
+    def put(self, key, text, seconds):
+        """Store text read in seconds under key."""
+        with self.lock:
+            self.remember(key, text, seconds)
+            if self.db is not None:
+                self.db.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)", (key, text, seconds, time.time()))
+                count = self.db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+                if count > self.max_db_entries:
+                    #Delete the least recently used results over the limit
+                    self.db.execute("DELETE FROM results WHERE key IN "
+                                    "(SELECT key FROM results ORDER BY last_used LIMIT ?)", (count - self.max_db_entries,))
+                self.db.commit()
+
+    def remember(self, key, text, seconds):
+        """Add result to the in-memory LRU and evict the oldest results over the limit."""
+        if self.max_entries <= 0:
+            return
+        self.entries[key] = (text, seconds)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        """Return hit and miss counters, hit rate and seconds of OCR saved."""
+        with self.lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            hits = self.memory_hits + self.disk_hits
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "seconds_saved": self.seconds_saved,
+                "memory_entries": len(self.entries),
+            }
+
+    def clear(self):
+        """Remove all cached results from both tiers."""
+        with self.lock:
+            self.entries.clear()
+            if self.db is not None:
+                self.db.execute("DELETE FROM results")
+                self.db.commit()
+
+    def close(self):
+        """Close the SQLite file."""
+        with self.lock:
+            if self.db is not None:
+                self.db.close()
+                self.db = None
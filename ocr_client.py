@@ -0,0 +1,180 @@
+"""
+Client of the OCR service started with ocr_service.py.
+
+Keeps one connection open for every request and can pipeline requests, sending several before reading any
+response. Run from the command line to read image files:
+    python ocr_client.py scan1.png scan2.png [--combo eng+deu] [--socket PATH | --port 8765] [--json]
+"""
+import argparse
+import json
+import pathlib
+import socket
+import sys
+from urllib.parse import urlencode
+
+#Port of the service when no Unix socket is given, same as ocr_service.DEFAULT_PORT
+DEFAULT_PORT = 8765
+
+
+class OcrServiceError(RuntimeError):
+    """Raised when the service answers with an error status."""
+    def __init__(self, status, message):
+        super().__init__(f"{status}: {message}")
+        self.status = status
+
+
+class OcrClient:
+    """HTTP/1.1 connection to the OCR service on a Unix socket at socket_path, or on 127.0.0.1:port."""
+    def __init__(self, socket_path=None, port=DEFAULT_PORT, timeout=None):
+        self.socket_path = socket_path
+        self.port = port
+        self.timeout = timeout
+        self.sock = None
+        self.reader = None
+
+    def connect(self):
+        """Open the connection if it isn't open."""
+        if self.sock is not None:
+            return
+        if self.socket_path:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.settimeout(self.timeout)
+            self.sock.connect(self.socket_path)
+        else:
+            self.sock = socket.create_connection(("127.0.0.1", self.port), self.timeout)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, True)
+        self.reader = self.sock.makefile("rb")
+
+    def close(self):
+        """Close the connection."""
+        if self.sock is not None:
+            self.reader.close()
+            self.sock.close()
+            self.sock = None
+            self.reader = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @staticmethod
+    def encode_request(method, path, body=b"") -> bytes:
+        """Return bytes of an HTTP/1.1 request."""
+        head = f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(body)}\r\n\r\n"
+        return head.encode("ascii") + body
+
+    def read_response(self) -> tuple:
+        """Return status, whether the server closes the connection and body of the next response."""
+        status_line = self.reader.readline()
+        if not status_line:
+            raise ConnectionError("Service closed the connection")
+        status = int(status_line.split()[1])
+        length = 0
+        closing = False
+        while True:
+            line = self.reader.readline().strip()
+            if not line:
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            name = name.strip().lower()
+            if name == "content-length":
+                length = int(value)
+            elif name == "connection" and value.strip().lower() == "close":
+                closing = True
+        return status, closing, self.reader.read(length)
+
+    def pipeline(self, requests) -> list:
+        """
+        Send every (method, path, body) request before reading any response, return list of (status, body).
+
+        The connection is opened if it isn't open, and closed if the service closes it or a response is missing.
+        """
+        self.connect()
+        self.sock.sendall(b"".join(self.encode_request(*request) for request in requests))
+        responses = []
+        closing = False
+        try:
+            for request in requests:
+                status, closing, body = self.read_response()
+                responses.append((status, body))
+                if closing:
+                    break
+        finally:
+            if closing or len(responses) < len(requests):
+                self.close()
+        return responses
+
+    def request(self, method, path, body=b"") -> bytes:
+        """Send one request and return the response body, raise OcrServiceError on error status."""
+        try:
+            status, body = self.pipeline([(method, path, body)])[0]
+        except ConnectionError:
+            #Kept-alive connection was closed by the service while idle, retry once on a new one
+            self.close()
+            status, body = self.pipeline([(method, path, body)])[0]
+        if status != 200:
+            raise OcrServiceError(status, body.decode("utf-8", "replace"))
+        return body
+
+    @staticmethod
+    def ocr_path(combo=None, lang=None, as_json=False, use_cache=True) -> str:
+        """Return request path of /ocr with the given language combination or language parameters."""
+        query = {}
+        if combo is not None:
+            query["combo"] = combo
+        if lang is not None:
+            query["lang"] = lang
+        if as_json:
+            query["format"] = "json"
+        if not use_cache:
+            query["cache"] = "0"
+        return "/ocr" + (f"?{urlencode(query)}" if query else "")
+
+    def ocr(self, data, combo=None, lang=None) -> str:
+        """Return text read from image file bytes with a saved combo, language parameters or the default language."""
+        return self.request("POST", self.ocr_path(combo, lang), data).decode("utf-8")
+
+    def ocr_json(self, data, combo=None, lang=None) -> dict:
+        """Return dict with text, language parameters, cache hit and seconds read from image file bytes."""
+        return json.loads(self.request("POST", self.ocr_path(combo, lang, True), data))
+
+    def combos(self) -> list:
+        """Return saved language combinations."""
+        return json.loads(self.request("GET", "/combos"))
+
+
+def main(argv=None) -> int:
+    """Read image files given on the command line with the service, printing the text of each."""
+    parser = argparse.ArgumentParser(prog="ocr_client.py", description="Read images with the OCR service.")
+    parser.add_argument("images", nargs="*", help="image files")
+    address = parser.add_mutually_exclusive_group()
+    address.add_argument("--socket", metavar="PATH", help="Unix domain socket of the service")
+    address.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"port of the service (default: {DEFAULT_PORT})")
+    language = parser.add_mutually_exclusive_group()
+    language.add_argument("--combo", help="saved language combination")
+    language.add_argument("-l", "--lang", help="Tesseract language parameters")
+    parser.add_argument("--json", action="store_true", help="print a JSON object per image")
+    parser.add_argument("--combos", action="store_true", help="list saved language combinations")
+    args = parser.parse_args(argv)
+    failed = 0
+    with OcrClient(args.socket, args.port) as client:
+        if args.combos:
+            print("\n".join(client.combos()))
+        for image in args.images:
+            try:
+                data = pathlib.Path(image).read_bytes()
+                if args.json:
+                    print(json.dumps(dict(client.ocr_json(data, args.combo, args.lang), path=image),
+                                     ensure_ascii=False))
+                else:
+                    print(client.ocr(data, args.combo, args.lang))
+            except (OSError, OcrServiceError) as e:
+                failed += 1
+                print(f"{image}: {e}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,503 @@
+"""
+OCR pipeline of Screenshot OCR without any GUI dependency.
+
+Importing this module is cheap: PIL, pytesseract, NumPy and the engine modules are only imported when a function
+that needs them is called, and config.ini is only read or created by load_config.
+"""
+import pathlib
+import time
+from datetime import datetime
+import metrics
+
+DESKTOP = pathlib.Path.home() / 'Desktop'
+#Path to TesseractOCR.exe used until the user sets another one
+DEFAULT_TESSERACT_PATH = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
+#File the user configuration is saved in
+CONFIG_PATH = "config.ini"
+#Images with at least this many pixels are read in tiles by default
+DEFAULT_TILE_MIN_PIXELS = 4000000
+
+def create_config(path=CONFIG_PATH):
+    """Return empty ConfigStore that writes changes to config.ini at path."""
+    from config_store import ConfigStore
+    return ConfigStore(path)
+
+def set_default_config(config):
+    """Add [DEFAULT], [USERCONFIG], [SAVED_LANG_COMBOS] and [PREPROCESS] sections with default values to config."""
+    config.add_section("DEFAULT")
+    config.add_section("USERCONFIG")
+    for section in config.sections():
+        #Path to TesseractOCR.exe
+        config.set(section, "tesseract_path", DEFAULT_TESSERACT_PATH)
+        #Language to be automatically selected on application launch if default_is_combo is False
+        config.set(section, "default_lang_main", "English")
+        #Setting to load saved language combination instead of just one language if True
+        config.set(section, "default_is_combo", str(False))
+        #Language combination to be automatically selected on application launch if default_is_combo is True
+        config.set(section, "default_lang_combo", "")
+        #Last directory of file selected from read_image_file function
+        config.set(section, "lastdir", str(DESKTOP))
+        #Setting to automatically save OCR output as txt file if True
+        config.set(section, "autosavetxt", str(False))
+        #Setting to save screenshot snippet as png file if True
+        config.set(section, "autosaveimg", str(False))
+        #Seconds between checks of a watched region for changes
+        config.set(section, "watch_interval", "1.0")
+        #Fraction of one core that checking and reading a watched region may use on average
+        config.set(section, "watch_cpu_budget", "0.25")
+        #Change in mean brightness (0-255) of a 16x16 block of a watched region that counts as changed
+        config.set(section, "watch_threshold", "6.0")
+        #Setting to capture every screen once when a snippet starts and select from that still image if True
+        config.set(section, "freeze_frame", str(False))
+        #Setting to automatically copy OCR output to user clipboard if True
+        config.set(section, "autocopy", str(False))
+        #Setting to disable all keyboard shortcut in application if True
+        config.set(section, "disable_shortcuts", str(False))
+        #Custom save folder for saved txt files (Default is root folder of application)
+        config.set(section, "savetxtpath", "")
+        #Custom save folder for saved image files (Default is root folder of application)
+        config.set(section, "saveimgpath", "")
+        #How saved snippets are stored ("files" saves every snippet as its own png file, "archive" packs them into
+        #a few tar files in the save folder named by their content, so identical snippets are only stored once)
+        config.set(section, "saveimg_storage", "files")
+        #Megabytes a tar file of the snippet archive may grow to before the next one is started
+        config.set(section, "archive_shard_size", "256")
+        #Folder files read in hot folder mode are moved to (Default is a 'done' folder inside the watched folder)
+        config.set(section, "hot_folder_done_path", "")
+        #Folder files that couldn't be read in hot folder mode are moved to (Default is a 'failed' folder inside it)
+        config.set(section, "hot_folder_failed_path", "")
+        #Seconds the size of a new file in the hot folder must stay the same before it is read
+        config.set(section, "hot_folder_settle", "2.0")
+        #Seconds between listings of the hot folder when it isn't watched with inotify
+        config.set(section, "hot_folder_poll_interval", "2.0")
+        #Number of hot folder files waiting to be read before no more are picked up
+        config.set(section, "hot_folder_max_queued", "256")
+        #Unix domain socket the OCR service listens on, "" listens on 127.0.0.1:service_port instead
+        config.set(section, "service_socket", "")
+        #Port the OCR service listens on when service_socket is ""
+        config.set(section, "service_port", "8765")
+        #Number of images the OCR service reads at the same time, 0 uses the number of cores
+        config.set(section, "service_max_concurrent", "0")
+        #Number of connections the OCR service keeps open at once
+        config.set(section, "service_max_connections", "64")
+        #Seconds a request to the OCR service waits for a free reading slot before it is turned away
+        config.set(section, "service_queue_timeout", "30")
+        #Seconds an idle connection to the OCR service stays open
+        config.set(section, "service_idle_timeout", "60")
+        #OCR engine used to read images ("pytesseract" runs tesseract.exe per image with temp files,
+        #"pipe" runs tesseract.exe per image over stdin/stdout, "capi" keeps models loaded in-process,
+        #"pool" reads images in worker processes that each run pool_engine and keep their models loaded)
+        config.set(section, "ocr_engine", "pytesseract")
+        #OCR engine every worker process of the "pool" engine uses
+        config.set(section, "pool_engine", "capi")
+        #Number of worker processes of the "pool" engine, 0 uses the number of cores
+        config.set(section, "pool_size", "0")
+        #Seconds a worker process of the "pool" engine may stay idle before it is stopped, 0 keeps it running
+        config.set(section, "pool_idle_timeout", "300")
+        #Setting to hand images to worker processes of the "pool" engine through shared memory instead of a pipe if True
+        config.set(section, "pool_shared_memory", str(True))
+        #Seconds before a Tesseract process is killed when reading an image, 0 means no limit
+        config.set(section, "ocr_timeout", "0")
+        #Number of OCR results kept in memory so identical images aren't read again, 0 disables the cache
+        config.set(section, "ocr_cache_size", "256")
+        #Setting to also keep OCR results in 'ocr_cache.sqlite' between uses if True
+        config.set(section, "ocr_cache_persist", str(False))
+        #Maximum number of OCR results kept in 'ocr_cache.sqlite'
+        config.set(section, "ocr_cache_persist_size", "10000")
+        #Setting to record every OCR result in a searchable history if True
+        config.set(section, "history_enabled", str(True))
+        #SQLite file the OCR history is kept in
+        config.set(section, "history_path", "ocr_history.sqlite")
+        #Path to Poppler's pdftoppm executable used to read PDF files
+        config.set(section, "pdftoppm_path", "pdftoppm")
+        #Resolution PDF pages are read at
+        config.set(section, "pdf_dpi", "300")
+        #Maximum number of pages of a PDF or multi-page image file held in memory while reading it
+        config.set(section, "max_pages_in_flight", "2")
+        #Images with at least this many pixels are split along blank space and read on all cores, 0 disables tiling
+        config.set(section, "tile_min_pixels", str(DEFAULT_TILE_MIN_PIXELS))
+        #Number of tiles read at the same time, 0 uses the number of cores
+        config.set(section, "tile_workers", "0")
+        #Result of reading a snippet ("text" keeps only the text, "words" also keeps the box and confidence of every
+        #word so words read with low confidence are highlighted and the result can be exported)
+        config.set(section, "result_mode", "text")
+        #Words read with a confidence (0-100) below this are highlighted when result_mode is "words"
+        config.set(section, "low_conf_threshold", "60")
+        #Format the words of every snippet are also saved in when autosavetxt is True and result_mode is "words"
+        #("json", "hocr", "alto" or "" to not export them)
+        config.set(section, "export_format", "")
+        #Maximum number of language combinations the "capi" engine keeps loaded at once
+        config.set(section, "engine_max_loaded", "3")
+        #Number of copies of a language combination's models the "capi" engine loads to read tiles and pages in
+        #parallel, 0 uses the number of cores
+        config.set(section, "engine_max_handles", "0")
+        #Setting to record how long capturing, converting, loading models, reading and saving take if True
+        config.set(section, "metrics_enabled", str(False))
+        #Number of most recent timings kept for every measured step
+        config.set(section, "metrics_ring_size", str(metrics.DEFAULT_RING_SIZE))
+        #File the timings are written to for monitoring (.json for JSON, Prometheus text otherwise), "" disables it
+        config.set(section, "metrics_file", "")
+        #Seconds between writes of metrics_file
+        config.set(section, "metrics_interval", str(metrics.DEFAULT_EXPORT_INTERVAL))
+    config.add_section("SAVED_LANG_COMBOS")
+    #Preprocessing stages used for each language combination (k = language parameter string, v = stages)
+    config.add_section("PREPROCESS")
+
+def load_config(path=CONFIG_PATH):
+    """
+    Return ConfigStore with saved settings from config.ini, creating the file with default settings if it doesn't exist.
+
+    Changed settings are written to config.ini shortly after they are set, see config_store.ConfigStore.
+    """
+    config = create_config(path)
+    if config.load():
+        if not config.has_section("PREPROCESS"):
+            #Section added after the first release, config.ini files created before it don't have it
+            config.add_section("PREPROCESS")
+    else:
+        #Creates default config.ini if it doesn't exist
+        set_default_config(config)
+        write_config(config)
+    return config
+
+def write_config(config):
+    """Write changed values to config.ini now instead of waiting for the scheduled flush."""
+    config.flush()
+
+def get_time_string() -> str:
+    """Generate a string based on current date and time."""
+    date_string = datetime.now().strftime("SSOCR-%Y%m%d-%H%M%S-%f")
+    return date_string
+
+def get_lang_param(main_lang, additional_langs, langs_swapped) -> str:
+    """Return a formatted language parameter string from full language names (langs_swapped maps names to langcodes)."""
+    #Gets the language parameter from the language name
+    lang_param = langs_swapped[main_lang]
+    #Checks if there are any added languages, sorted so the same languages always give the same string
+    for lang_code in sorted(langs_swapped[lang] for lang in additional_langs):
+        #Adds the language(s) to the lang parameter
+        lang_param += f"+{lang_code}"
+    return lang_param
+
+def normalize_lang_param(lang_param) -> str:
+    """Return language parameter string with the languages after the main language sorted, like get_lang_param."""
+    main_lang, *additional_langs = lang_param.split("+")
+    return "+".join([main_lang] + sorted(additional_langs))
+
+def get_default_lang_param(config) -> str:
+    """Return Tesseract language parameter string of the saved default language or language combination."""
+    if config.getboolean("USERCONFIG", "default_is_combo"):
+        return config.get("USERCONFIG", "default_lang_combo")
+    default_lang = config.get("USERCONFIG", "default_lang_main")
+    for code, name in lang_codes_dict.items():
+        if name == default_lang:
+            return code
+    #Languages without a full name in lang_codes_dict are shown as their langcode
+    return default_lang
+
+def get_preprocess_stages(config, lang_param) -> tuple:
+    """Return preprocessing stages saved for language parameter string in config, whatever the order of its languages."""
+    import ocr_preprocess
+    stages = config.get("PREPROCESS", normalize_lang_param(lang_param), fallback=None)
+    if stages is None:
+        #Keys saved before the languages were sorted may list them in any order
+        for saved_param in config["PREPROCESS"]:
+            if normalize_lang_param(saved_param) == normalize_lang_param(config.optionxform(lang_param)):
+                stages = config.get("PREPROCESS", saved_param)
+                break
+    return ocr_preprocess.parse_stages(stages or "")
+
+def create_engine(config, allow_pool=True):
+    """
+    Return OCR engine selected in config.
+
+    If allow_pool is False the "pool" engine is replaced by its pool_engine, for callers that already run one
+    engine per worker process (batch and hot folder mode), which would otherwise each start a pool of their own.
+    """
+    import pytesseract
+    import ocr_engine
+    from worker_pool import DEFAULT_WORKER_ENGINE
+    pytesseract.pytesseract.tesseract_cmd = config.get("USERCONFIG", "tesseract_path")
+    engine_name = config.get("USERCONFIG", "ocr_engine", fallback="pytesseract")
+    if engine_name == "pool" and not allow_pool:
+        engine_name = config.get("USERCONFIG", "pool_engine", fallback=DEFAULT_WORKER_ENGINE)
+    if engine_name == "pool":
+        from worker_pool import WorkerPool, DEFAULT_IDLE_TIMEOUT
+        return WorkerPool(config.get("USERCONFIG", "pool_engine", fallback=DEFAULT_WORKER_ENGINE),
+                          config.get("USERCONFIG", "tesseract_path"),
+                          config.getint("USERCONFIG", "pool_size", fallback=0),
+                          config.getint("USERCONFIG", "engine_max_loaded", fallback=3),
+                          config.getfloat("USERCONFIG", "ocr_timeout", fallback=0),
+                          config.getfloat("USERCONFIG", "pool_idle_timeout", fallback=DEFAULT_IDLE_TIMEOUT),
+                          config.getboolean("USERCONFIG", "pool_shared_memory", fallback=True))
+    return ocr_engine.get_engine(engine_name, config.get("USERCONFIG", "tesseract_path"),
+                                 config.getint("USERCONFIG", "engine_max_loaded", fallback=3),
+                                 config.getfloat("USERCONFIG", "ocr_timeout", fallback=0),
+                                 config.getint("USERCONFIG", "engine_max_handles", fallback=0))
+
+def create_cache(config):
+    """Return OcrCache configured in config, or None if the cache is disabled."""
+    cache_size = config.getint("USERCONFIG", "ocr_cache_size", fallback=256)
+    persist_cache = config.getboolean("USERCONFIG", "ocr_cache_persist", fallback=False)
+    if cache_size <= 0 and not persist_cache:
+        return None
+    from ocr_cache import OcrCache
+    return OcrCache(cache_size, "ocr_cache.sqlite" if persist_cache else None,
+                    config.getint("USERCONFIG", "ocr_cache_persist_size", fallback=10000))
+
+def create_history(config):
+    """Return OcrHistory configured in config, or None if the history is disabled or can't be opened."""
+    if not config.getboolean("USERCONFIG", "history_enabled", fallback=True):
+        return None
+    import sqlite3
+    from ocr_history import OcrHistory, DEFAULT_HISTORY_PATH
+    try:
+        return OcrHistory(config.get("USERCONFIG", "history_path", fallback=DEFAULT_HISTORY_PATH) or
+                          DEFAULT_HISTORY_PATH)
+    except sqlite3.Error:
+        #SQLite without FTS5 or a history file that can't be opened
+        return None
+
+def start_metrics(config):
+    """Turn timing spans on or off as set in config, return MetricsExporter writing metrics_file or None."""
+    metrics.configure(config.getboolean("USERCONFIG", "metrics_enabled", fallback=False),
+                      config.getint("USERCONFIG", "metrics_ring_size", fallback=metrics.DEFAULT_RING_SIZE))
+    path = config.get("USERCONFIG", "metrics_file", fallback="")
+    if not metrics.enabled or path == "":
+        return None
+    exporter = metrics.MetricsExporter(path, config.getfloat("USERCONFIG", "metrics_interval",
+                                                             fallback=metrics.DEFAULT_EXPORT_INTERVAL))
+    exporter.start()
+    return exporter
+
+def get_tile_settings(config) -> tuple:
+    """Return minimum pixel count for tiled OCR and number of tiles read at the same time from config."""
+    return (config.getint("USERCONFIG", "tile_min_pixels", fallback=DEFAULT_TILE_MIN_PIXELS),
+            config.getint("USERCONFIG", "tile_workers", fallback=0))
+
+def ocr_image(image, lang_param, engine, cache=None, preprocess_stages=(), tile_min_pixels=0, tile_workers=0) -> tuple:
+    """
+    Use TesseractOCR to extract text from PIL Image.
+
+    Return the text without trailing whitespace, whether it came from the cache and the seconds spent in every
+    preprocessing stage.
+    """
+    with metrics.span("ocr_image"):
+        return _ocr_image(image, lang_param, engine, cache, preprocess_stages, tile_min_pixels, tile_workers)
+
+def ocr_image_words(image, lang_param, engine, cache=None, preprocess_stages=()) -> tuple:
+    """
+    Use TesseractOCR to extract words with their boxes and confidences from PIL Image.
+
+    Return OcrWords with boxes in pixels of image, whether it came from the cache and the seconds spent in every
+    preprocessing stage. Large images are never tiled, so boxes stay in one coordinate system.
+    """
+    from ocr_result import OcrWords
+    with metrics.span("ocr_image"):
+        tsv, cached, timings = _ocr_image(image, lang_param, engine, cache, preprocess_stages, 0, 0, True)
+    with metrics.span("parse_words"):
+        words = OcrWords.from_tsv(tsv)
+        words.rescale(image.size)
+    return words, cached, timings
+
+def _ocr_image(image, lang_param, engine, cache, preprocess_stages, tile_min_pixels, tile_workers,
+               structured=False) -> tuple:
+    """Return text (TSV if structured), whether it came from the cache and preprocessing timings, see ocr_image."""
+    if cache is not None:
+        from ocr_cache import OcrCache
+        #Everything that changes the text read from the same pixels: the DPI engines pass to Tesseract, tiling
+        #(decided on the preprocessed size, so the settings themselves are part of the key) and the output format
+        dpi = image.info.get("dpi", ("",))[0]
+        options = f"{engine.name}:{','.join(preprocess_stages)}:dpi={dpi}"
+        if structured:
+            options += ":tsv"
+        else:
+            options += f":tiles={tile_min_pixels},{tile_workers}"
+        cache_key = OcrCache.make_key(image, lang_param, options)
+        img_text = cache.get(cache_key)
+        if img_text is not None:
+            return img_text, True, {}
+    start_time = time.perf_counter()
+    timings = {}
+    if preprocess_stages:
+        import ocr_preprocess
+        with metrics.span("preprocess"):
+            image, timings = ocr_preprocess.preprocess(image, preprocess_stages)
+    if structured:
+        with metrics.span("recognize"):
+            img_text = engine.image_to_data(image, lang_param)
+    elif 0 < tile_min_pixels <= image.width * image.height:
+        #Read very large images in tiles on all cores
+        import ocr_tiling
+        with metrics.span("recognize_tiled"):
+            img_text = ocr_tiling.tiled_image_to_string(engine, image, lang_param, tile_workers).strip()
+    else:
+        with metrics.span("recognize"):
+            img_text = engine.image_to_string(image, lang_param).strip()
+    if cache is not None:
+        cache.put(cache_key, img_text, time.perf_counter() - start_time)
+    return img_text, False, timings
+
+def read_file(path, lang_param, engine, cache=None, preprocess_stages=(), tile_min_pixels=0, tile_workers=0) -> str:
+    """Return text of every page of image file or PDF document at path, reading one decoded page at a time."""
+    import page_reader
+    page_texts = []
+    for page in page_reader.iter_pages(path):
+        page_texts.append(ocr_image(page, lang_param, engine, cache, preprocess_stages,
+                                    tile_min_pixels, tile_workers)[0])
+    return "\n\n".join(page_texts)
+
+def get_save_folder(config, cfg_var) -> str:
+    """Return formatted savepath for specified savefolder variable in config.ini."""
+    save_path = config.get("USERCONFIG", cfg_var)
+    if save_path != "":
+        if pathlib.Path(save_path).exists() is False:
+            #Create directory if it doesn't exist
+            pathlib.Path(save_path).mkdir(parents=True)
+        #Append forward-slash if user has specified custom save folder
+        save_path = save_path+"/"
+    return save_path
+
+def save_txt_file(config, output):
+    """Save output to txt file named after current datetime in the save folder for text files, return its path."""
+    if output == "":
+        #Don't save if output is empty
+        return None
+    #Name txt file after current datetime
+    date_string = get_time_string()
+    #Set savepath based on user specified save folder
+    save_path = get_save_folder(config, "savetxtpath")
+    full_path = f"{save_path}{date_string}.txt"
+    with metrics.span("save_txt_file"), open(full_path, "w", encoding="utf-8") as file:
+        file.write(output)
+    return full_path
+
+#Dictionary to convert TesseractOCR language codes to their full names
+lang_codes_dict = {
+    "afr": "Afrikaans",
+    "amh": "Amharic",
+    "ara": "Arabic",
+    "asm": "Assamese",
+    "aze": "Azerbaijani",
+    "aze_cyrl": "Azerbaijani - Cyrilic",
+    "bel": "Belarusian",
+    "ben": "Bengali",
+    "bod": "Tibetan",
+    "bos": "Bosnian",
+    "bre": "Breton",
+    "bul": "Bulgarian",
+    "cat": "Catalan; Valencian",
+    "ceb": "Cebuano",
+    "ces": "Czech",
+    "chi_sim": "Chinese - Simplified",
+    "chi_tra": "Chinese - Traditional",
+    "chr": "Cherokee",
+    "cos": "Corsican",
+    "cym": "Welsh",
+    "dan": "Danish",
+    "dan_frak": "Danish - Fraktur (contrib)",
+    "deu": "German",
+    "deu_frak": "German - Fraktur (contrib)",
+    "dzo": "Dzongkha",
+    "ell": "Greek, Modern (1453-)",
+    "eng": "English",
+    "enm": "English, Middle (1100-1500)",
+    "epo": "Esperanto",
+    "equ": "Math / equation detection module",
+    "est": "Estonian",
+    "eus": "Basque",
+    "fao": "Faroese",
+    "fas": "Persian",
+    "fil": "Filipino (old - Tagalog)",
+    "fin": "Finnish",
+    "fra": "French",
+    "frk": "German - Fraktur",
+    "frm": "French, Middle (ca.1400-1600)",
+    "fry": "Western Frisian",
+    "gla": "Scottish Gaelic",
+    "gle": "Irish",
+    "glg": "Galician",
+    "grc": "Greek, Ancient (to 1453) (contrib)",
+    "guj": "Gujarati",
+    "hat": "Haitian; Haitian Creole",
+    "heb": "Hebrew",
+    "hin": "Hindi",
+    "hrv": "Croatian",
+    "hun": "Hungarian",
+    "hye": "Armenian",
+    "iku": "Inuktitut",
+    "ind": "Indonesian",
+    "isl": "Icelandic",
+    "ita": "Italian",
+    "ita_old": "Italian - Old",
+    "jav": "Javanese",
+    "jpn": "Japanese",
+    "kan": "Kannada",
+    "kat": "Georgian",
+    "kat_old": "Georgian - Old",
+    "kaz": "Kazakh",
+    "khm": "Central Khmer",
+    "kir": "Kirghiz; Kyrgyz",
+    "kmr": "Kurmanji (Kurdish - Latin Script)",
+    "kor": "Korean",
+    "kor_vert": "Korean (vertical)",
+    "kur": "Kurdish (Arabic Script)",
+    "lao": "Lao",
+    "lat": "Latin",
+    "lav": "Latvian",
+    "lit": "Lithuanian",
+    "ltz": "Luxembourgish",
+    "mal": "Malayalam",
+    "mar": "Marathi",
+    "mkd": "Macedonian",
+    "mlt": "Maltese",
+    "mon": "Mongolian",
+    "mri": "Maori",
+    "msa": "Malay",
+    "mya": "Burmese",
+    "nep": "Nepali",
+    "nld": "Dutch; Flemish",
+    "nor": "Norwegian",
+    "oci": "Occitan (post 1500)",
+    "ori": "Oriya",
+    "osd": "Orientation and script detection module",
+    "pan": "Panjabi; Punjabi",
+    "pol": "Polish",
+    "por": "Portuguese",
+    "pus": "Pushto; Pashto",
+    "que": "Quechua",
+    "ron": "Romanian; Moldavian; Moldovan",
+    "rus": "Russian",
+    "san": "Sanskrit",
+    "sin": "Sinhala; Sinhalese",
+    "slk": "Slovak",
+    "slk_frak": "Slovak - Fraktur (contrib)",
+    "slv": "Slovenian",
+    "snd": "Sindhi",
+    "spa": "Spanish; Castilian",
+    "spa_old": "Spanish; Castilian - Old",
+    "sqi": "Albanian",
+    "srp": "Serbian",
+    "srp_latn": "Serbian - Latin",
+    "sun": "Sundanese",
+    "swa": "Swahili",
+    "swe": "Swedish",
+    "syr": "Syriac",
+    "tam": "Tamil",
+    "tat": "Tatar",
+    "tel": "Telugu",
+    "tgk": "Tajik",
+    "tgl": "Tagalog (new - Filipino)",
+    "tha": "Thai",
+    "tir": "Tigrinya",
+    "ton": "Tonga",
+    "tur": "Turkish",
+    "uig": "Uighur; Uyghur",
+    "ukr": "Ukrainian",
+    "urd": "Urdu",
+    "uzb": "Uzbek",
+    "uzb_cyrl": "Uzbek - Cyrilic",
+    "vie": "Vietnamese",
+    "yid": "Yiddish",
+    "yor": "Yoruba"
+}
@@ -0,0 +1,328 @@
+import ctypes
+import ctypes.util
+import io
+import os
+import pathlib
+import subprocess
+import threading
+from collections import OrderedDict
+import pytesseract as ocr
+from PIL import Image
+import metrics
+
+#Names libtesseract is shipped under, newest first
+LIBTESSERACT_NAMES = ["libtesseract-5.dll", "libtesseract-4.dll", "tesseract50.dll", "tesseract41.dll",
+                      "libtesseract.so.5", "libtesseract.so.4", "libtesseract.dylib"]
+#Resolution passed to Tesseract when the image has no dpi information (same as the tesseract executable)
+DEFAULT_DPI = 70
+
+
+class EngineError(RuntimeError):
+    """Raised when an OCR engine can not be loaded or fails to read an image."""
+
+
+class PytesseractEngine:
+    """OCR engine that runs the tesseract executable through pytesseract for every image."""
+    name = "pytesseract"
+
+    def __init__(self, timeout=0):
+        #Seconds before Tesseract is killed, 0 means no limit
+        self.timeout = timeout
+        #Why get_engine returned this engine instead of the requested one, None if this one was requested
+        self.fallback_reason = None
+
+    def image_to_string(self, image, lang) -> str:
+        """Return text read from PIL Image with the language parameter string lang."""
+        return ocr.image_to_string(image, lang=lang, timeout=self.timeout)
+
+    def image_to_data(self, image, lang) -> str:
+        """Return words read from PIL Image with their boxes and confidences as Tesseract TSV."""
+        return ocr.image_to_data(image, lang=lang, timeout=self.timeout)
+
+    def close(self):
+        """Nothing to release for the subprocess engine."""
+
+
+class PipeEngine:
+    """
+    OCR engine that streams an uncompressed image to 'tesseract stdin stdout' and reads the text from the pipe.
+
+    Unlike pytesseract, no temporary image or output files are written to disk.
+    """
+    name = "pipe"
+
+    def __init__(self, tesseract_cmd=None, timeout=0):
+        self.tesseract_cmd = tesseract_cmd or ocr.pytesseract.tesseract_cmd
+        #Seconds before Tesseract is killed, 0 means no limit
+        self.timeout = timeout
+        #Hide the console window tesseract.exe would open on Windows
+        self.creationflags = getattr(subprocess, "CREATE_NO_WINDOW", 0)
+
+    @staticmethod
+    def encode_image(image) -> bytes:
+        """Return PIL Image encoded as uncompressed PNM (PBM, PGM or PPM depending on mode)."""
+        if "A" in image.getbands():
+            #Flatten transparency onto white instead of letting it turn black
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            background.paste(image.convert("RGBA"), mask=image.getchannel("A"))
+            image = background
+        elif image.mode not in ("1", "L", "RGB"):
+            image = image.convert("RGB")
+        buffer = io.BytesIO()
+        image.save(buffer, "PPM")
+        return buffer.getvalue()
+
+    def image_to_string(self, image, lang) -> str:
+        """Return text read from PIL Image with the language parameter string lang."""
+        return self.run(image, lang)
+
+    def image_to_data(self, image, lang) -> str:
+        """Return words read from PIL Image with their boxes and confidences as Tesseract TSV."""
+        return self.run(image, lang, ["tsv"])
+
+    def run(self, image, lang, configs=()) -> str:
+        """Run tesseract on PIL Image with output configs (plain text if empty) and return its output."""
+        command = [self.tesseract_cmd, "stdin", "stdout", "-l", lang]
+        if "dpi" in image.info:
+            command += ["--dpi", str(round(image.info["dpi"][0]))]
+        command += configs
+        try:
+            result = subprocess.run(command, input=self.encode_image(image), capture_output=True,
+                                    timeout=self.timeout or None, creationflags=self.creationflags)
+        except FileNotFoundError:
+            raise ocr.TesseractNotFoundError()
+        except subprocess.TimeoutExpired:
+            raise EngineError(f"Tesseract did not finish within {self.timeout} seconds")
+        if result.returncode != 0:
+            raise EngineError(result.stderr.decode("utf-8", "replace").strip())
+        return result.stdout.decode("utf-8")
+
+    def close(self):
+        """Nothing to release for the subprocess engine."""
+
+
+class _LoadedApi:
+    """Initialized TessBaseAPI handles for one language combination."""
+    def __init__(self):
+        #TessBaseAPI is not thread-safe, so every thread reading with this combination takes a handle of its own
+        self.idle = []
+        #Number of handles loaded or being loaded, idle or in use
+        self.count = 0
+        #Guards idle and count, waited on for a handle to become idle
+        self.condition = threading.Condition()
+        #Set when the handles were ended by the LRU so a waiting thread knows to retry
+        self.evicted = False
+
+
+class CApiEngine:
+    """
+    OCR engine that calls libtesseract's C API in-process through ctypes.
+
+    Keeps initialized TessBaseAPIs per language combination so the .traineddata files are only loaded once,
+    and ends the handles of the least recently used idle combinations when more than max_loaded are resident.
+    Reads of the same combination that overlap (tiles, pages) each load another handle, up to max_handles
+    (0 uses the number of cores), so they run in parallel instead of waiting for one handle.
+    """
+    name = "capi"
+
+    def __init__(self, tesseract_cmd=None, tessdata_path=None, max_loaded=3, max_handles=0):
+        self.lib = self.load_library(tesseract_cmd)
+        self.declare_functions()
+        if tessdata_path is None and tesseract_cmd:
+            #Windows installations keep tessdata next to tesseract.exe
+            candidate = pathlib.Path(tesseract_cmd).parent / "tessdata"
+            if candidate.is_dir():
+                tessdata_path = str(candidate)
+        self.tessdata_path = tessdata_path.encode("utf-8") if tessdata_path else None
+        self.max_loaded = max(1, max_loaded)
+        self.max_handles = max(1, max_handles or os.cpu_count() or 1)
+        #Initialized handles ordered from least to most recently used (k = language parameter string)
+        self.apis = OrderedDict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def load_library(tesseract_cmd):
+        """Return loaded libtesseract, looking next to tesseract_cmd first."""
+        candidates = []
+        if tesseract_cmd:
+            folder = pathlib.Path(tesseract_cmd).parent
+            candidates += [str(folder / name) for name in LIBTESSERACT_NAMES if (folder / name).exists()]
+        found = ctypes.util.find_library("tesseract")
+        if found:
+            candidates.append(found)
+        candidates += LIBTESSERACT_NAMES
+        for candidate in candidates:
+            try:
+                return ctypes.CDLL(candidate)
+            except OSError:
+                continue
+        raise EngineError("libtesseract could not be found")
+
+    def declare_functions(self):
+        """Set argument and return types of the used C API functions."""
+        lib = self.lib
+        lib.TessVersion.restype = ctypes.c_char_p
+        lib.TessBaseAPICreate.restype = ctypes.c_void_p
+        lib.TessBaseAPIInit3.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_char_p]
+        lib.TessBaseAPIInit3.restype = ctypes.c_int
+        lib.TessBaseAPISetImage.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_int, ctypes.c_int,
+                                            ctypes.c_int, ctypes.c_int]
+        lib.TessBaseAPISetSourceResolution.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        lib.TessBaseAPIGetUTF8Text.argtypes = [ctypes.c_void_p]
+        lib.TessBaseAPIGetUTF8Text.restype = ctypes.c_void_p
+        lib.TessBaseAPIGetTsvText.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        lib.TessBaseAPIGetTsvText.restype = ctypes.c_void_p
+        lib.TessDeleteText.argtypes = [ctypes.c_void_p]
+        lib.TessBaseAPIClear.argtypes = [ctypes.c_void_p]
+        lib.TessBaseAPIEnd.argtypes = [ctypes.c_void_p]
+        lib.TessBaseAPIDelete.argtypes = [ctypes.c_void_p]
+
+    def version(self) -> str:
+        """Return version string of the loaded libtesseract."""
+        return self.lib.TessVersion().decode("utf-8")
+
+    def init_handle(self, lang):
+        """Create a TessBaseAPI and load the models for language parameter string lang."""
+        handle = self.lib.TessBaseAPICreate()
+        if self.lib.TessBaseAPIInit3(handle, self.tessdata_path, lang.encode("utf-8")) != 0:
+            self.lib.TessBaseAPIDelete(handle)
+            raise EngineError(f"Tesseract could not load language '{lang}'")
+        return handle
+
+    def end_handle(self, handle):
+        """Free a TessBaseAPI and its loaded models."""
+        self.lib.TessBaseAPIEnd(handle)
+        self.lib.TessBaseAPIDelete(handle)
+
+    def acquire(self, lang) -> _LoadedApi:
+        """Return the cached entry for lang as most recently used and evict idle entries over the limit."""
+        with self.lock:
+            entry = self.apis.get(lang)
+            if entry is None:
+                entry = _LoadedApi()
+                self.apis[lang] = entry
+            self.apis.move_to_end(lang)
+            for old_lang in list(self.apis)[:-1]:
+                if len(self.apis) <= self.max_loaded:
+                    break
+                old_entry = self.apis[old_lang]
+                with old_entry.condition:
+                    #Only evict combinations whose handles are not currently loading or reading an image
+                    if len(old_entry.idle) == old_entry.count:
+                        del self.apis[old_lang]
+                        old_entry.evicted = True
+                        self.end_idle_handles(old_entry)
+        return entry
+
+    def end_idle_handles(self, entry):
+        """End the idle handles of entry and wake up threads waiting for one, entry.condition must be held."""
+        for handle in entry.idle:
+            self.end_handle(handle)
+        entry.count -= len(entry.idle)
+        entry.idle.clear()
+        entry.condition.notify_all()
+
+    def take_handle(self, lang) -> tuple:
+        """Return entry for lang and an idle handle of it, loading another handle if all are in use."""
+        while True:
+            entry = self.acquire(lang)
+            with entry.condition:
+                while not entry.evicted and not entry.idle and entry.count >= self.max_handles:
+                    entry.condition.wait()
+                if entry.evicted:
+                    #Handles were evicted between acquire and the wait, get a fresh entry
+                    continue
+                if entry.idle:
+                    return entry, entry.idle.pop()
+                entry.count += 1
+            try:
+                #Loaded without holding the condition so idle handles can be used meanwhile
+                with metrics.span("load_model"):
+                    return entry, self.init_handle(lang)
+            except BaseException:
+                #An entry whose models failed to load stays empty and is retried or evicted later
+                with entry.condition:
+                    entry.count -= 1
+                    entry.condition.notify()
+                raise
+
+    def put_handle(self, entry, handle):
+        """Return handle taken with take_handle to the idle handles of entry, or end it if entry was closed."""
+        with entry.condition:
+            if entry.evicted:
+                self.end_handle(handle)
+                entry.count -= 1
+            else:
+                entry.idle.append(handle)
+            entry.condition.notify()
+
+    def image_to_string(self, image, lang) -> str:
+        """Return text read from PIL Image with the language parameter string lang."""
+        return self.read_image(image, lang, False)
+
+    def image_to_data(self, image, lang) -> str:
+        """Return words read from PIL Image with their boxes and confidences as Tesseract TSV (without header)."""
+        return self.read_image(image, lang, True)
+
+    def read_image(self, image, lang, tsv) -> str:
+        """Return text or TSV read from PIL Image."""
+        if image.mode not in ("L", "RGB", "RGBA"):
+            image = image.convert("RGB")
+        dpi = image.info.get("dpi", (DEFAULT_DPI,))[0] or DEFAULT_DPI
+        #Keep reference to the raw pixels while Tesseract reads them
+        pixels = image.tobytes()
+        return self.pixels_to_string(pixels, image.width, image.height, len(image.getbands()), dpi, lang, tsv)
+
+    def pixels_to_string(self, pixels, width, height, bytes_per_pixel, dpi, lang, tsv=False) -> str:
+        """
+        Return text (or TSV if tsv is True) read from raw 8-bit gray, RGB or RGBA pixels without line padding.
+
+        pixels is a bytes object or the address of a buffer the caller keeps alive until this returns.
+        """
+        entry, handle = self.take_handle(lang)
+        try:
+            self.lib.TessBaseAPISetImage(handle, pixels, width, height, bytes_per_pixel, width * bytes_per_pixel)
+            self.lib.TessBaseAPISetSourceResolution(handle, int(dpi))
+            if tsv:
+                text_ptr = self.lib.TessBaseAPIGetTsvText(handle, 0)
+            else:
+                text_ptr = self.lib.TessBaseAPIGetUTF8Text(handle)
+            try:
+                if not text_ptr:
+                    raise EngineError("Tesseract failed to read image")
+                return ctypes.string_at(text_ptr).decode("utf-8")
+            finally:
+                if text_ptr:
+                    self.lib.TessDeleteText(text_ptr)
+                #Release the image but keep the loaded models
+                self.lib.TessBaseAPIClear(handle)
+        finally:
+            self.put_handle(entry, handle)
+
+    def close(self):
+        """End all loaded TessBaseAPI handles."""
+        with self.lock:
+            for entry in self.apis.values():
+                with entry.condition:
+                    #Handles still reading an image are ended when they are put back
+                    entry.evicted = True
+                    self.end_idle_handles(entry)
+            self.apis.clear()
+
+
+def get_engine(name, tesseract_cmd=None, max_loaded=3, timeout=0, max_handles=0):
+    """
+    Return OCR engine by name, falling back to pytesseract if the in-process engine can't be loaded.
+
+    The reason of a fallback is kept in fallback_reason of the returned engine for the caller to show.
+    """
+    if name == CApiEngine.name:
+        try:
+            return CApiEngine(tesseract_cmd, max_loaded=max_loaded, max_handles=max_handles)
+        except (EngineError, OSError, AttributeError) as e:
+            engine = PytesseractEngine(timeout=timeout)
+            engine.fallback_reason = f"Could not load in-process Tesseract engine, using pytesseract instead: {e}"
+            return engine
+    elif name == PipeEngine.name:
+        return PipeEngine(tesseract_cmd, timeout=timeout)
+    return PytesseractEngine(timeout=timeout)
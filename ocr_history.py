@@ -0,0 +1,193 @@
+"""
+Searchable history of every OCR result, kept in an SQLite database with an FTS5 full-text index.
+
+Results are queued by record, which never waits for the disk, and written by a background thread in batches of one
+transaction each. Searches run on their own connection and see every batch written so far. Search text is split
+into words that must all appear, "quoted text" must appear as a phrase and the last word also matches longer words
+starting with it, so results narrow down while typing. Matches are returned newest first, which FTS5 reads straight
+from its index, so searching stays fast however many entries there are.
+"""
+import queue
+import re
+import sqlite3
+import threading
+import time
+import metrics
+
+#File the history is kept in
+DEFAULT_HISTORY_PATH = "ocr_history.sqlite"
+#Number of entries written in one transaction at most
+BATCH_SIZE = 256
+#Seconds the writer waits for more entries before writing a batch
+FLUSH_INTERVAL = 1.0
+#Number of entries waiting to be written before new ones are dropped
+MAX_QUEUED = 4096
+#Quoted phrases and single words of a search
+SEARCH_TOKENS = re.compile(r'"([^"]*)"?|(\S+)')
+
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS entries (id INTEGER PRIMARY KEY, created REAL NOT NULL, lang TEXT NOT NULL, "
+    "source TEXT NOT NULL, thumbnail TEXT, text TEXT NOT NULL)",
+    #External content index over entries.text, prefixes of 2 and 3 characters are indexed for search while typing
+    "CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5(text, content='entries', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT ON entries BEGIN "
+    "INSERT INTO entries_fts (rowid, text) VALUES (new.id, new.text); END",
+    "CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE ON entries BEGIN "
+    "INSERT INTO entries_fts (entries_fts, rowid, text) VALUES ('delete', old.id, old.text); END",
+]
+
+
+def fts_query(search) -> str:
+    """
+    Return FTS5 query matching entries that contain every word and "quoted phrase" of search.
+
+    The last word is matched as a prefix unless search ends with a space. Returns "" if search has no words.
+    """
+    terms = []
+    for phrase, word in SEARCH_TOKENS.findall(search):
+        text = phrase if phrase else word
+        #Quote every term so characters FTS5 treats as syntax are searched for as they are
+        words = re.findall(r"\w+", text)
+        if words:
+            terms.append(('"' + " ".join(words) + '"', bool(word)))
+    if not terms:
+        return ""
+    if terms[-1][1] and not search[-1:].isspace():
+        terms[-1] = (terms[-1][0] + "*", True)
+    return " ".join(term for term, _ in terms)
+
+
+class HistoryEntry:
+    """One recorded OCR result."""
+    __slots__ = ("id", "created", "lang", "source", "thumbnail", "text")
+
+    def __init__(self, id, created, lang, source, thumbnail, text):
+        self.id = id
+        #Seconds since the epoch the result was recorded at
+        self.created = created
+        #Language parameter string the image was read with
+        self.lang = lang
+        #"snippet", "watch" or path of the read file
+        self.source = source
+        #Path of the saved image, or None if it wasn't saved
+        self.thumbnail = thumbnail
+        #Whole text, or an excerpt around the matches for search results
+        self.text = text
+
+
+class OcrHistory:
+    """
+    OCR results recorded in the SQLite file at path.
+
+    record may be called from any thread. search and recent are meant for one thread (the GUI thread).
+    """
+    def __init__(self, path=DEFAULT_HISTORY_PATH, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL,
+                 max_queued=MAX_QUEUED):
+        self.path = str(path)
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        writer = self.connect()
+        with writer:
+            for statement in SCHEMA:
+                writer.execute(statement)
+        self.queue = queue.Queue(max_queued)
+        #Number of entries dropped because the queue was full
+        self.dropped = 0
+        self.reader = self.connect()
+        self.thread = threading.Thread(target=self.run, args=(writer,), name="OcrHistory", daemon=True)
+        self.thread.start()
+
+    def connect(self) -> sqlite3.Connection:
+        """Return new connection to the history file, in WAL mode so searches don't wait for writes."""
+        db = sqlite3.connect(self.path, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def record(self, text, lang, source, thumbnail=None) -> bool:
+        """Queue OCR result to be written, return False if too many are waiting and it was dropped."""
+        if text == "":
+            return False
+        try:
+            self.queue.put_nowait((time.time(), lang, source, thumbnail, text))
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def run(self, db):
+        """Write queued entries in batches until None is queued."""
+        try:
+            closing = False
+            while not closing:
+                entry = self.queue.get()
+                batch = []
+                deadline = time.monotonic() + self.flush_interval
+                while entry is not None:
+                    batch.append(entry)
+                    if len(batch) >= self.batch_size:
+                        break
+                    try:
+                        entry = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        break
+                closing = entry is None
+                if batch:
+                    self.write(db, batch)
+                for _ in range(len(batch) + closing):
+                    self.queue.task_done()
+        finally:
+            db.close()
+
+    @staticmethod
+    def write(db, batch):
+        """Insert batch of (created, lang, source, thumbnail, text) in one transaction."""
+        with metrics.span("history_write"):
+            try:
+                with db:
+                    #entries_insert indexes every row in the same transaction
+                    db.executemany("INSERT INTO entries (created, lang, source, thumbnail, text) "
+                                   "VALUES (?, ?, ?, ?, ?)", batch)
+            except sqlite3.Error:
+                #History is best effort, reading images must go on if the file can't be written
+                pass
+
+    def search(self, search, limit=100) -> list:
+        """Return up to limit HistoryEntry matching search newest first, with an excerpt around the matches."""
+        query = fts_query(search)
+        if query == "":
+            return self.recent(limit)
+        with metrics.span("history_search"):
+            rows = self.reader.execute(
+                "SELECT entries.id, created, lang, source, thumbnail, "
+                "snippet(entries_fts, 0, '[', ']', '...', 16) FROM entries_fts "
+                "JOIN entries ON entries.id = entries_fts.rowid "
+                "WHERE entries_fts MATCH ? ORDER BY entries_fts.rowid DESC LIMIT ?", (query, limit)).fetchall()
+        return [HistoryEntry(*row) for row in rows]
+
+    def recent(self, limit=100) -> list:
+        """Return the limit most recent HistoryEntry."""
+        rows = self.reader.execute("SELECT id, created, lang, source, thumbnail, text FROM entries "
+                                   "ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        return [HistoryEntry(*row) for row in rows]
+
+    def get(self, entry_id):
+        """Return HistoryEntry with the whole text of entry entry_id, or None if there is none."""
+        row = self.reader.execute("SELECT id, created, lang, source, thumbnail, text FROM entries WHERE id = ?",
+                                  (entry_id,)).fetchone()
+        return HistoryEntry(*row) if row is not None else None
+
+    def count(self) -> int:
+        """Return number of recorded entries."""
+        return self.reader.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def flush(self):
+        """Wait until every queued entry has been written."""
+        self.queue.join()
+
+    def close(self):
+        """Write the remaining entries and close the history file."""
+        self.queue.put(None)
+        self.thread.join()
+        self.reader.close()
@@ -0,0 +1,126 @@
+import time
+import numpy as np
+from PIL import Image
+
+#Stages in the order they are applied
+STAGES = ("grayscale", "invert", "upscale", "threshold")
+#Named stage combinations selectable in the GUI (k = name shown, v = stages)
+PRESETS = {
+    "No preprocessing": (),
+    "Grayscale": ("grayscale",),
+    "Grayscale + threshold": ("grayscale", "threshold"),
+    "Dark mode + upscale": ("grayscale", "invert", "upscale"),
+    "All": STAGES,
+}
+#x-height in pixels that small text is upscaled to
+TARGET_X_HEIGHT = 20
+#Largest factor small text is upscaled by
+MAX_UPSCALE = 4.0
+#Upscaling stops before the image gets more pixels than this
+MAX_UPSCALED_PIXELS = 16000000
+#Side of the square window used for local thresholding
+SAUVOLA_WINDOW = 25
+#Sensitivity of the threshold to local contrast
+SAUVOLA_K = 0.2
+#Dynamic range of the standard deviation for 8-bit images
+SAUVOLA_R = 128.0
+
+
+def parse_stages(value) -> tuple:
+    """Return tuple of known stages from a comma separated string, in the order they are applied."""
+    names = {name.strip() for name in value.split(",")}
+    return tuple(stage for stage in STAGES if stage in names)
+
+
+def to_gray_array(image) -> np.ndarray:
+    """Return luminance of PIL Image as float32 array."""
+    array = np.asarray(image.convert("RGB"), dtype=np.float32)
+    #ITU-R 601-2 luma, the same weights PIL uses for mode "L"
+    return array @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+def is_dark_mode(gray) -> bool:
+    """Return True if the image has light text on a dark background."""
+    return float(np.median(gray)) < 128
+
+
+def estimate_x_height(gray) -> float:
+    """Return estimated x-height in pixels from the heights of text lines, or 0 if no text lines are found."""
+    ink = np.abs(gray - np.median(gray)) > 48
+    rows = np.concatenate(([False], ink.any(axis=1), [False]))
+    edges = np.flatnonzero(np.diff(rows.astype(np.int8)))
+    heights = edges[1::2] - edges[0::2]
+    if len(heights) == 0:
+        return 0.0
+    #Line height including ascenders and descenders is about twice the x-height
+    return float(np.median(heights)) / 2
+
+
+def upscale(gray, target_x_height=TARGET_X_HEIGHT) -> np.ndarray:
+    """Return gray array scaled up so its text reaches target_x_height, or unchanged if text is large enough."""
+    x_height = estimate_x_height(gray)
+    if x_height <= 0 or x_height >= target_x_height:
+        return gray
+    scale = min(target_x_height / x_height, MAX_UPSCALE, (MAX_UPSCALED_PIXELS / gray.size) ** 0.5)
+    if scale <= 1:
+        return gray
+    size = (round(gray.shape[1] * scale), round(gray.shape[0] * scale))
+    return np.asarray(Image.fromarray(gray).resize(size, Image.BICUBIC), dtype=np.float32)
+
+
+def box_mean(values, half) -> np.ndarray:
+    """Return mean over a (2*half+1) square window around every pixel, shrinking the window at the edges."""
+    for axis in (0, 1):
+        length = values.shape[axis]
+        shape = list(values.shape)
+        shape[axis] = 1
+        #Running sums with a leading zero so every window sum is one subtraction
+        sums = np.concatenate((np.zeros(shape, dtype=values.dtype), values.cumsum(axis=axis)), axis=axis)
+        start = np.clip(np.arange(length) - half, 0, length)
+        end = np.clip(np.arange(length) + half + 1, 0, length)
+        counts = (end - start).astype(values.dtype).reshape([-1, 1] if axis == 0 else [1, -1])
+        values = (np.take(sums, end, axis=axis) - np.take(sums, start, axis=axis)) / counts
+    return values
+
+
+def sauvola_threshold(gray, window=SAUVOLA_WINDOW, k=SAUVOLA_K) -> np.ndarray:
+    """Return binarized uint8 array (0 ink, 255 background) using Sauvola's local threshold."""
+    values = gray.astype(np.float32, copy=False)
+    mean = box_mean(values, window // 2)
+    std = np.sqrt(np.maximum(box_mean(values * values, window // 2) - mean * mean, 0))
+    threshold = mean * (1 + k * (std / SAUVOLA_R - 1))
+    return np.where(values > threshold, 255, 0).astype(np.uint8)
+
+
+def preprocess(image, stages) -> tuple:
+    """
+    Apply stages to PIL Image and return the processed image and seconds spent in every stage.
+
+    Stages run in the order of STAGES, whichever order they are given in. Any stage implies grayscale.
+    """
+    timings = {}
+    if not stages:
+        return image, timings
+    start_time = time.perf_counter()
+    gray = to_gray_array(image)
+    timings["grayscale"] = time.perf_counter() - start_time
+    if "invert" in stages:
+        start_time = time.perf_counter()
+        if is_dark_mode(gray):
+            #Tesseract expects dark text on a light background
+            gray = 255 - gray
+        timings["invert"] = time.perf_counter() - start_time
+    if "upscale" in stages:
+        start_time = time.perf_counter()
+        gray = upscale(gray)
+        timings["upscale"] = time.perf_counter() - start_time
+    if "threshold" in stages:
+        start_time = time.perf_counter()
+        result = sauvola_threshold(gray)
+        timings["threshold"] = time.perf_counter() - start_time
+    else:
+        result = np.clip(gray + 0.5, 0, 255).astype(np.uint8)
+    processed = Image.fromarray(result)
+    if "dpi" in image.info:
+        processed.info["dpi"] = image.info["dpi"]
+    return processed, timings
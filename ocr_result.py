@@ -0,0 +1,245 @@
+"""
+Word-level OCR results stored in columns.
+
+Tesseract's TSV output is parsed into one NumPy array per field (block, paragraph and line numbers, box and
+confidence) and one string holding every word, word i being text[starts[i]:ends[i]]. JSON, hOCR and ALTO exports
+are generated piece by piece straight from the columns, without building an object per word.
+"""
+import json
+from array import array
+from xml.sax.saxutils import escape, quoteattr
+import numpy as np
+
+#Words with a confidence (0-100) below this are highlighted
+DEFAULT_LOW_CONFIDENCE = 60
+#File extension of every export format
+EXPORT_FORMATS = {"json": ".json", "hocr": ".hocr", "alto": ".xml"}
+#Level of page and word rows in Tesseract's TSV output
+TSV_PAGE_LEVEL = 1
+TSV_WORD_LEVEL = 5
+
+
+def bbox(box) -> str:
+    """Return hOCR bbox property of (left, top, right, bottom)."""
+    return "bbox " + " ".join(str(value) for value in box)
+
+
+class OcrWords:
+    """Words read from one image, with their boxes in pixels, confidences and position in the page layout."""
+    def __init__(self, text, starts, ends, blocks, paragraphs, lines, boxes, confidences, size=(0, 0)):
+        self.text = text
+        #Offsets of every word in text
+        self.starts = starts
+        self.ends = ends
+        #Block, paragraph (within block) and line (within paragraph) number of every word
+        self.blocks = blocks
+        self.paragraphs = paragraphs
+        self.lines = lines
+        #Array of shape (words, 4) with left, top, width and height of every word
+        self.boxes = boxes
+        #Confidence of every word, 0-100
+        self.confidences = confidences
+        #Width and height of the image
+        self.size = size
+
+    @classmethod
+    def from_tsv(cls, tsv) -> "OcrWords":
+        """Return words of Tesseract TSV output, with or without its header line."""
+        numbers = array("i")
+        confidences = array("f")
+        pieces = []
+        starts = array("q")
+        offset = 0
+        size = (0, 0)
+        for row in tsv.splitlines():
+            fields = row.split("\t", 11)
+            if len(fields) < 12 or not fields[0].isdigit():
+                #Header line and rows of empty lines
+                continue
+            level = int(fields[0])
+            if level == TSV_PAGE_LEVEL:
+                size = (int(fields[8]), int(fields[9]))
+                continue
+            word = fields[11].strip()
+            if level != TSV_WORD_LEVEL or word == "":
+                continue
+            #block_num, par_num, line_num, left, top, width, height
+            numbers.extend(int(field) for field in fields[2:5] + fields[6:10])
+            confidences.append(float(fields[10]))
+            starts.append(offset)
+            pieces.append(word)
+            offset += len(word)
+        columns = np.frombuffer(numbers, dtype=np.int32).reshape(-1, 7) if numbers else np.zeros((0, 7), np.int32)
+        starts = np.frombuffer(starts, dtype=np.int64) if starts else np.zeros(0, np.int64)
+        ends = starts + np.fromiter((len(piece) for piece in pieces), dtype=np.int64, count=len(pieces))
+        return cls("".join(pieces), starts, ends, columns[:, 0], columns[:, 1], columns[:, 2], columns[:, 3:7],
+                   np.frombuffer(confidences, dtype=np.float32) if confidences else np.zeros(0, np.float32), size)
+
+    def rescale(self, size):
+        """Scale boxes to an image of size (width, height), for words read from a resized copy of that image."""
+        if 0 in self.size or self.size == tuple(size):
+            self.size = tuple(size)
+            return
+        factors = np.array([size[0] / self.size[0], size[1] / self.size[1]] * 2)
+        self.boxes = np.rint(self.boxes * factors).astype(np.int32)
+        self.size = tuple(size)
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def word(self, index) -> str:
+        """Return text of word at index."""
+        return self.text[self.starts[index]:self.ends[index]]
+
+    def breaks(self) -> tuple:
+        """Return boolean arrays marking words that start a new block, paragraph and line."""
+        count = len(self)
+        new_block = np.ones(count, dtype=bool)
+        new_block[1:] = self.blocks[1:] != self.blocks[:-1]
+        new_paragraph = new_block.copy()
+        new_paragraph[1:] |= self.paragraphs[1:] != self.paragraphs[:-1]
+        new_line = new_paragraph.copy()
+        new_line[1:] |= self.lines[1:] != self.lines[:-1]
+        return new_block, new_paragraph, new_line
+
+    def layout_text(self) -> tuple:
+        """
+        Return text with words joined by spaces, lines by newlines and paragraphs by blank lines.
+
+        Also returns arrays with the start and end offset of every word in that text.
+        """
+        if len(self) == 0:
+            return "", self.starts, self.ends
+        new_block, new_paragraph, new_line = self.breaks()
+        separators = np.where(new_paragraph, "\n\n", np.where(new_line, "\n", " "))
+        separators[0] = ""
+        lengths = self.ends - self.starts
+        separator_lengths = np.char.str_len(separators).astype(np.int64)
+        starts = np.cumsum(separator_lengths) + np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        pieces = []
+        for index in range(len(self)):
+            pieces.append(separators[index])
+            pieces.append(self.text[self.starts[index]:self.ends[index]])
+        return "".join(pieces), starts, starts + lengths
+
+    def low_confidence(self, threshold=DEFAULT_LOW_CONFIDENCE) -> np.ndarray:
+        """Return boolean array of words read with a confidence below threshold."""
+        return self.confidences < threshold
+
+    def group_boxes(self, first_words) -> np.ndarray:
+        """Return (left, top, right, bottom) array of the groups of words starting at the indices first_words."""
+        left, top = self.boxes[:, 0], self.boxes[:, 1]
+        right, bottom = left + self.boxes[:, 2], top + self.boxes[:, 3]
+        return np.stack([np.minimum.reduceat(left, first_words), np.minimum.reduceat(top, first_words),
+                         np.maximum.reduceat(right, first_words), np.maximum.reduceat(bottom, first_words)], axis=1)
+
+
+def iter_json(words):
+    """Yield JSON document of words in pieces."""
+    yield f'{{"width":{words.size[0]},"height":{words.size[1]},"words":['
+    for index in range(len(words)):
+        left, top, width, height = words.boxes[index].tolist()
+        yield (f'{"," if index else ""}{{"text":{json.dumps(words.word(index), ensure_ascii=False)},'
+               f'"left":{left},"top":{top},"width":{width},"height":{height},'
+               f'"conf":{float(words.confidences[index]):.2f},"block":{int(words.blocks[index])},'
+               f'"par":{int(words.paragraphs[index])},"line":{int(words.lines[index])}}}')
+    yield "]}\n"
+
+
+def iter_hocr(words, title="Screenshot OCR"):
+    """Yield hOCR (HTML) document of words in pieces."""
+    yield ('<?xml version="1.0" encoding="UTF-8"?>\n'
+           '<html xmlns="http://www.w3.org/1999/xhtml">\n<head>\n'
+           f'<title>{escape(title)}</title>\n'
+           '<meta http-equiv="Content-Type" content="text/html;charset=utf-8"/>\n'
+           '<meta name="ocr-system" content="tesseract"/>\n'
+           '<meta name="ocr-capabilities" content="ocr_page ocr_carea ocr_par ocr_line ocrx_word"/>\n'
+           '</head>\n<body>\n'
+           f'<div class="ocr_page" id="page_1" title="bbox 0 0 {words.size[0]} {words.size[1]}">\n')
+    if len(words):
+        new_block, new_paragraph, new_line = words.breaks()
+        block_boxes = iter(words.group_boxes(np.flatnonzero(new_block)).tolist())
+        paragraph_boxes = iter(words.group_boxes(np.flatnonzero(new_paragraph)).tolist())
+        line_boxes = iter(words.group_boxes(np.flatnonzero(new_line)).tolist())
+        counts = [0, 0, 0]
+        for index in range(len(words)):
+            if index and new_line[index]:
+                yield "</span>\n"
+                if new_paragraph[index]:
+                    yield "</p>\n"
+                    if new_block[index]:
+                        yield "</div>\n"
+            if new_block[index]:
+                counts[0] += 1
+                yield f'<div class="ocr_carea" id="block_{counts[0]}" title="{bbox(next(block_boxes))}">\n'
+            if new_paragraph[index]:
+                counts[1] += 1
+                yield f'<p class="ocr_par" id="par_{counts[1]}" title="{bbox(next(paragraph_boxes))}">\n'
+            if new_line[index]:
+                counts[2] += 1
+                yield f'<span class="ocr_line" id="line_{counts[2]}" title="{bbox(next(line_boxes))}">'
+            left, top, width, height = words.boxes[index].tolist()
+            yield (f'<span class="ocrx_word" id="word_{index + 1}" '
+                   f'title="{bbox((left, top, left + width, top + height))}; '
+                   f'x_wconf {round(float(words.confidences[index]))}">'
+                   f'{escape(words.word(index))}</span> ')
+        yield "</span>\n</p>\n</div>\n"
+    yield "</div>\n</body>\n</html>\n"
+
+
+def iter_alto(words):
+    """Yield ALTO v4 XML document of words in pieces, with one TextBlock per paragraph."""
+    yield ('<?xml version="1.0" encoding="UTF-8"?>\n'
+           '<alto xmlns="http://www.loc.gov/standards/alto/ns-v4#">\n'
+           '<Description><MeasurementUnit>pixel</MeasurementUnit>'
+           '<OCRProcessing ID="ocr_1"><ocrProcessingStep><processingSoftware>'
+           '<softwareName>Tesseract</softwareName></processingSoftware></ocrProcessingStep></OCRProcessing>'
+           '</Description>\n<Layout>\n'
+           f'<Page ID="page_1" PHYSICAL_IMG_NR="1" WIDTH="{words.size[0]}" HEIGHT="{words.size[1]}">\n'
+           f'<PrintSpace HPOS="0" VPOS="0" WIDTH="{words.size[0]}" HEIGHT="{words.size[1]}">\n')
+    if len(words):
+        new_block, new_paragraph, new_line = words.breaks()
+        paragraph_boxes = iter(words.group_boxes(np.flatnonzero(new_paragraph)).tolist())
+        line_boxes = iter(words.group_boxes(np.flatnonzero(new_line)).tolist())
+        counts = [0, 0]
+        for index in range(len(words)):
+            if index and new_line[index]:
+                yield "</TextLine>\n"
+                if new_paragraph[index]:
+                    yield "</TextBlock>\n"
+            if new_paragraph[index]:
+                counts[0] += 1
+                left, top, right, bottom = next(paragraph_boxes)
+                yield (f'<TextBlock ID="block_{counts[0]}" HPOS="{left}" VPOS="{top}" '
+                       f'WIDTH="{right - left}" HEIGHT="{bottom - top}">\n')
+            if new_line[index]:
+                counts[1] += 1
+                left, top, right, bottom = next(line_boxes)
+                yield (f'<TextLine ID="line_{counts[1]}" HPOS="{left}" VPOS="{top}" '
+                       f'WIDTH="{right - left}" HEIGHT="{bottom - top}">')
+            else:
+                yield "<SP/>"
+            left, top, width, height = words.boxes[index].tolist()
+            yield (f'<String ID="string_{index + 1}" CONTENT={quoteattr(words.word(index))} HPOS="{left}" '
+                   f'VPOS="{top}" WIDTH="{width}" HEIGHT="{height}" '
+                   f'WC="{float(words.confidences[index]) / 100:.4f}"/>')
+        yield "</TextLine>\n</TextBlock>\n"
+    yield "</PrintSpace>\n</Page>\n</Layout>\n</alto>\n"
+
+
+def iter_export(words, export_format):
+    """Yield document of words in export_format (json, hocr or alto) in pieces."""
+    if export_format == "json":
+        return iter_json(words)
+    if export_format == "hocr":
+        return iter_hocr(words)
+    if export_format == "alto":
+        return iter_alto(words)
+    raise ValueError(f"Unknown export format '{export_format}'")
+
+
+def write_export(words, path, export_format):
+    """Write document of words in export_format to path as UTF-8, one piece at a time."""
+    with open(path, "w", encoding="utf-8") as file:
+        for piece in iter_export(words, export_format):
+            file.write(piece)
@@ -0,0 +1,338 @@
+"""
+OCR service: read images sent by other local programs with one warm OCR engine shared by every request.
+
+The service speaks HTTP/1.1 on a Unix domain socket or on 127.0.0.1. Connections are kept alive between requests,
+and requests sent back to back without waiting for responses (pipelining) are answered in order. Requests:
+    POST /ocr?combo=eng+deu     image file bytes as body, reads them with a language combination from SAVED_LANG_COMBOS
+    POST /ocr?lang=eng          reads them with any language parameters
+    POST /ocr                   reads them with the default language or language combination
+    GET /combos                 saved language combinations as a JSON list
+    GET /health                 "ok"
+Add format=json to /ocr for a JSON object with text, language parameters, cache hit and seconds instead of text,
+format=words, hocr or alto for every word with its box and confidence as JSON, hOCR or ALTO XML, and cache=0 to
+read the image even if the OCR cache has its text.
+
+At most max_concurrent images are read at once, other requests wait for a free slot for up to queue_timeout
+seconds and get 503 after that. See ocr_client.py for a client.
+"""
+import argparse
+import io
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import urlsplit, parse_qs
+import metrics
+import ocr_core
+import ocr_result
+
+#Port the service listens on when no Unix socket is given
+DEFAULT_PORT = 8765
+#Number of connections handled at once, later connections are closed right away
+DEFAULT_MAX_CONNECTIONS = 64
+#Seconds a request waits for a free OCR slot before getting 503
+DEFAULT_QUEUE_TIMEOUT = 30.0
+#Seconds an idle kept-alive connection stays open
+DEFAULT_IDLE_TIMEOUT = 60.0
+#Largest accepted request body in bytes
+DEFAULT_MAX_BODY = 64 * 1024 * 1024
+#Side of the blank image read once per saved language combination on start so their models are loaded
+WARM_UP_SIZE = 64
+#Export format of every word-level format= value of /ocr
+WORD_FORMATS = {"words": "json", "hocr": "hocr", "alto": "alto"}
+#Content type of every export format
+EXPORT_CONTENT_TYPES = {"json": "application/json", "hocr": "application/xhtml+xml", "alto": "application/xml"}
+
+
+class ServiceError(Exception):
+    """Raised while handling a request to answer it with an HTTP error status."""
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class OcrService:
+    """Reads images for request handlers with one shared engine and cache, at most max_concurrent at once."""
+    def __init__(self, config, max_concurrent=0, queue_timeout=DEFAULT_QUEUE_TIMEOUT):
+        self.config = config
+        self.engine = ocr_core.create_engine(config)
+        self.cache = ocr_core.create_cache(config)
+        self.tile_min_pixels, self.tile_workers = ocr_core.get_tile_settings(config)
+        self.max_concurrent = max_concurrent if max_concurrent > 0 else os.cpu_count() or 1
+        self.slots = threading.BoundedSemaphore(self.max_concurrent)
+        self.queue_timeout = queue_timeout
+        #Preprocessing stages of every language parameter string used so far
+        self.preprocess_stages = {}
+        #Saved language combinations as last read from config.ini
+        self.combos = frozenset(config["SAVED_LANG_COMBOS"])
+
+    def saved_combos(self) -> list:
+        """Return saved language combinations, re-reading config.ini so combinations saved in the GUI show up."""
+        #Read into a separate parser, handler threads read self.config while a reload would be changing it
+        from configparser import ConfigParser
+        parser = ConfigParser(default_section=None, dict_type=dict, allow_no_value=True)
+        parser.read(self.config.path)
+        if parser.has_section("SAVED_LANG_COMBOS"):
+            combos = list(parser["SAVED_LANG_COMBOS"])
+        else:
+            combos = list(self.config["SAVED_LANG_COMBOS"])
+        self.combos = frozenset(combos)
+        return combos
+
+    def get_lang_param(self, query) -> str:
+        """Return language parameter string requested with combo or lang in query, or the default one."""
+        if "combo" in query:
+            combo = query["combo"][0]
+            if combo not in self.combos and combo not in self.saved_combos():
+                raise ServiceError(404, f"No saved language combination '{combo}'")
+            return combo
+        if "lang" in query:
+            return query["lang"][0]
+        return ocr_core.get_default_lang_param(self.config)
+
+    def get_preprocess_stages(self, lang_param) -> tuple:
+        """Return preprocessing stages saved for language parameter string."""
+        stages = self.preprocess_stages.get(lang_param)
+        if stages is None:
+            stages = self.preprocess_stages[lang_param] = ocr_core.get_preprocess_stages(self.config, lang_param)
+        return stages
+
+    def read(self, data, lang_param, use_cache=True, structured=False) -> tuple:
+        """Return text (OcrWords if structured) read from image file bytes and whether it came from the cache."""
+        from PIL import Image
+        #Decode only once a slot is free, so requests waiting for one don't each hold a decoded image in memory
+        if not self.slots.acquire(timeout=self.queue_timeout):
+            raise ServiceError(503, "All OCR slots are busy")
+        try:
+            try:
+                image = Image.open(io.BytesIO(data))
+                image.load()
+            except Exception as e:
+                raise ServiceError(400, f"Could not decode image: {e}")
+            if structured:
+                return ocr_core.ocr_image_words(image, lang_param, self.engine, self.cache if use_cache else None,
+                                                self.get_preprocess_stages(lang_param))[:2]
+            img_text, cached = ocr_core.ocr_image(image, lang_param, self.engine, self.cache if use_cache else None,
+                                                  self.get_preprocess_stages(lang_param),
+                                                  self.tile_min_pixels, self.tile_workers)[:2]
+        except ServiceError:
+            raise
+        except Exception as e:
+            raise ServiceError(500, str(e) or type(e).__name__)
+        finally:
+            self.slots.release()
+        return img_text, cached
+
+    def warm_up(self):
+        """Read a blank image with every saved language combination so engines that keep models loaded have them."""
+        from PIL import Image
+        blank = Image.new("L", (WARM_UP_SIZE, WARM_UP_SIZE), 255)
+        for lang_param in self.saved_combos()[:self.config.getint("USERCONFIG", "engine_max_loaded", fallback=3)]:
+            try:
+                self.engine.image_to_string(blank, lang_param)
+            except Exception as e:
+                print(f"Could not load '{lang_param}': {e}", file=sys.stderr)
+
+    def close(self):
+        """Release the engine and cache."""
+        self.engine.close()
+        if self.cache is not None:
+            self.cache.close()
+
+
+class OcrRequestHandler(BaseHTTPRequestHandler):
+    """Handles the requests of one kept-alive connection in the order they arrive."""
+    protocol_version = "HTTP/1.1"
+    server_version = "ScreenshotOCR"
+
+    def setup(self):
+        #Responses are written as headers and then body, without TCP_NODELAY the body waits for a delayed ACK
+        self.disable_nagle_algorithm = self.request.family == socket.AF_INET
+        super().setup()
+        #Close connections that stay idle, the thread serving them counts against max_connections
+        self.connection.settimeout(self.server.idle_timeout)
+
+    def address_string(self) -> str:
+        #Unix socket clients have no address
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def send_body(self, status, body, content_type="text/plain; charset=utf-8"):
+        """Send response with body (str or bytes)."""
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if status == 503:
+            self.send_header("Retry-After", "1")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_body(self) -> bytes:
+        """Return request body, exactly Content-Length bytes so the next pipelined request starts after it."""
+        if "chunked" in self.headers.get("Transfer-Encoding", "").lower():
+            self.close_connection = True
+            raise ServiceError(411, "Content-Length is required")
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > self.server.max_body:
+            #The body isn't read, so nothing after it on this connection can be understood
+            self.close_connection = True
+            raise ServiceError(413, f"Request body is larger than {self.server.max_body} bytes")
+        return self.rfile.read(length)
+
+    def handle_request(self, method):
+        """Answer one request, turning ServiceError into an error response."""
+        url = urlsplit(self.path)
+        #Language parameters are joined with "+", which would otherwise be decoded as a space
+        query = parse_qs(url.query.replace("+", "%2B"))
+        try:
+            body = self.read_body() if method == "POST" else b""
+            if method == "GET" and url.path == "/health":
+                self.send_body(200, "ok")
+            elif method == "GET" and url.path == "/combos":
+                self.send_body(200, json.dumps(self.server.service.saved_combos()), "application/json")
+            elif method == "POST" and url.path == "/ocr":
+                with metrics.span("service_request"):
+                    start_time = time.perf_counter()
+                    lang_param = self.server.service.get_lang_param(query)
+                    result_format = query.get("format", ["text"])[0]
+                    structured = result_format in WORD_FORMATS
+                    img_text, cached = self.server.service.read(body, lang_param,
+                                                                query.get("cache", ["1"])[0] != "0", structured)
+                if structured:
+                    export_format = WORD_FORMATS[result_format]
+                    self.send_body(200, "".join(ocr_result.iter_export(img_text, export_format)),
+                                   EXPORT_CONTENT_TYPES[export_format])
+                elif result_format == "json":
+                    result = {"text": img_text, "lang": lang_param, "cached": cached,
+                              "seconds": time.perf_counter() - start_time}
+                    self.send_body(200, json.dumps(result, ensure_ascii=False), "application/json")
+                else:
+                    self.send_body(200, img_text)
+            else:
+                raise ServiceError(404, f"No {method} {url.path}")
+        except ServiceError as e:
+            self.send_body(e.status, str(e))
+
+    def do_GET(self):
+        self.handle_request("GET")
+
+    def do_POST(self):
+        self.handle_request("POST")
+
+
+class BoundedThreadingMixIn(socketserver.ThreadingMixIn):
+    """Handles every connection on its own thread, closing new connections while max_connections are open."""
+    daemon_threads = True
+    block_on_close = False
+
+    def process_request(self, request, client_address):
+        if not self.connection_slots.acquire(blocking=False):
+            self.shutdown_request(request)
+            return
+        super().process_request(request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            self.connection_slots.release()
+
+
+class TcpOcrServer(BoundedThreadingMixIn, HTTPServer):
+    """OCR service on 127.0.0.1."""
+
+
+if hasattr(socket, "AF_UNIX"):
+    class UnixOcrServer(BoundedThreadingMixIn, socketserver.UnixStreamServer):
+        """OCR service on a Unix domain socket."""
+        def server_bind(self):
+            if os.path.exists(self.server_address):
+                #Left behind by a service that didn't stop cleanly
+                os.unlink(self.server_address)
+            super().server_bind()
+            #Only the user running the service may connect
+            os.chmod(self.server_address, 0o600)
+
+        def server_close(self):
+            super().server_close()
+            try:
+                os.unlink(self.server_address)
+            except OSError:
+                pass
+
+
+def create_server(service, socket_path=None, port=DEFAULT_PORT, max_connections=DEFAULT_MAX_CONNECTIONS,
+                  idle_timeout=DEFAULT_IDLE_TIMEOUT, max_body=DEFAULT_MAX_BODY, verbose=False):
+    """Return server answering requests with service on Unix socket at socket_path, or on 127.0.0.1:port."""
+    if socket_path:
+        if not hasattr(socket, "AF_UNIX"):
+            raise OSError("Unix domain sockets are not supported on this platform, use a port instead")
+        server = UnixOcrServer(socket_path, OcrRequestHandler)
+    else:
+        server = TcpOcrServer(("127.0.0.1", port), OcrRequestHandler)
+    server.service = service
+    server.connection_slots = threading.BoundedSemaphore(max(1, max_connections))
+    server.idle_timeout = idle_timeout
+    server.max_body = max_body
+    server.verbose = verbose
+    return server
+
+
+def main(argv=None, config_path=ocr_core.CONFIG_PATH) -> int:
+    """Run the OCR service until stopped with Ctrl+C."""
+    config = ocr_core.load_config(config_path)
+    parser = argparse.ArgumentParser(prog="ocr_service.py", description="Serve OCR to local programs over HTTP.")
+    address = parser.add_mutually_exclusive_group()
+    address.add_argument("--socket", metavar="PATH", default=config.get("USERCONFIG", "service_socket", fallback=""),
+                         help="listen on a Unix domain socket at PATH")
+    address.add_argument("--port", type=int, help=f"listen on 127.0.0.1:PORT (default: {DEFAULT_PORT})")
+    parser.add_argument("-j", "--max-concurrent", type=int,
+                        default=config.getint("USERCONFIG", "service_max_concurrent", fallback=0),
+                        help="images read at the same time (default: number of cores)")
+    parser.add_argument("--no-warm-up", action="store_true", help="don't load saved language combinations on start")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log every request")
+    args = parser.parse_args(argv)
+    socket_path = None if args.port is not None else args.socket
+    port = args.port or config.getint("USERCONFIG", "service_port", fallback=DEFAULT_PORT)
+
+    exporter = ocr_core.start_metrics(config)
+    service = OcrService(config, args.max_concurrent,
+                         config.getfloat("USERCONFIG", "service_queue_timeout", fallback=DEFAULT_QUEUE_TIMEOUT))
+    if not args.no_warm_up:
+        service.warm_up()
+    if getattr(service.engine, "fallback_reason", None) is not None:
+        print(service.engine.fallback_reason, file=sys.stderr)
+    server = create_server(service, socket_path, port,
+                           config.getint("USERCONFIG", "service_max_connections", fallback=DEFAULT_MAX_CONNECTIONS),
+                           config.getfloat("USERCONFIG", "service_idle_timeout", fallback=DEFAULT_IDLE_TIMEOUT),
+                           verbose=args.verbose)
+    where = socket_path or f"http://127.0.0.1:{server.server_address[1]}"
+    print(f"Serving OCR on {where} with {service.max_concurrent} concurrent reads", file=sys.stderr)
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+    #Stop cleanly when the service manager asks, like with Ctrl+C
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+        if exporter is not None:
+            exporter.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+#Tiles are not split further once they have fewer pixels than this
+MIN_TILE_PIXELS = 250000
+#Minimum height of a blank band between lines to cut across
+MIN_ROW_GAP = 4
+#Minimum width of a blank band between columns to cut along, wide enough to never be the space between two words
+MIN_COLUMN_GAP = 24
+#Difference in brightness from the background that counts as ink
+INK_CONTRAST = 48
+#Fraction of a row or column that may contain ink and still count as blank (specks, underlines of UI frames)
+BLANK_TOLERANCE = 0.002
+
+
+def get_ink_mask(image) -> np.ndarray:
+    """Return boolean array that is True where PIL Image has ink, for light or dark backgrounds."""
+    gray = np.asarray(image.convert("L"), dtype=np.int16)
+    background = int(np.median(gray))
+    return np.abs(gray - background) > INK_CONTRAST
+
+
+def find_gaps(profile, limit, min_gap) -> list:
+    """Return (start, end) of runs of at least min_gap entries in profile that are at or below limit."""
+    blank = np.concatenate(([False], profile <= limit, [False]))
+    edges = np.flatnonzero(np.diff(blank.astype(np.int8)))
+    starts, ends = edges[0::2], edges[1::2]
+    keep = ends - starts >= min_gap
+    return list(zip(starts[keep].tolist(), ends[keep].tolist()))
+
+
+def best_cut(ink, axis, min_gap):
+    """Return position of the inner blank gap along axis whose middle is closest to the middle of ink, or None."""
+    profile = ink.sum(axis=1 - axis)
+    length = ink.shape[axis]
+    limit = ink.shape[1 - axis] * BLANK_TOLERANCE
+    #Gaps touching the edges are margins, cutting there would not split the content
+    gaps = [(start, end) for start, end in find_gaps(profile, limit, min_gap) if start > 0 and end < length]
+    if not gaps:
+        return None
+    middles = [(start + end) // 2 for start, end in gaps]
+    return min(middles, key=lambda middle: abs(middle - length // 2))
+
+
+def split_region(ink, left, top, right, bottom, max_tile_pixels, tiles):
+    """
+    Recursively cut region along blank bands (XY-cut) and append tiles (left, top, right, bottom) in reading order.
+
+    Columns are separated first so their text isn't interleaved, and vertical cuts are only made along gaps
+    wide enough to be between columns, so words are never split. Then the region is cut between lines.
+    """
+    if (right - left) * (bottom - top) <= max_tile_pixels:
+        tiles.append((left, top, right, bottom))
+        return
+    region = ink[top:bottom, left:right]
+    cut = best_cut(region, 1, MIN_COLUMN_GAP)
+    if cut is not None:
+        split_region(ink, left, top, left + cut, bottom, max_tile_pixels, tiles)
+        split_region(ink, left + cut, top, right, bottom, max_tile_pixels, tiles)
+        return
+    cut = best_cut(region, 0, MIN_ROW_GAP)
+    if cut is not None:
+        split_region(ink, left, top, right, top + cut, max_tile_pixels, tiles)
+        split_region(ink, left, top + cut, right, bottom, max_tile_pixels, tiles)
+        return
+    #No safe cut line, read region as one tile
+    tiles.append((left, top, right, bottom))
+
+
+def find_tiles(image, workers) -> list:
+    """Return list of tile boxes (left, top, right, bottom) of PIL Image in reading order."""
+    ink = get_ink_mask(image)
+    max_tile_pixels = max(MIN_TILE_PIXELS, image.width * image.height // (2 * workers))
+    tiles = []
+    split_region(ink, 0, 0, image.width, image.height, max_tile_pixels, tiles)
+    #Skip tiles without any ink so Tesseract isn't started for blank areas
+    return [box for box in tiles if ink[box[1]:box[3], box[0]:box[2]].any()]
+
+
+def tiled_image_to_string(engine, image, lang, workers=0) -> str:
+    """Return text read from PIL Image by reading its tiles concurrently and joining them in reading order."""
+    workers = workers or os.cpu_count() or 1
+    tiles = find_tiles(image, workers)
+    if len(tiles) <= 1:
+        return engine.image_to_string(image, lang)
+    with ThreadPoolExecutor(workers) as executor:
+        texts = list(executor.map(lambda box: engine.image_to_string(image.crop(box), lang).strip(), tiles))
+    return "\n".join(text for text in texts if text != "")
+
+
+def compare_with_single_pass(engine, image, lang, workers=0) -> dict:
+    """Read PIL Image both in one pass and in tiles, return timings, tile count and speedup."""
+    start_time = time.perf_counter()
+    single_text = engine.image_to_string(image, lang).strip()
+    single_seconds = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    tiled_text = tiled_image_to_string(engine, image, lang, workers).strip()
+    tiled_seconds = time.perf_counter() - start_time
+    return {
+        "tiles": len(find_tiles(image, workers or os.cpu_count() or 1)),
+        "single_seconds": single_seconds,
+        "tiled_seconds": tiled_seconds,
+        "speedup": single_seconds / tiled_seconds if tiled_seconds > 0 else 0.0,
+        "same_text": single_text.split() == tiled_text.split(),
+    }
@@ -0,0 +1,72 @@
+import io
+import pathlib
+import re
+import subprocess
+from PIL import Image, ImageSequence
+
+#Resolution PDF pages are rasterized at before OCR
+DEFAULT_PDF_DPI = 300
+#Poppler executable used to rasterize PDF pages
+DEFAULT_PDFTOPPM = "pdftoppm"
+
+
+class PageReaderError(RuntimeError):
+    """Raised when the pages of a document can not be read."""
+
+
+def is_pdf(path) -> bool:
+    """Return True if file at path is a PDF document."""
+    with open(path, "rb") as file:
+        return file.read(5) == b"%PDF-"
+
+
+def get_pdfinfo_cmd(pdftoppm) -> str:
+    """Return path of Poppler's pdfinfo installed next to pdftoppm."""
+    pdftoppm_path = pathlib.Path(pdftoppm)
+    return str(pdftoppm_path.with_name(pdftoppm_path.name.replace("pdftoppm", "pdfinfo")))
+
+
+def run_poppler(command) -> bytes:
+    """Run Poppler command and return its stdout."""
+    try:
+        result = subprocess.run(command, capture_output=True, creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0))
+    except FileNotFoundError:
+        raise PageReaderError(f"Reading PDF files requires Poppler ('{command[0]}' was not found)")
+    if result.returncode != 0:
+        raise PageReaderError(result.stderr.decode("utf-8", "replace").strip())
+    return result.stdout
+
+
+def count_pdf_pages(path, pdftoppm=DEFAULT_PDFTOPPM) -> int:
+    """Return number of pages in PDF document."""
+    output = run_poppler([get_pdfinfo_cmd(pdftoppm), str(path)]).decode("utf-8", "replace")
+    match = re.search(r"^Pages:\s+(\d+)", output, re.MULTILINE)
+    if match is None:
+        raise PageReaderError("Could not read number of pages in PDF file")
+    return int(match.group(1))
+
+
+def iter_pdf_pages(path, dpi=DEFAULT_PDF_DPI, pdftoppm=DEFAULT_PDFTOPPM):
+    """Yield every page of PDF document as a PIL Image, rasterizing one page at a time."""
+    for page in range(1, count_pdf_pages(path, pdftoppm) + 1):
+        #Without an output file name pdftoppm writes the PPM image to stdout
+        data = run_poppler([pdftoppm, "-f", str(page), "-l", str(page), "-r", str(dpi), str(path)])
+        image = Image.open(io.BytesIO(data))
+        image.load()
+        image.info["dpi"] = (dpi, dpi)
+        yield image
+
+
+def iter_pages(path, dpi=DEFAULT_PDF_DPI, pdftoppm=DEFAULT_PDFTOPPM):
+    """
+    Yield every page of PDF document or every frame of image file (e.g. multi-page TIFF) as a PIL Image.
+
+    Pages are decoded lazily, so only the pages the caller still holds on to are kept in memory.
+    """
+    if is_pdf(path):
+        yield from iter_pdf_pages(path, dpi, pdftoppm)
+        return
+    with Image.open(path) as image:
+        for frame in ImageSequence.Iterator(image):
+            #Copy the frame since the next iteration seeks the same Image object
+            yield frame.copy()
@@ -0,0 +1,130 @@
+import sys
+from PyQt5.QtGui import QImage
+from PIL import Image
+
+#Resolution of a screen with a device pixel ratio of 1
+SCREEN_DPI = 96
+#32-bit QImage formats that can be read without converting them first
+FORMATS_32BIT = (QImage.Format_RGB32, QImage.Format_ARGB32, QImage.Format_ARGB32_Premultiplied)
+
+
+def get_pixel_buffer(image):
+    """Return a read-only memoryview of the pixel buffer of QImage, including padding at the end of each line."""
+    pointer = image.constBits()
+    pointer.setsize(image.bytesPerLine() * image.height())
+    return memoryview(pointer)
+
+
+def get_raw_mode(image) -> str:
+    """Return PIL raw mode describing the in-memory byte order of a 32-bit QImage."""
+    #32-bit QImage pixels are stored as 0xAARRGGBB integers, so byte order depends on the platform
+    has_alpha = image.format() != QImage.Format_RGB32
+    if sys.byteorder == "little":
+        if image.format() == QImage.Format_ARGB32_Premultiplied:
+            #Lowercase a makes PIL divide the colors by alpha again
+            return "BGRa"
+        return "BGRA" if has_alpha else "BGRX"
+    return "ARGB" if has_alpha else "XRGB"
+
+
+def to_32bit(image):
+    """Return QImage in a 32-bit format, converting it only if needed."""
+    if image.format() in FORMATS_32BIT:
+        return image
+    return image.convertToFormat(QImage.Format_RGB32)
+
+
+def qimage_to_pil(image, shared_images=None):
+    """
+    Convert QImage to PIL Image by decoding its pixel buffer directly.
+
+    The only copy made is the one PIL needs to own the pixels, no PNG encoding or decoding is done.
+    If shared_images (a shm_transport.SharedImagePool) is given and has a free slot, that copy is made straight
+    into shared memory, so the image is handed to a worker process without being copied again.
+    Sizes are in device pixels, so snippets from HiDPI screens keep their full resolution,
+    and the device pixel ratio is stored as the dpi of the PIL Image.
+    """
+    image = to_32bit(image)
+    if sys.byteorder == "big" and image.format() == QImage.Format_ARGB32_Premultiplied:
+        #PIL has no raw mode for premultiplied ARGB
+        image = image.convertToFormat(QImage.Format_ARGB32)
+    pil_image = None
+    if shared_images is not None and image.format() != QImage.Format_ARGB32_Premultiplied:
+        pil_image = qimage_to_shared(image, shared_images)
+    if pil_image is None:
+        raw_mode = get_raw_mode(image)
+        mode = "RGB" if raw_mode.endswith("X") or raw_mode.startswith("X") else "RGBA"
+        pil_image = Image.frombuffer(mode, (image.width(), image.height()), get_pixel_buffer(image),
+                                     "raw", raw_mode, image.bytesPerLine(), 1)
+    dpi = round(SCREEN_DPI * image.devicePixelRatio())
+    pil_image.info["dpi"] = (dpi, dpi)
+    return pil_image
+
+
+def qimage_to_shared(image, shared_images):
+    """
+    Return RGBA PIL Image of 32-bit QImage decoded into a slot of shared_images, or None if no slot is free.
+
+    Premultiplied images are not supported, the X byte of RGB32 pixels is always 0xFF so it serves as alpha.
+    """
+    import numpy as np
+    width, height = image.width(), image.height()
+    slot = shared_images.acquire(width * height * 4)
+    if slot is None:
+        return None
+    try:
+        source = qimage_to_array(image)
+        target = np.ndarray((height, width, 4), dtype=np.uint8, buffer=slot.block.buf)
+        #Reorder the bytes to RGBA while copying them, one channel at a time so no temporary array is needed
+        byte_order = get_raw_mode(image).replace("X", "A")
+        for channel, band in enumerate("RGBA"):
+            target[..., channel] = source[..., byte_order.index(band)]
+        #Drop the view so the block can be closed while it is not in use
+        del target
+    except BaseException:
+        slot.release()
+        raise
+    return shared_images.wrap(slot, (width, height))
+
+
+def qimage_to_png(image) -> bytes:
+    """Return QImage encoded as PNG file bytes, without writing a file."""
+    from PyQt5.QtCore import QBuffer, QByteArray, QIODevice
+    data = QByteArray()
+    buffer = QBuffer(data)
+    buffer.open(QIODevice.WriteOnly)
+    saved = image.save(buffer, "PNG")
+    buffer.close()
+    if not saved:
+        raise OSError("Could not encode image as PNG")
+    return bytes(data)
+
+
+def qimage_key(image) -> str:
+    """Return content hash of QImage's pixels for image_archive, without copying them."""
+    from image_archive import image_key
+    return image_key(image.width(), image.height(), image.bytesPerLine(), int(image.format()),
+                     get_pixel_buffer(image))
+
+
+class PixelBuffer:
+    """Exposes the pixel buffer of QImage to NumPy, arrays made from it keep the QImage alive."""
+    def __init__(self, image):
+        self.image = image
+        self.__array_interface__ = {"shape": (image.bytesPerLine() * image.height(),), "typestr": "|u1",
+                                    "data": (int(image.constBits()), True), "version": 3}
+
+
+def qimage_to_array(image):
+    """
+    Return a NumPy array of shape (height, width, 4) in memory byte order that shares the pixels of QImage.
+
+    No pixels are copied. The array holds a reference to the (possibly converted) QImage, so its pixels stay valid
+    for as long as the array is used. Use get_raw_mode to know the channel order of the last axis.
+    """
+    import numpy as np
+    image = to_32bit(image)
+    array = np.asarray(PixelBuffer(image))
+    #Drop the padding at the end of each line without copying
+    array = array.reshape(image.height(), image.bytesPerLine())[:, :image.width() * 4]
+    return array.reshape(image.height(), image.width(), 4)
@@ -0,0 +1,97 @@
+"""
+Change detection and pacing for watching a screen region.
+
+Frames are compared by the mean brightness of blocks of a downsampled copy, so a poll costs a few strided NumPy
+reductions instead of an OCR run, and only the rows of blocks that changed need to be read again.
+"""
+import numpy as np
+
+#Side of the square blocks compared between frames, in pixels
+DEFAULT_BLOCK_SIZE = 16
+#Change in mean brightness (0-255) of a block that counts as changed
+DEFAULT_THRESHOLD = 6.0
+#Only every n-th pixel in both directions is looked at
+SAMPLE_STEP = 2
+#Fraction of the region height above which the whole region is read instead of the changed rows
+MAX_BAND_FRACTION = 0.5
+#Seconds between polls of the region
+DEFAULT_INTERVAL = 1.0
+#Fraction of one core that polling and reading may use on average
+DEFAULT_CPU_BUDGET = 0.25
+
+
+class ChangeDetector:
+    """Finds blocks of a frame that differ from the last committed frame."""
+    def __init__(self, block_size=DEFAULT_BLOCK_SIZE, threshold=DEFAULT_THRESHOLD):
+        self.block_size = block_size
+        self.threshold = threshold
+        #Block means of the last committed frame, None until the first commit
+        self.committed = None
+        #Block means of the last compared frame, committed by commit()
+        self.latest = None
+
+    def block_means(self, pixels) -> np.ndarray:
+        """Return mean brightness of every block of a (height, width, channels) or (height, width) uint8 array."""
+        sample = pixels[::SAMPLE_STEP, ::SAMPLE_STEP]
+        if sample.ndim == 3:
+            #Sum of the color channels, alpha (or padding) is never part of the first three
+            sample = sample[:, :, :3].sum(axis=2, dtype=np.uint32)
+            scale = 3
+        else:
+            sample = sample.astype(np.uint32)
+            scale = 1
+        step = max(1, self.block_size // SAMPLE_STEP)
+        rows = np.arange(0, sample.shape[0], step)
+        columns = np.arange(0, sample.shape[1], step)
+        sums = np.add.reduceat(np.add.reduceat(sample, rows, axis=0), columns, axis=1)
+        #Blocks at the right and bottom edges can be smaller
+        heights = np.diff(np.append(rows, sample.shape[0]))
+        widths = np.diff(np.append(columns, sample.shape[1]))
+        return sums / (np.outer(heights, widths) * scale)
+
+    def compare(self, pixels) -> np.ndarray:
+        """Return boolean array of blocks that changed since the last commit (all True before the first one)."""
+        self.latest = self.block_means(pixels)
+        if self.committed is None or self.committed.shape != self.latest.shape:
+            return np.ones(self.latest.shape, dtype=bool)
+        return np.abs(self.latest - self.committed) > self.threshold
+
+    def commit(self):
+        """Remember the last compared frame as the one later frames are compared with."""
+        self.committed = self.latest
+
+    def changed_band(self, changed, height) -> tuple:
+        """
+        Return (top, bottom) pixel rows spanning every changed block row, or None if nothing changed.
+
+        The band is padded by one block row above and below, so a line of text whose change only crossed the
+        threshold in one block row isn't cut in half. Returns (0, height) when the band would cover more than
+        MAX_BAND_FRACTION of the frame.
+        """
+        changed_rows = np.flatnonzero(changed.any(axis=1))
+        if len(changed_rows) == 0:
+            return None
+        top = max(0, (int(changed_rows[0]) - 1) * self.block_size)
+        bottom = min(height, (int(changed_rows[-1]) + 2) * self.block_size)
+        if bottom - top > height * MAX_BAND_FRACTION:
+            return 0, height
+        return top, bottom
+
+
+class CpuBudget:
+    """Spaces out work so it takes at most budget (fraction of one core) of the time on average."""
+    def __init__(self, budget=DEFAULT_CPU_BUDGET):
+        self.budget = min(1.0, max(0.01, budget))
+        #Seconds of work since the last call to next_delay
+        self.spent = 0.0
+
+    def spend(self, seconds):
+        """Record seconds of work (polling the region or reading it)."""
+        self.spent += seconds
+
+    def next_delay(self, min_interval) -> float:
+        """Return seconds to wait before the next poll, at least min_interval."""
+        #Work of w seconds followed by w / budget - w idle seconds uses exactly budget of the time
+        delay = self.spent / self.budget - self.spent
+        self.spent = 0.0
+        return max(min_interval, delay)
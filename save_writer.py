@@ -0,0 +1,105 @@
+import os
+import queue
+import threading
+import metrics
+
+#Number of files waiting to be written before new ones are turned away
+DEFAULT_MAX_QUEUED = 64
+
+
+class SaveWriter:
+    """
+    Write output files on a background thread, so slow or network save folders don't delay reading images.
+
+    Files are written in the order they were submitted. Save folders are created the first time they are used and
+    remembered, so later files in the same folder don't check for it again. on_error(path, message) is called from
+    the writer thread when a file can't be written.
+    """
+    def __init__(self, max_queued=DEFAULT_MAX_QUEUED, on_error=None):
+        self.queue = queue.Queue(max_queued)
+        self.on_error = on_error
+        #Save folders known to exist
+        self.ready_folders = set()
+        self.thread = threading.Thread(target=self.run, name="SaveWriter", daemon=True)
+        self.thread.start()
+
+    def submit(self, folder, file_name, write) -> bool:
+        """Queue write(path) to create file_name in folder, return False if the queue is full and it was dropped."""
+        try:
+            self.queue.put_nowait((folder, file_name, write))
+        except queue.Full:
+            #Never make the caller wait for the disk
+            self.report(os.path.join(folder, file_name), "Too many files waiting to be saved, file was not saved")
+            return False
+        return True
+
+    def save_text(self, folder, file_name, text) -> bool:
+        """Queue text to be saved as UTF-8 file_name in folder."""
+        def write(path):
+            with metrics.span("write_txt"), open(path, "w", encoding="utf-8") as file:
+                file.write(text)
+        return self.submit(folder, file_name, write)
+
+    def append_text(self, folder, file_name, text) -> bool:
+        """Queue text to be appended to UTF-8 file_name in folder, creating the file if it doesn't exist."""
+        def write(path):
+            with metrics.span("write_txt"), open(path, "a", encoding="utf-8") as file:
+                file.write(text)
+        return self.submit(folder, file_name, write)
+
+    def save_image(self, folder, file_name, image, file_format="png") -> bool:
+        """Queue QImage or PIL Image to be saved as file_name in folder."""
+        def write(path):
+            with metrics.span(f"write_{file_format}"):
+                saved = image.save(path, file_format)
+            #QImage.save returns False instead of raising
+            if saved is False:
+                raise OSError(f"Could not save image to '{path}'")
+        return self.submit(folder, file_name, write)
+
+    def get_folder(self, folder) -> str:
+        """Return folder, creating it if it hasn't been used yet ("" is the application folder)."""
+        if folder != "" and folder not in self.ready_folders:
+            os.makedirs(folder, exist_ok=True)
+            self.ready_folders.add(folder)
+        return folder
+
+    def write(self, folder, file_name, write):
+        """Write one queued file, creating its folder again if it was removed since it was last used."""
+        try:
+            write(os.path.join(self.get_folder(folder), file_name))
+        except OSError:
+            if folder == "" or os.path.isdir(folder):
+                raise
+            self.ready_folders.discard(folder)
+            write(os.path.join(self.get_folder(folder), file_name))
+
+    def report(self, path, message):
+        """Pass a failed write to on_error."""
+        if self.on_error is not None:
+            self.on_error(path, message)
+
+    def run(self):
+        """Write queued files until close is called."""
+        while True:
+            job = self.queue.get()
+            try:
+                if job is None:
+                    return
+                folder, file_name, write = job
+                try:
+                    self.write(folder, file_name, write)
+                except Exception as e:
+                    self.report(os.path.join(folder, file_name), str(e) or type(e).__name__)
+            finally:
+                self.queue.task_done()
+
+    def flush(self):
+        """Wait until every queued file has been written."""
+        self.queue.join()
+
+    def close(self):
+        """Write the remaining queued files and stop the writer thread."""
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
@@ -0,0 +1,54 @@
+from PyQt5.QtCore import QRectF
+from PyQt5.QtGui import QGuiApplication, QImage, QPainter, QPixmap
+
+
+class ScreenFrame:
+    """Still image of one screen at native device-pixel resolution and the screen's geometry in global coordinates."""
+    def __init__(self, screen):
+        self.geometry = screen.geometry()
+        #Grabbing window 0 with the default size captures the whole screen
+        self.pixmap = screen.grabWindow(0)
+        #Device pixels per global coordinate unit, from the captured size since some platforms capture in logical units
+        self.scale = self.pixmap.width() / self.geometry.width() if self.geometry.width() > 0 else 1.0
+
+    def source_rect(self, rect) -> QRectF:
+        """Return area of pixmap in device pixels that shows rect given in global coordinates."""
+        local = rect.translated(-self.geometry.topLeft())
+        return QRectF(local.x() * self.scale, local.y() * self.scale,
+                      local.width() * self.scale, local.height() * self.scale)
+
+
+def grab_screens() -> list:
+    """Return a ScreenFrame of every screen."""
+    return [ScreenFrame(screen) for screen in QGuiApplication.screens()]
+
+
+def crop_frames(frames, selection) -> QPixmap:
+    """
+    Return area selection (global coordinates) cut out of the frames, at the highest resolution among its screens.
+
+    A selection on one screen is copied without scaling. A selection spanning screens is painted together from the
+    part on each screen, scaling parts from lower resolution screens up, and areas outside every screen stay black.
+    """
+    parts = [(frame, frame.geometry.intersected(selection)) for frame in frames]
+    parts = [(frame, part) for frame, part in parts if not part.isEmpty()]
+    if not parts:
+        return QPixmap()
+    if len(parts) == 1 and parts[0][1] == selection:
+        frame = parts[0][0]
+        pixmap = frame.pixmap.copy(frame.source_rect(selection).toAlignedRect())
+        pixmap.setDevicePixelRatio(frame.scale)
+        return pixmap
+    scale = max(frame.scale for frame, part in parts)
+    image = QImage(round(selection.width() * scale), round(selection.height() * scale), QImage.Format_RGB32)
+    image.fill(0)
+    painter = QPainter(image)
+    painter.setRenderHint(QPainter.SmoothPixmapTransform)
+    for frame, part in parts:
+        offset = part.translated(-selection.topLeft())
+        target = QRectF(offset.x() * scale, offset.y() * scale, offset.width() * scale, offset.height() * scale)
+        painter.drawPixmap(target, frame.pixmap, frame.source_rect(part))
+    painter.end()
+    pixmap = QPixmap.fromImage(image)
+    pixmap.setDevicePixelRatio(scale)
+    return pixmap
@@ -1,66 +1,208 @@
 import sys
-from PyQt5.QtWidgets import QApplication, QMainWindow, QLabel, QWidget, QDesktopWidget, QPushButton, QSplashScreen, QRubberBand, QPlainTextEdit, QListWidget, QMessageBox, QFileDialog, QComboBox, QCheckBox
-from PyQt5.QtGui import QFont, QPixmap, QColor, QGuiApplication, QImage, QIcon, QCursor
-from PyQt5.QtCore import QPoint, Qt, QRect, QSize, QBuffer
+if __name__ == "__main__" and len(sys.argv) > 1:
+    #Read images from the command line without importing the GUI
+    import batch_ocr
+    sys.exit(batch_ocr.main(sys.argv[1:]))
+from PyQt5.QtWidgets import QApplication, QMainWindow, QLabel, QWidget, QDesktopWidget, QPushButton, QPlainTextEdit, QTextEdit, QListWidget, QListWidgetItem, QLineEdit, QMessageBox, QToolTip, QFileDialog, QComboBox, QCheckBox, QDialog, QVBoxLayout, QHBoxLayout
+from PyQt5.QtGui import QFont, QColor, QGuiApplication, QIcon, QCursor, QPainter, QTextCursor
+from PyQt5.QtCore import Qt, QRect, QObject, QRunnable, QThreadPool, QTimer, QEvent, pyqtSignal
 from PIL import Image
 import pytesseract as ocr
-from configparser import ConfigParser
-import pathlib
-import io
+import ocr_core
+import ocr_result
+import page_reader
+import ocr_preprocess
+import lang_cache
+import metrics
+from ocr_core import lang_codes_dict, get_time_string
+from qimage_convert import qimage_to_pil, qimage_to_array, qimage_to_png, qimage_key
+import screen_capture
+import region_watch
+import os
+import time
+import threading
 from datetime import datetime
+from save_writer import SaveWriter
+from collections import deque
+from itertools import accumulate
+from concurrent.futures import ThreadPoolExecutor
+
+#Saved user settings, loaded from config.ini by main() and written back shortly after every change
+config = None
+#Writes recorded timings to metrics_file for monitoring while recording is on (None otherwise)
+metrics_exporter = None
+
+def start_metrics():
+    """Turn timing spans on or off as set in config and restart writing metrics_file."""
+    global metrics_exporter
+    if metrics_exporter is not None:
+        metrics_exporter.stop()
+    metrics_exporter = ocr_core.start_metrics(config)
+
+class OcrSignals(QObject):
+    """Signals emitted by OcrWorker, delivered to receivers on the GUI thread."""
+    #Emitted with job id when Tesseract starts reading the image
+    started = pyqtSignal(int)
+    #Emitted with job id, read text, the language parameters used and whether the text came from the cache
+    finished = pyqtSignal(int, str, str, bool)
+    #Emitted with job id and error message if Tesseract raised an exception
+    failed = pyqtSignal(int, str)
+    #Emitted with job id if the job was cancelled before its result was delivered
+    cancelled = pyqtSignal(int)
+    #Emitted with job id, page number and read text of the page when reading a multi-page document
+    page_finished = pyqtSignal(int, int, str)
+
+class OcrWorker(QRunnable):
+    """QRunnable that runs Tesseract on an image outside of the GUI thread."""
+    def __init__(self, job_id, image, lang_param, engine, cache=None, tile_min_pixels=0, tile_workers=0,
+                 preprocess_stages=(), structured=False):
+        super().__init__()
+        self.job_id = job_id
+        self.image = image
+        self.lang_param = lang_param
+        self.engine = engine
+        self.cache = cache
+        #Images with at least this many pixels are split into tiles that are read concurrently, 0 disables tiling
+        self.tile_min_pixels = tile_min_pixels
+        #Number of tiles read at the same time, 0 uses the number of cores
+        self.tile_workers = tile_workers
+        #Preprocessing stages applied to the image before it is read
+        self.preprocess_stages = preprocess_stages
+        #Seconds spent in every preprocessing stage, summed over all read images (pages)
+        self.preprocess_timings = {}
+        #Lock for preprocess_timings, pages of a document are read on several threads
+        self.timings_lock = threading.Lock()
+        #Setting to also read the box and confidence of every word if True (large images are then not tiled)
+        self.structured = structured
+        #OcrWords of the last read image if structured is True, else None
+        self.words = None
+        #Where the image came from ("snippet" or a file path) and path of its saved png, recorded in the history
+        self.source = "snippet"
+        self.thumbnail = None
+        self.signals = OcrSignals()
+        self.is_cancelled = False
+
+    def cancel(self):
+        """Mark job as cancelled so its result is discarded."""
+        self.is_cancelled = True
+
+    def read_image(self, image) -> tuple:
+        """Return text read from image and whether it came from the cache."""
+        if self.structured:
+            self.words, cached, timings = ocr_core.ocr_image_words(image, self.lang_param, self.engine, self.cache,
+                                                                   self.preprocess_stages)
+            self.add_timings(timings)
+            return self.words.layout_text()[0], cached
+        img_text, cached, timings = ocr_core.ocr_image(image, self.lang_param, self.engine, self.cache,
+                                                       self.preprocess_stages, self.tile_min_pixels, self.tile_workers)
+        self.add_timings(timings)
+        return img_text, cached
+
+    def add_timings(self, timings):
+        """Add seconds spent in every preprocessing stage of one image to preprocess_timings."""
+        with self.timings_lock:
+            for stage, seconds in timings.items():
+                self.preprocess_timings[stage] = self.preprocess_timings.get(stage, 0.0) + seconds
+
+    def run(self):
+        """Read image with Tesseract and emit the result."""
+        if self.is_cancelled:
+            #Skip Tesseract entirely if job was cancelled while waiting in queue
+            self.signals.cancelled.emit(self.job_id)
+            return
+        self.signals.started.emit(self.job_id)
+        try:
+            img_text, cached = self.read_image(self.image)
+        except Exception as e:
+            self.signals.failed.emit(self.job_id, str(e))
+            return
+        if self.is_cancelled:
+            self.signals.cancelled.emit(self.job_id)
+        else:
+            self.signals.finished.emit(self.job_id, img_text, self.lang_param, cached)
+
+class DocumentOcrWorker(OcrWorker):
+    """
+    OcrWorker that reads every page of a PDF document or multi-page image file.
+
+    Pages are decoded one at a time and read concurrently, with at most max_pages decoded pages held in memory.
+    Each page is emitted with page_finished in page order as soon as it and all pages before it are read.
+    """
+    def __init__(self, job_id, path, lang_param, engine, cache=None, tile_min_pixels=0, tile_workers=0,
+                 preprocess_stages=(), max_pages=2,
+                 pdf_dpi=page_reader.DEFAULT_PDF_DPI, pdftoppm=page_reader.DEFAULT_PDFTOPPM):
+        super().__init__(job_id, None, lang_param, engine, cache, tile_min_pixels, tile_workers, preprocess_stages)
+        self.path = path
+        self.source = path
+        self.max_pages = max(1, max_pages)
+        self.pdf_dpi = pdf_dpi
+        self.pdftoppm = pdftoppm
+
+    def run(self):
+        """Read all pages with Tesseract, emitting each page and then the text of the whole document."""
+        if self.is_cancelled:
+            self.signals.cancelled.emit(self.job_id)
+            return
+        self.signals.started.emit(self.job_id)
+        page_texts = []
+        try:
+            with ThreadPoolExecutor(self.max_pages) as executor:
+                in_flight = deque()
+                pages = page_reader.iter_pages(self.path, self.pdf_dpi, self.pdftoppm)
+                for page in pages:
+                    if self.is_cancelled:
+                        break
+                    in_flight.append(executor.submit(self.read_image, page))
+                    if len(in_flight) >= self.max_pages:
+                        #Wait for the oldest page before decoding more so memory stays bounded
+                        self.emit_page(page_texts, in_flight.popleft().result()[0])
+                while in_flight and not self.is_cancelled:
+                    self.emit_page(page_texts, in_flight.popleft().result()[0])
+                for future in in_flight:
+                    future.cancel()
+        except Exception as e:
+            self.signals.failed.emit(self.job_id, str(e))
+            return
+        if self.is_cancelled:
+            self.signals.cancelled.emit(self.job_id)
+        else:
+            self.signals.finished.emit(self.job_id, "\n\n".join(page_texts), self.lang_param, False)
 
-DESKTOP = pathlib.Path.home() / 'Desktop'
-ocr.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
+    def emit_page(self, page_texts, img_text):
+        """Store text of the next page and emit it."""
+        page_texts.append(img_text)
+        self.signals.page_finished.emit(self.job_id, len(page_texts), img_text)
 
-config = ConfigParser(default_section=None, dict_type=dict, allow_no_value=True)
-has_config = pathlib.Path("config.ini").exists()
+class SaveSignals(QObject):
+    """Signals emitted by the SaveWriter thread, delivered to receivers on the GUI thread."""
+    #Emitted with file path and error message if an output file could not be saved
+    failed = pyqtSignal(str, str)
 
-def write_config():
-    """Write changed values to config.ini."""
-    with open("config.ini", "w") as configfile:
-        config.write(configfile)
+class LangScanSignals(QObject):
+    """Signals emitted by LangScanWorker."""
+    #Emitted with the languages found in the Tesseract installation
+    finished = pyqtSignal(list)
 
-def get_time_string() -> str:
-    """Generate a string based on current date and time."""
-    date_string = datetime.now().strftime("SSOCR-%Y%m%d-%H%M%S-%f")
-    return date_string
+class LangScanWorker(QRunnable):
+    """QRunnable that asks Tesseract for its installed languages outside of the GUI thread."""
+    def __init__(self):
+        super().__init__()
+        self.signals = LangScanSignals()
 
-if has_config:
-    #Changes variables to saved settings in config.ini
-    config.read("config.ini")
-    ocr.pytesseract.tesseract_cmd = config.get("USERCONFIG", "tesseract_path")
-else:
-    #Creates default config.ini if it doesn't exist
-    config.add_section("DEFAULT")
-    config.add_section("USERCONFIG")
-    for section in config.sections():
-        #Path to TesseractOCR.exe
-        config.set(section, "tesseract_path", str(ocr.pytesseract.tesseract_cmd))
-        #Language to be automatically selected on application launch if default_is_combo is False
-        config.set(section, "default_lang_main", "English")
-        #Setting to load saved language combination instead of just one language if True
-        config.set(section, "default_is_combo", str(False))
-        #Language combination to be automatically selected on application launch if default_is_combo is True
-        config.set(section, "default_lang_combo", "")
-        #Last directory of file selected from read_image_file function
-        config.set(section, "lastdir", str(DESKTOP))
-        #Setting to automatically save OCR output as txt file if True
-        config.set(section, "autosavetxt", str(False))
-        #Setting to save screenshot snippet as png file if True
-        config.set(section, "autosaveimg", str(False))
-        #Setting to automatically copy OCR output to user clipboard if True
-        config.set(section, "autocopy", str(False))
-        #Setting to disable all keyboard shortcut in application if True
-        config.set(section, "disable_shortcuts", str(False))
-        #Custom save folder for saved txt files (Default is root folder of application)
-        config.set(section, "savetxtpath", "")
-        #Custom save folder for saved image files (Default is root folder of application)
-        config.set(section, "saveimgpath", "")
-    config.add_section("SAVED_LANG_COMBOS")
-    write_config()
+    def run(self):
+        """Run 'tesseract --list-langs' and emit the result."""
+        try:
+            languages = ocr.get_languages()
+        except Exception:
+            #Keep showing the cached languages if Tesseract can't be run right now
+            return
+        self.signals.finished.emit(languages)
 
 class MainWindow(QMainWindow):
     """Construct the GUI for the application."""
+    #Background of words read with a confidence below low_conf_threshold
+    LOW_CONFIDENCE_COLOR = QColor(255, 230, 120)
+
     def __init__(self):
         super().__init__()
         self.setWindowIcon(QIcon('screenshot_ocr-icon.png'))
@@ -158,6 +300,15 @@ class MainWindow(QMainWindow):
         self.saved_lang_combos_menu.activated.connect(self.set_lang_combo)
         self.saved_lang_combos_menu.setStyleSheet("color: #0032bd;")
 
+        #Dropdown menu where the image preprocessing for the selected language combination is chosen
+        self.preprocess_menu = QComboBox(self)
+        self.preprocess_menu.setGeometry(625, 172, 190, self.small_button_height)
+        self.preprocess_menu.setFont(self.small_bold_font)
+        self.preprocess_menu.setCursor(QCursor(Qt.PointingHandCursor))
+        self.preprocess_menu.setToolTip("Image preprocessing used for the selected language combination")
+        self.preprocess_menu.addItems(ocr_preprocess.PRESETS)
+        self.preprocess_menu.activated.connect(self.set_preprocess_stages)
+
         #Label where the selected main language is displayed in blue text
         self.main_lang_label = QLabel(self)
         self.main_lang_label.move(320, 177)
@@ -235,6 +386,38 @@ class MainWindow(QMainWindow):
         self.textbox.setFont(self.textbox_font)
         self.textbox.setGeometry(320, 200, 500, 200)
         self.textbox.setReadOnly(True)
+        #Shows the confidence of highlighted words on hover
+        self.textbox.viewport().installEventFilter(self)
+
+        #Thread pool that runs OCR jobs so the GUI stays responsive while Tesseract is reading
+        self.ocr_thread_pool = QThreadPool(self)
+        #Dictionary of OCR jobs that have not finished yet (k = job id, v = OcrWorker)
+        self.ocr_jobs = {}
+        #Id given to the next OCR job
+        self.next_ocr_job_id = 0
+        #Id of the most recent job whose output was shown in textbox
+        self.shown_ocr_job_id = -1
+        #Engine that OCR jobs use to read images
+        self.ocr_engine = ocr_core.create_engine(config)
+        #Setting to not tell the user again that the configured engine couldn't be loaded
+        self.engine_fallback_shown = False
+        QTimer.singleShot(0, self.show_engine_fallback)
+        #Cache of OCR results so re-reading the same image with the same languages is instant (None if disabled)
+        self.ocr_cache = ocr_core.create_cache(config)
+        #Searchable history every OCR result is recorded in (None if disabled)
+        self.ocr_history = ocr_core.create_history(config)
+        #Dialog for searching the history, created the first time it's opened
+        self.history_dialog = None
+        #Background thread that saves output files so slow save folders don't delay reading the next snippet
+        self.save_signals = SaveSignals()
+        self.save_signals.failed.connect(self.save_failed)
+        self.save_writer = SaveWriter(on_error=self.save_signals.failed.emit)
+        #Snippet archives of the image save folders used with saveimg_storage = archive (k = folder, v = ImageArchive)
+        self.image_archives = {}
+        #Dialog with recorded timings, created the first time it's opened
+        self.metrics_dialog = None
+        #RegionWatcher of the region being watched, None if no region is watched
+        self.region_watcher = None
 
     def create_buttons(self):
         #Button which lets user take a screenshot snippet of any part of the screens to extract text from
@@ -320,6 +503,15 @@ class MainWindow(QMainWindow):
         self.clear_button.setCursor(QCursor(Qt.PointingHandCursor))
         self.clear_button.clicked.connect(self.clear_textbox)
         
+        #Button that starts or stops watching a region of the screen and reading it whenever it changes
+        self.watch_button = QPushButton("Watch", self)
+        self.watch_button.setFont(self.big_button_font)
+        self.watch_button.setGeometry(560, 422, 70, 60)
+        self.watch_button.adjustSize()
+        self.watch_button.setToolTip("Select a region to read again every time its content changes")
+        self.watch_button.setCursor(QCursor(Qt.PointingHandCursor))
+        self.watch_button.clicked.connect(self.watch_region)
+
         #Button that  prints out the output of the textbox to a txt-file
         self.save_txt_button = QPushButton("Save output to txt", self)
         self.save_txt_button.setFont(self.big_button_font)
@@ -371,6 +563,20 @@ class MainWindow(QMainWindow):
         self.help_button.setCursor(QCursor(Qt.WhatsThisCursor))
         self.help_button.clicked.connect(self.show_help)
 
+        #Button that shows how long capturing, reading and saving took
+        self.metrics_button = QPushButton("Metrics", self)
+        self.metrics_button.setFont(QFont("arial", 13, QFont.Bold))
+        self.metrics_button.setGeometry(76, 210, 80, 27)
+        self.metrics_button.setCursor(QCursor(Qt.PointingHandCursor))
+        self.metrics_button.clicked.connect(self.show_metrics)
+
+        #Button that opens the searchable history of OCR results
+        self.history_button = QPushButton("History", self)
+        self.history_button.setFont(QFont("arial", 13, QFont.Bold))
+        self.history_button.setGeometry(159, 210, 80, 27)
+        self.history_button.setCursor(QCursor(Qt.PointingHandCursor))
+        self.history_button.clicked.connect(self.show_history)
+
     def create_checkboxes(self):
         #Checkbox that will automatically create a txt file of the read output when checked
         self.save_txt_checkbox = QCheckBox("Automatically save output as .txt", self)
@@ -420,28 +626,24 @@ class MainWindow(QMainWindow):
         state = self.save_txt_checkbox.isChecked()
         self.auto_save_txt = state
         config.set("USERCONFIG", "autosavetxt", str(state))
-        write_config()
 
     def save_img_clicked(self):
         """Change value of auto_save_img and save value to config.ini."""
         state = self.save_img_checkbox.isChecked()
         self.auto_save_img = state
         config.set("USERCONFIG", "autosaveimg", str(state))
-        write_config()
     
     def auto_copy_clicked(self):
         """Change value of auto_copy_output and save value to config.ini."""
         state = self.auto_copy_checkbox.isChecked()
         self.auto_copy_output = state
         config.set("USERCONFIG", "autocopy", str(state))
-        write_config()
 
     def disable_shortcuts_clicked(self):
         """Change value of disable shortcuts and save value to config.ini."""
         state = self.disable_shortcuts_checkbox.isChecked()
         self.disable_shortcuts = state
         config.set("USERCONFIG", "disable_shortcuts", str(state))
-        write_config()
         self.set_shortcuts()
 
     def load_lang_combos(self):
@@ -451,7 +653,41 @@ class MainWindow(QMainWindow):
 
     def load_langs(self):
         """Add all available languages in Tesseract installation in indexed list, dictionaries and listboxes."""
-        languages = ocr.get_languages()
+        with metrics.span("load_langs"):
+            self.read_langs()
+
+    def read_langs(self):
+        """Read available languages from the cache or Tesseract and add them to the listboxes."""
+        languages = lang_cache.load_languages(ocr.pytesseract.tesseract_cmd)
+        if languages is None:
+            #No valid cache, ask Tesseract before the window can be shown
+            languages = ocr.get_languages()
+            self.save_langs_cache(languages)
+        else:
+            #Show the cached languages right away and check them against Tesseract in the background
+            self.lang_scan_worker = LangScanWorker()
+            self.lang_scan_worker.signals.finished.connect(self.langs_rescanned)
+            QThreadPool.globalInstance().start(self.lang_scan_worker)
+        self.set_avail_langs(languages)
+
+        #Adds all available languages to lang_listbox and add_lang_listbox
+        self.lang_listbox.insertItems(0, self.avail_langs_index)
+        self.add_lang_listbox.insertItems(0, self.avail_langs_index)
+        #Updates the GUI based on user config
+        self.update_all_lang_selection()
+
+    def save_langs_cache(self, languages):
+        """Save languages found in Tesseract installation to langs_cache.json."""
+        try:
+            lang_cache.save_languages(ocr.pytesseract.tesseract_cmd, languages)
+        except OSError:
+            #The languages will just be looked up again on next launch
+            pass
+
+    def set_avail_langs(self, languages):
+        """Rebuild avail_langs, avail_langs_index and avail_langs_swapped from list of Tesseract langcodes."""
+        self.avail_langs = {}
+        self.avail_langs_index = []
         for lang in languages:
             #Adds the full language name from value in lang_codes_dict if key exists, otherwise adds the langcode's key as value in new dictionary
             self.avail_langs[lang] = lang_codes_dict.setdefault(lang, lang)
@@ -461,12 +697,29 @@ class MainWindow(QMainWindow):
         self.avail_langs_index.sort(key=str.casefold)
         #Swaps the 'self.avail_langs' values with its keys
         self.avail_langs_swapped = dict([(value, key) for key, value in self.avail_langs.items()])
-        
-        #Adds all available languages to lang_listbox and add_lang_listbox
+
+    def langs_rescanned(self, languages):
+        """Update language listboxes if the languages in Tesseract installation differ from the cached ones."""
+        self.save_langs_cache(languages)
+        if set(languages) == set(self.avail_langs):
+            return
+        selected_lang = self.selected_lang
+        self.set_avail_langs(languages)
+        self.lang_listbox.clear()
+        self.add_lang_listbox.clear()
         self.lang_listbox.insertItems(0, self.avail_langs_index)
         self.add_lang_listbox.insertItems(0, self.avail_langs_index)
-        #Updates the GUI based on user config
-        self.update_all_lang_selection()
+        #Drop additional languages that were uninstalled
+        self.additional_lang_set = {lang for lang in self.additional_lang_set if lang in self.avail_langs_swapped}
+        if selected_lang in self.avail_langs_swapped:
+            #Keep the current selection if the language is still installed
+            self.lang_listbox.setCurrentRow(self.avail_langs_index.index(selected_lang))
+        else:
+            self.lang_listbox.setCurrentRow(0)
+        self.add_lang_listbox.setCurrentRow(0)
+        self.selected_lang = self.get_main_lang()
+        self.update_lang()
+        self.update_lang_param_listbox()
 
     def update_all_lang_selection(self):
         """Set language selections from saved user config."""
@@ -509,12 +762,35 @@ class MainWindow(QMainWindow):
         config.set("USERCONFIG", "default_lang_main", self.selected_lang)
         config.set("USERCONFIG", "default_is_combo", str(False))
         config.set("USERCONFIG", "default_lang_combo", "")
-        write_config()
 
     def update_lang(self):
         """Update text of main_lang_label."""
         self.main_lang_label.setText(f"Selected Language: {self.selected_lang}")
         self.main_lang_label.adjustSize()
+        self.update_preprocess_menu()
+
+    def get_preprocess_stages(self) -> tuple:
+        """Return preprocessing stages saved for the current language combination in config.ini."""
+        return ocr_core.get_preprocess_stages(config, self.get_lang_combo())
+
+    def update_preprocess_menu(self):
+        """Select the preprocessing saved for the current language combination in preprocess_menu."""
+        stages = self.get_preprocess_stages()
+        for index, preset in enumerate(ocr_preprocess.PRESETS.values()):
+            if preset == stages:
+                self.preprocess_menu.setCurrentIndex(index)
+                return
+        #Stages edited by hand in config.ini that don't match a preset are shown as an extra item
+        custom_name = ", ".join(stages)
+        if self.preprocess_menu.findText(custom_name) < 0:
+            self.preprocess_menu.addItem(custom_name)
+        self.preprocess_menu.setCurrentText(custom_name)
+
+    def set_preprocess_stages(self):
+        """Save the preprocessing selected in preprocess_menu for the current language combination to config.ini."""
+        name = self.preprocess_menu.currentText()
+        stages = ocr_preprocess.PRESETS.get(name, ocr_preprocess.parse_stages(name))
+        config.set("PREPROCESS", self.get_lang_combo(), ",".join(stages))
 
     def add_lang_param(self):
         """Add selected language from add_lang_listbox to additional_lang_set and lang_param_listbox."""
@@ -542,16 +818,11 @@ class MainWindow(QMainWindow):
         """Update the items of lang_param_listbox from additional_lang_set."""
         self.lang_param_listbox.clear()
         self.lang_param_listbox.addItems(self.additional_lang_set)
+        self.update_preprocess_menu()
 
     def get_lang_combo(self) -> str:
         """Return a formatted language parameter string from selected_lang and additional_lang_set."""
-        #Gets the language parameter from the language name
-        lang_param = self.avail_langs_swapped[self.selected_lang]
-        #Checks if there are any added languages
-        for lang in self.additional_lang_set:
-            #Adds the language(s) to the lang parameter
-            lang_param += f"+{self.avail_langs_swapped[lang]}"
-        return lang_param
+        return ocr_core.get_lang_param(self.selected_lang, self.additional_lang_set, self.avail_langs_swapped)
     
     def set_lang_combo(self):
         """Set saved language combination as the selected language with its additional language parameters added."""
@@ -573,7 +844,6 @@ class MainWindow(QMainWindow):
             #Do nothing if no additional languages has been added
             lang_combo = self.get_lang_combo()
             config.set("SAVED_LANG_COMBOS", lang_combo)
-            write_config()
             #Adds the new index to the dropdown menu of saved language combination
             self.saved_lang_combos_menu.clear()
             self.load_lang_combos()
@@ -584,7 +854,6 @@ class MainWindow(QMainWindow):
         """Delete saved language combination from config.ini."""
         option = self.saved_lang_combos_menu.currentText()
         config.remove_option("SAVED_LANG_COMBOS", option)
-        write_config()
         #Update the dropdown menu
         self.saved_lang_combos_menu.clear()
         self.load_lang_combos()
@@ -601,7 +870,6 @@ class MainWindow(QMainWindow):
             #Change boolean to load additional languages to true and save the language combination
             config.set("USERCONFIG", "default_is_combo", str(True))
             config.set("USERCONFIG", "default_lang_combo", lang_combo)
-            write_config()
 
     def reset_gui(self):
         """Update all language related components in GUI to the saved default values in config.ini."""
@@ -614,6 +882,7 @@ class MainWindow(QMainWindow):
     def clear_textbox(self):
         """Empty textbox and read_langs_label."""
         self.textbox.clear()
+        self.textbox.setExtraSelections([])
         self.read_langs_label.clear()
 
     def copy_textbox_contents(self):
@@ -631,27 +900,114 @@ class MainWindow(QMainWindow):
             self.textbox.setReadOnly(True)
 
     def save_txt_file(self, output):
-        """Save contents of textbox to txt file."""
-        #Name txt file after current datetime
-        date_string = get_time_string()
-        #Set savepath based on user specified save folder
-        save_path = self.get_save_folder("savetxtpath")
-        full_path = f"{save_path}{date_string}.txt"
+        """Queue contents of textbox to be saved to txt file."""
         if output != "":
             #Don't save if textbox is empty
-            with open(full_path, "w", encoding="utf-8") as file:
-                file.write(output)
-
-    def get_save_folder(self, cfg_var) -> str:
-        """Return formatted savepath for specified savefolder variable in config.ini."""
-        save_path = config.get("USERCONFIG", cfg_var)
-        if save_path != "":
-            if pathlib.Path(save_path).exists() is False:
-                #Create directory if it doesn't exist
-                pathlib.Path(save_path).mkdir(parents=True)
-            #Append forward-slash if user has specified custom save folder
-            save_path = save_path+"/"
-        return save_path
+            with metrics.span("save_txt_file"):
+                self.save_writer.save_text(config.get("USERCONFIG", "savetxtpath"), f"{get_time_string()}.txt",
+                                           output)
+
+    def save_words_file(self, words):
+        """Queue words of the last snippet to be exported to a file in the export_format set in config.ini."""
+        export_format = config.get("USERCONFIG", "export_format", fallback="")
+        if export_format not in ocr_result.EXPORT_FORMATS or len(words) == 0:
+            return
+        def write(path):
+            with metrics.span(f"write_{export_format}"):
+                ocr_result.write_export(words, path, export_format)
+        self.save_writer.submit(config.get("USERCONFIG", "savetxtpath"),
+                                f"{get_time_string()}{ocr_result.EXPORT_FORMATS[export_format]}", write)
+
+    def highlight_words(self, words):
+        """Highlight words read with low confidence in textbox, which must show words.layout_text()."""
+        if words is None or len(words) == 0:
+            self.textbox.setExtraSelections([])
+            return
+        threshold = config.getfloat("USERCONFIG", "low_conf_threshold", fallback=ocr_result.DEFAULT_LOW_CONFIDENCE)
+        text, starts, ends = words.layout_text()
+        starts, ends = starts.tolist(), ends.tolist()
+        if text and max(text) > "\uffff":
+            #Qt counts characters outside the Basic Multilingual Plane as two positions
+            wide = list(accumulate((ord(char) > 0xFFFF for char in text), initial=0))
+            starts = [start + wide[start] for start in starts]
+            ends = [end + wide[end] for end in ends]
+        selections = []
+        for index in words.low_confidence(threshold).nonzero()[0].tolist():
+            selection = QTextEdit.ExtraSelection()
+            selection.format.setBackground(self.LOW_CONFIDENCE_COLOR)
+            selection.format.setToolTip(f"Confidence {words.confidences[index]:.0f}%")
+            selection.cursor = QTextCursor(self.textbox.document())
+            selection.cursor.setPosition(starts[index])
+            selection.cursor.setPosition(ends[index], QTextCursor.KeepAnchor)
+            selections.append(selection)
+        self.textbox.setExtraSelections(selections)
+
+    def save_img_file(self, image):
+        """
+        Queue QImage to be saved to png file, return its path or None if it couldn't be queued.
+
+        With saveimg_storage = archive the image is added to the snippet archive of the save folder under that path's
+        file name instead.
+        """
+        folder = config.get("USERCONFIG", "saveimgpath")
+        file_name = f"{get_time_string()}.png"
+        path = os.path.join(folder, file_name)
+        with metrics.span("save_png_file"):
+            if config.get("USERCONFIG", "saveimg_storage", fallback="files") == "archive":
+                from image_archive import REFERENCE_PREFIX
+                queued = self.save_writer.submit(folder, file_name, self.get_archive_writer(folder, file_name, image))
+                #No file is written at path, the history gets a reference resolved through the archive index
+                path = REFERENCE_PREFIX + path
+            else:
+                queued = self.save_writer.save_image(folder, file_name, image)
+        return path if queued else None
+
+    def get_image_archive(self, folder):
+        """Return snippet archive of image save folder, created the first time it is used."""
+        archive = self.image_archives.get(folder)
+        if archive is None:
+            from image_archive import ImageArchive
+            shard_size = config.getint("USERCONFIG", "archive_shard_size", fallback=256) * 1024 * 1024
+            archive = self.image_archives[folder] = ImageArchive(folder, shard_size)
+        return archive
+
+    def get_archive_writer(self, folder, file_name, image):
+        """Return function adding QImage to the snippet archive of folder on the SaveWriter thread."""
+        archive = self.get_image_archive(folder)
+        def encode():
+            with metrics.span("encode_png"):
+                return qimage_to_png(image)
+        def write(path):
+            #Hashing and encoding happen here, the GUI thread only hands over the QImage
+            with metrics.span("write_archive"):
+                archive.add(file_name, qimage_key(image), encode, image.width(), image.height())
+        return write
+
+    def show_engine_fallback(self):
+        """Tell the user once if the configured OCR engine couldn't be loaded and another one reads instead."""
+        reason = getattr(self.ocr_engine, "fallback_reason", None)
+        if reason is None or self.engine_fallback_shown:
+            return
+        self.engine_fallback_shown = True
+        warning_msg = QMessageBox(self)
+        warning_msg.setIcon(QMessageBox.Warning)
+        warning_msg.setText("OCR engine not available!")
+        warning_msg.setInformativeText(f"Images are still read, but more slowly.\n\nError Message:\n'{reason}'")
+        warning_msg.setWindowTitle("Warning")
+        #Not modal, so reading isn't held up by it
+        warning_msg.setAttribute(Qt.WA_DeleteOnClose)
+        warning_msg.show()
+
+    def save_failed(self, path, error):
+        """Show error message if an output file could not be saved."""
+        error_msg = QMessageBox(self)
+        error_msg.setIcon(QMessageBox.Warning)
+        error_msg.setText("Error saving file!")
+        error_msg.setInformativeText(f"'{path}' was not saved.\n\nError Message:\n'{error}'")
+        error_msg.setWindowTitle("Error")
+        #Not modal, so the next snippet isn't held up by it
+        error_msg.setAttribute(Qt.WA_DeleteOnClose)
+        error_msg.show()
 
     def set_save_folder(self, cfg_var):
         """Save user selected folder to specified savefolder variable in config.ini."""
@@ -659,7 +1015,6 @@ class MainWindow(QMainWindow):
         if folder != "":
             #Do nothing if user cancels filedialog
             config.set("USERCONFIG", cfg_var, folder)
-            write_config()
             self.update_save_folder(cfg_var, folder)
     
     def reset_save_folder(self, cfg_var):
@@ -673,7 +1028,6 @@ class MainWindow(QMainWindow):
             confirmbox = QMessageBox().question(self, "Reset Save Folder", f"Are you sure you want reset save folder for {filetype}?", QMessageBox().Yes | QMessageBox().No)
             if confirmbox == QMessageBox.Yes:
                 config.set("USERCONFIG", cfg_var, "")
-                write_config()
                 self.update_save_folder(cfg_var, "")
 
     def update_save_folder(self, cfg_var, value):
@@ -685,19 +1039,14 @@ class MainWindow(QMainWindow):
             self.save_img_folder_label.setText(value)
             self.save_img_folder_label.adjustSize()
 
-    def read_image_buffer(self, pixmap):
-        """Convert QPixmap image to PIL Image and send converted image to OCR function."""
-        #Convert QPixmap to QImage
-        screenshot = QImage()
-        screenshot = pixmap.toImage()
-        buffer = QBuffer()
-        buffer.open(QBuffer.ReadWrite)
-        #Convert QImage to PIL Image
-        screenshot.save(buffer, "PNG")
-        newimg = Image.open(io.BytesIO(buffer.data()))
-        buffer.close()
+    def read_image_buffer(self, screenshot) -> OcrWorker:
+        """Convert QImage to PIL Image and send converted image to OCR function, return its OCR job."""
+        with metrics.span("read_image_buffer"):
+            #Convert QImage to PIL Image straight from its pixel buffer, into shared memory if the worker
+            #pool engine hands images to its workers that way
+            newimg = qimage_to_pil(screenshot, getattr(self.ocr_engine, "shared_images", None))
         #Send image to OCR function
-        self.ocr_image(newimg)
+        return self.ocr_image(newimg)
 
     def read_image_file(self):
         """Send user selected image file to OCR function."""
@@ -710,11 +1059,19 @@ class MainWindow(QMainWindow):
             get_dir = file.rsplit("/",1)[0]
             #Save file's directory in config.ini
             config.set("USERCONFIG", "lastdir", get_dir)
-            write_config()
             try:
+                if page_reader.is_pdf(file):
+                    #Send PDF to OCR function that reads it page by page
+                    self.ocr_document(file)
+                    return
                 #Send image to OCR function if file is a valid image
                 img = Image.open(file)
-                self.ocr_image(img)
+                if getattr(img, "n_frames", 1) > 1:
+                    #Read every frame of multi-page images such as TIFF
+                    img.close()
+                    self.ocr_document(file)
+                else:
+                    self.ocr_image(img, file)
             except:
                 #Show error message if file is not valid
                 error_msg = QMessageBox()
@@ -724,24 +1081,179 @@ class MainWindow(QMainWindow):
                 error_msg.setWindowTitle("Error")
                 error_msg.exec_()
 
-    def ocr_image(self, image):
-        """Use TesseractOCR to extract text from image."""
-        #Set chosen language parameters
+    def ocr_image(self, image, source="snippet") -> OcrWorker:
+        """Queue an OCR job that uses TesseractOCR to extract text from image in a background thread and return it."""
+        #Set chosen language parameters at the time of the request
         lang_param = self.get_lang_combo()
-        img_text = ocr.image_to_string(image, lang=lang_param).strip()
-        #Paste output string to textbox without trailing whitespaces
-        self.textbox.setPlainText(img_text)
+        job_id = self.next_ocr_job_id
+        self.next_ocr_job_id += 1
+        worker = OcrWorker(job_id, image, lang_param, self.ocr_engine, self.ocr_cache, *self.get_tile_settings(),
+                           self.get_preprocess_stages(),
+                           config.get("USERCONFIG", "result_mode", fallback="text") == "words")
+        worker.source = source
+        self.start_ocr_job(worker)
+        return worker
+
+    def ocr_document(self, path):
+        """Queue an OCR job that reads every page of a PDF or multi-page image file in a background thread."""
+        worker = DocumentOcrWorker(self.next_ocr_job_id, path, self.get_lang_combo(), self.ocr_engine, self.ocr_cache,
+                                   *self.get_tile_settings(), self.get_preprocess_stages(),
+                                   config.getint("USERCONFIG", "max_pages_in_flight", fallback=2),
+                                   config.getint("USERCONFIG", "pdf_dpi", fallback=page_reader.DEFAULT_PDF_DPI),
+                                   config.get("USERCONFIG", "pdftoppm_path", fallback=page_reader.DEFAULT_PDFTOPPM))
+        self.next_ocr_job_id += 1
+        worker.signals.page_finished.connect(self.ocr_page_finished)
+        self.start_ocr_job(worker)
+
+    def get_tile_settings(self) -> tuple:
+        """Return minimum pixel count for tiled OCR and number of tiles read at the same time from config.ini."""
+        return ocr_core.get_tile_settings(config)
+
+    def start_ocr_job(self, worker):
+        """Connect signals of OCR job and start it in the thread pool."""
+        worker.signals.started.connect(self.ocr_started)
+        worker.signals.finished.connect(self.ocr_finished)
+        worker.signals.failed.connect(self.ocr_failed)
+        worker.signals.cancelled.connect(self.ocr_cancelled)
+        self.ocr_jobs[worker.job_id] = worker
+        self.ocr_thread_pool.start(worker)
+
+    def ocr_started(self, job_id):
+        """Show that an OCR job is in progress."""
+        if job_id > self.shown_ocr_job_id:
+            self.read_langs_label.setText("Reading...")
+            self.read_langs_label.adjustSize()
+
+    def ocr_page_finished(self, job_id, page, img_text):
+        """Append text of a page to textbox as soon as it has been read."""
+        if job_id < self.shown_ocr_job_id:
+            return
+        self.shown_ocr_job_id = job_id
+        if page == 1:
+            self.textbox.setPlainText(img_text)
+        else:
+            self.textbox.appendPlainText(f"\n{img_text}")
+        self.read_langs_label.setText(f"Reading... (page {page} done)")
+        self.read_langs_label.adjustSize()
+
+    def ocr_finished(self, job_id, img_text, lang_param, cached):
+        """Show output of a finished OCR job in GUI."""
+        worker = self.ocr_jobs.pop(job_id, None)
+        if job_id < self.shown_ocr_job_id:
+            #Don't let an older job overwrite the output of a newer one
+            return
+        self.shown_ocr_job_id = job_id
+        if self.textbox.toPlainText() != img_text:
+            #Paste output string to textbox without trailing whitespaces
+            #(Multi-page documents are already in textbox page by page)
+            self.textbox.setPlainText(img_text)
+        words = worker.words if worker is not None else None
+        self.highlight_words(words)
         if self.auto_copy_output:
             #Copy output to user clipboard if auto_copy_checkbox is checked
             self.copy_textbox_contents()
         if self.auto_save_txt:
             #Save output as txt file if save_txt_checkbox is checked
             self.save_txt_file(img_text)
-        self.print_read_langs()
+            if words is not None:
+                self.save_words_file(words)
+        if self.ocr_history is not None and worker is not None:
+            self.ocr_history.record(img_text, lang_param, worker.source, worker.thumbnail)
+        self.print_read_langs(lang_param)
+        self.update_read_info(cached, worker.preprocess_timings if worker is not None else {})
+        #Pool workers only report a fallback once they have read an image
+        self.show_engine_fallback()
+
+    def ocr_failed(self, job_id, error):
+        """Show error message if an OCR job failed."""
+        worker = self.ocr_jobs.pop(job_id, None)
+        if job_id < self.shown_ocr_job_id or (worker is not None and worker.is_cancelled):
+            #Errors of jobs replaced by a newer one or cancelled by the user are not shown
+            if len(self.ocr_jobs) == 0:
+                self.read_langs_label.clear()
+            return
+        self.show_read_error(error)
+
+    def show_read_error(self, error):
+        """Show error message of a failed read."""
+        self.read_langs_label.clear()
+        error_msg = QMessageBox()
+        error_msg.setIcon(QMessageBox.Critical)
+        error_msg.setText("Error reading image!")
+        error_msg.setInformativeText(f"Error Message:\n'{error}'")
+        error_msg.setWindowTitle("Error")
+        error_msg.exec_()
+
+    def ocr_cancelled(self, job_id):
+        """Forget a cancelled OCR job."""
+        self.ocr_jobs.pop(job_id, None)
+        if len(self.ocr_jobs) == 0:
+            self.read_langs_label.clear()
+
+    def cancel_ocr_jobs(self):
+        """Cancel all OCR jobs that have not finished yet."""
+        for worker in self.ocr_jobs.values():
+            worker.cancel()
+
+    def eventFilter(self, watched, event):
+        """Show the confidence of the highlighted word under the mouse as tooltip of textbox."""
+        if watched is self.textbox.viewport() and event.type() == QEvent.ToolTip:
+            position = self.textbox.cursorForPosition(event.pos()).position()
+            #Extra selections aren't part of the document, so their tooltips have to be looked up here
+            for selection in self.textbox.extraSelections():
+                if selection.cursor.selectionStart() <= position < selection.cursor.selectionEnd():
+                    QToolTip.showText(event.globalPos(), selection.format.toolTip(), watched)
+                    return True
+            QToolTip.hideText()
+            return True
+        return super().eventFilter(watched, event)
 
-    def print_read_langs(self):
+    def keyPressEvent(self, event):
+        """Cancel running OCR jobs when pressing escape."""
+        if event.key() == Qt.Key_Escape and len(self.ocr_jobs) > 0:
+            self.cancel_ocr_jobs()
+        else:
+            super().keyPressEvent(event)
+
+    def closeEvent(self, event):
+        """Cancel running OCR jobs and wait for the thread pool before closing."""
+        self.stop_watch()
+        self.cancel_ocr_jobs()
+        self.ocr_thread_pool.waitForDone()
+        self.ocr_engine.close()
+        if self.ocr_cache is not None:
+            self.ocr_cache.close()
+        if self.ocr_history is not None:
+            #Write the last results to the history
+            self.ocr_history.close()
+        #Finish saving queued output files
+        self.save_writer.close()
+        for archive in self.image_archives.values():
+            archive.close()
+        #Write settings changed in the last second instead of waiting for the flush timer
+        ocr_core.write_config(config)
+        super().closeEvent(event)
+
+    def update_read_info(self, cached, preprocess_timings):
+        """Mark cached output in read_langs_label and show cache counters and preprocessing timings in its tooltip."""
+        info = []
+        if self.ocr_cache is not None:
+            stats = self.ocr_cache.stats()
+            if cached:
+                self.read_langs_label.setText(f"{self.read_langs_label.text()} (cached)")
+                self.read_langs_label.adjustSize()
+            info += [f"OCR cache hits: {stats['memory_hits']} memory, {stats['disk_hits']} disk",
+                     f"OCR cache misses: {stats['misses']}",
+                     f"Hit rate: {stats['hit_rate']:.0%}",
+                     f"OCR time saved: {stats['seconds_saved']:.2f} s"]
+        for stage, seconds in preprocess_timings.items():
+            info.append(f"Preprocessing {stage}: {seconds * 1000:.1f} ms")
+        self.read_langs_label.setToolTip("\n".join(info))
+
+    def print_read_langs(self, langs=None):
         """Show language parameters used in OCR function in GUI."""
-        langs = self.get_lang_combo()
+        if langs is None:
+            langs = self.get_lang_combo()
         self.read_langs_label.setText(f"Language Parameters: {langs}")
         self.read_langs_label.adjustSize()
 
@@ -752,7 +1264,6 @@ class MainWindow(QMainWindow):
             default_config = config.items("DEFAULT")
             for k, v in default_config:
                 config.set("USERCONFIG", k, v)
-            write_config()
             self.reset_gui()
             self.save_txt_folder_label.clear()
             self.save_img_folder_label.clear()
@@ -761,294 +1272,518 @@ class MainWindow(QMainWindow):
         """Show help messagebox."""
         help_msg = QMessageBox()
         help_msg.setIcon(QMessageBox.Information)
-        help_msg.setText("Extract text from an image using TesseractOCR by either taking a screenshot snippet from your screens with the application or by selecting a locally saved image file. The snippet tool may not cover all screens if monitor resolutions and positions differ wildly from each other.\n\nTo change which language to read, select the language from the list of languages with the blue text. If the language you are looking for is not in the list, it is either not supported by TesseractOCR or you have not installed the language in Tesseract.\n\nIf you want to read multiple languages you can add them from the list of available languages under 'Additional Languages' (rightmost listbox). If you want to use the language combination another time, you can save the current language combination. Language combinations are saved to the 'config.ini' file.")
+        help_msg.setText("Extract text from an image using TesseractOCR by either taking a screenshot snippet from your screens with the application or by selecting a locally saved image file. The snippet tool covers every screen, and a selection can span several screens.\n\nTo change which language to read, select the language from the list of languages with the blue text. If the language you are looking for is not in the list, it is either not supported by TesseractOCR or you have not installed the language in Tesseract.\n\nIf you want to read multiple languages you can add them from the list of available languages under 'Additional Languages' (rightmost listbox). If you want to use the language combination another time, you can save the current language combination. Language combinations are saved to the 'config.ini' file.")
         help_msg.setWindowTitle("Help")
         help_msg.exec_()
 
-    def new_snippet(self):
+    def show_metrics(self):
+        """Show dialog with the recorded timings."""
+        if self.metrics_dialog is None:
+            self.metrics_dialog = MetricsDialog(self)
+        self.metrics_dialog.show()
+        self.metrics_dialog.raise_()
+
+    def show_history(self):
+        """Show dialog for searching the history of OCR results."""
+        if self.ocr_history is None:
+            error_msg = QMessageBox(self)
+            error_msg.setIcon(QMessageBox.Information)
+            error_msg.setText("The OCR history is turned off.")
+            error_msg.setInformativeText("Set history_enabled = True in config.ini and restart the application "
+                                         "to record OCR results. The history needs SQLite with FTS5.")
+            error_msg.setWindowTitle("History")
+            error_msg.exec_()
+            return
+        if self.history_dialog is None:
+            self.history_dialog = HistoryDialog(self, self.ocr_history)
+        self.history_dialog.show()
+        self.history_dialog.raise_()
+        self.history_dialog.refresh()
+
+    def show_history_entry(self, text):
+        """Show text of a history entry in textbox."""
+        self.clear_textbox()
+        self.textbox.setPlainText(text)
+
+    def new_snippet(self, watch=False):
         """
-        Create dim Splashscreen object and show dim Splashscreen.
+        Dim every screen with an overlay window and let user select an area.
 
-        Also responsible for tracking mouse and capturing screenshot.
+        CreateSnippet is also responsible for tracking mouse and capturing screenshot.
+        If watch is True the selected area is watched instead of read once.
         """
-        self.snippet = CreateSnippet(self)
+        freeze_frame = config.getboolean("USERCONFIG", "freeze_frame", fallback=False) and not watch
+        self.snippet = CreateSnippet(self, freeze_frame, watch)
         self.snippet.show()
 
+    def watch_region(self):
+        """Let user select a region to watch, or stop watching the current one."""
+        if self.region_watcher is not None:
+            self.stop_watch()
+        else:
+            self.new_snippet(watch=True)
+
+    def start_watch(self, region):
+        """Start reading region (global coordinates) every time its content changes."""
+        self.region_watcher = RegionWatcher(self, region,
+                                            config.getfloat("USERCONFIG", "watch_interval",
+                                                            fallback=region_watch.DEFAULT_INTERVAL),
+                                            config.getfloat("USERCONFIG", "watch_cpu_budget",
+                                                            fallback=region_watch.DEFAULT_CPU_BUDGET),
+                                            config.getfloat("USERCONFIG", "watch_threshold",
+                                                            fallback=region_watch.DEFAULT_THRESHOLD))
+        self.watch_button.setText("Stop")
+        self.textbox.appendPlainText(f"[{datetime.now():%Y-%m-%d %H:%M:%S}] Watching region {region.x()},{region.y()} "
+                                     f"{region.width()}x{region.height()}\n")
+        self.region_watcher.start()
+
+    def stop_watch(self):
+        """Stop watching the region."""
+        if self.region_watcher is not None:
+            self.region_watcher.stop()
+            self.region_watcher = None
+        self.watch_button.setText("Watch")
+
+    def append_watch_output(self, img_text, lang_param, file_name):
+        """Append text read from the watched region to textbox (and to its txt file) with a timestamp."""
+        entry = f"[{datetime.now():%Y-%m-%d %H:%M:%S}]\n{img_text}\n"
+        self.textbox.appendPlainText(entry)
+        if self.ocr_history is not None:
+            self.ocr_history.record(img_text, lang_param, "watch")
+        if self.auto_save_txt:
+            #All outputs of one watched region go to the same txt file
+            self.save_writer.append_text(config.get("USERCONFIG", "savetxtpath"), file_name, entry + "\n")
+        self.print_read_langs(lang_param)
 
-class CreateSnippet(QSplashScreen):
-    """QSplashScreen, that track mouse event for capturing screenshot."""
-    def __init__(self, mainwindow):
+
+class CreateSnippet(QObject):
+    """
+    Selection shared by one SnippetOverlay per screen, captures the selected area when the mouse is released.
+
+    The selection is kept in global (virtual desktop) coordinates, so it can be dragged across screens.
+    With freeze_frame every screen is captured once before the overlays are shown, the overlays show that still
+    image and the selection is cut out of it in memory, instead of grabbing the screen after the overlays are hidden.
+    """
+    def __init__(self, mainwindow, freeze_frame=False, watch=False):
         super().__init__()
         #Reference to MainWindow object
         self.mainwindow = mainwindow
+        #Setting to watch the selected area instead of reading it once if True
+        self.watch = watch
+        #Still images of every screen (list of screen_capture.ScreenFrame), None if the screen is grabbed on release
+        self.frames = None
+        self.freeze_frame = freeze_frame
 
-        #Start and end variables for snippet function
-        self.origin = QPoint(0,0)
-        self.end = QPoint(0,0)
+        #Start and end of the selection in global coordinates, None while nothing is selected
+        self.origin = None
+        self.end = None
 
-        #The box that shows when holding mouse down
-        self.rubberband = QRubberBand(QRubberBand.Rectangle, self)
-        
-        #The leftmost x-coordinate of all monitors geometry, might be negative
-        self.x_min = 0
-        #The topmost y-coordinate of all monitors geometry, might be negative
-        self.y_min = 0
+        #One overlay sized to each screen that is present
+        self.overlays = [SnippetOverlay(self, screen, index) for index, screen in enumerate(QGuiApplication.screens())]
 
-        #Function to capture snippet
-        self.dim_screen()
-
-    def dim_screen(self):
-        """
-        Fill splashScreen with black color and reduce the widget opacity to create dim screen effect on all screens.
+    def show(self):
+        """Dim all screens and hide MainWindow so user can snippet what's behind it."""
+        self.mainwindow.hide()
+        if self.freeze_frame:
+            #Let the window system remove MainWindow before the screens are captured
+            QApplication.processEvents()
+            with metrics.span("grab_screens"):
+                frames = screen_capture.grab_screens()
+            if all(not frame.pixmap.isNull() for frame in frames):
+                self.frames = frames
+            #Otherwise the platform can't capture screens up front, grab the selection on release instead
+        for overlay in self.overlays:
+            overlay.show()
+        #Give keyboard focus to the overlay under the cursor so escape works right away
+        cursor_pos = QCursor.pos()
+        for overlay in self.overlays:
+            if overlay.geometry().contains(cursor_pos):
+                overlay.activateWindow()
+                overlay.setFocus()
+
+    def get_selection(self) -> QRect:
+        """Return selected rectangle in global coordinates, empty if nothing is selected."""
+        if self.origin is None or self.end is None:
+            return QRect()
+        #Creates proper rectangle even if mouse traveled right to left or bottom to top
+        return QRect(min(self.origin.x(), self.end.x()), min(self.origin.y(), self.end.y()),
+                     abs(self.end.x() - self.origin.x()), abs(self.end.y() - self.origin.y()))
+
+    def update_overlays(self):
+        """Repaint every overlay with the current selection."""
+        for overlay in self.overlays:
+            overlay.update()
+
+    def start_selection(self, pos):
+        """Start selection at global position pos."""
+        self.origin = pos
+        self.end = pos
+        self.update_overlays()
+
+    def move_selection(self, pos):
+        """Move end of the selection to global position pos."""
+        if self.origin is None:
+            return
+        self.end = pos
+        self.update_overlays()
+
+    def close_overlays(self):
+        """Close all overlays and return to MainWindow."""
+        for overlay in self.overlays:
+            overlay.close()
+            overlay.deleteLater()
+        self.overlays = []
+        self.mainwindow.show()
+
+    def cancel(self):
+        """Interrupt snippet function."""
+        self.origin = None
+        self.frames = None
+        self.close_overlays()
+
+    def finish_selection(self, pos):
+        """Capture selected area and send it to MainWindow to be read."""
+        if self.origin is None:
+            return
+        self.end = pos
+        selection = self.get_selection()
+        #Hide overlays before grabbing so they aren't captured
+        for overlay in self.overlays:
+            overlay.hide()
+        if self.watch and selection.width() > 0 and selection.height() > 0:
+            self.mainwindow.start_watch(selection)
+        elif selection.width() > 0 and selection.height() > 0:
+            if self.frames is not None:
+                #Cut selection out of the still images, at the native resolution of its screens
+                with metrics.span("crop_frames"):
+                    selected_pixel_map = screen_capture.crop_frames(self.frames, selection)
+            else:
+                screen = QGuiApplication.primaryScreen()
+                #Window 0 is the whole virtual desktop, so global coordinates can be used directly
+                with metrics.span("grab_window"):
+                    selected_pixel_map = screen.grabWindow(0, selection.x(), selection.y(),
+                                                           selection.width(), selection.height())
+            #Convert QPixmap to QImage once, for reading and for saving
+            #(QPixmap can only be used on the GUI thread, QImage can be saved on the writer thread)
+            with metrics.span("pixmap_to_image"):
+                selected_image = selected_pixel_map.toImage()
+            #Convert QImage to PIL Image and queue OCR job
+            worker = self.mainwindow.read_image_buffer(selected_image)
 
-        This will not work for very weird multiple-monitor positions or when difference in resolutions between monitors are too varied.
-        """
-        #Get the combined geometry of all monitors
-        screen_geometry = QGuiApplication.primaryScreen().virtualGeometry()     
-        all_screens = QGuiApplication.screens()
+            if self.mainwindow.auto_save_img:
+                #Queue screenshot snippet to be saved as png file if save_img_textbox is checked
+                #The job only finishes after this returns to the event loop, so the history gets the path
+                worker.thumbnail = self.mainwindow.save_img_file(selected_image)
+        self.origin = None
+        #Free the still images
+        self.frames = None
+        #Return to MainWindow
+        self.close_overlays()
+
+class RegionWatcher(QObject):
+    """
+    Polls a region of the screen and reads the rows of it that changed since they were last read.
 
+    Polls are skipped while a read is running, and the time between polls grows so polling and reading together stay
+    within the CPU budget.
+    """
+    def __init__(self, mainwindow, region, interval, cpu_budget, threshold):
+        super().__init__()
+        self.mainwindow = mainwindow
+        #Watched region in global coordinates
+        self.region = region
+        self.interval = interval
+        self.detector = region_watch.ChangeDetector(threshold=threshold)
+        self.budget = region_watch.CpuBudget(cpu_budget)
+        #OcrWorker reading the region, None while no read is running
+        self.worker = None
+        self.next_job_id = 0
+        self.read_start_time = 0.0
+        #Last text read from each band of rows (k = (top, bottom), v = text), so unchanged text isn't appended again
+        self.last_texts = {}
+        #Txt file the outputs are appended to when autosavetxt is on
+        self.file_name = f"{get_time_string()}-watch.txt"
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.poll)
+
+    def start(self):
+        """Read the region now and start polling it."""
+        self.timer.start(0)
+
+    def stop(self):
+        """Stop polling and cancel a running read."""
+        self.timer.stop()
+        if self.worker is not None:
+            self.worker.cancel()
+            self.worker = None
+
+    def poll(self):
+        """Grab the region and read the rows that changed, then schedule the next poll."""
+        start_time = time.perf_counter()
+        if self.worker is None:
+            with metrics.span("watch_poll"):
+                screen = QGuiApplication.primaryScreen()
+                image = screen.grabWindow(0, self.region.x(), self.region.y(),
+                                          self.region.width(), self.region.height()).toImage()
+                if not image.isNull():
+                    changed = self.detector.compare(qimage_to_array(image))
+                    band = self.detector.changed_band(changed, image.height())
+                    if band is not None:
+                        self.detector.commit()
+                        self.read_band(image, band)
+        self.budget.spend(time.perf_counter() - start_time)
+        self.timer.start(int(self.budget.next_delay(self.interval) * 1000))
+
+    def read_band(self, image, band):
+        """Queue an OCR job that reads rows top to bottom of QImage."""
+        top, bottom = band
+        pil_image = qimage_to_pil(image.copy(0, top, image.width(), bottom - top),
+                                  getattr(self.mainwindow.ocr_engine, "shared_images", None))
+        mainwindow = self.mainwindow
+        self.worker = OcrWorker(self.next_job_id, pil_image, mainwindow.get_lang_combo(), mainwindow.ocr_engine,
+                                mainwindow.ocr_cache, *mainwindow.get_tile_settings(),
+                                mainwindow.get_preprocess_stages())
+        self.worker.band = band
+        self.next_job_id += 1
+        self.worker.signals.finished.connect(self.read_finished)
+        self.worker.signals.failed.connect(self.read_failed)
+        self.read_start_time = time.perf_counter()
+        mainwindow.ocr_thread_pool.start(self.worker)
+
+    def read_finished(self, job_id, img_text, lang_param, cached):
+        """Append text of the changed rows if it differs from what was last read there."""
+        if self.worker is None or job_id != self.worker.job_id:
+            return
+        band = self.worker.band
+        self.worker = None
+        #Reading counts towards the budget, so the next poll waits for it
+        self.budget.spend(time.perf_counter() - self.read_start_time)
+        if img_text != "" and self.last_texts.get(band) != img_text:
+            self.last_texts[band] = img_text
+            self.mainwindow.append_watch_output(img_text, lang_param, self.file_name)
+
+    def read_failed(self, job_id, error):
+        """Stop watching and show the error."""
+        if self.worker is None or job_id != self.worker.job_id:
+            return
+        self.worker = None
+        self.mainwindow.stop_watch()
+        self.mainwindow.show_read_error(error)
+
+class SnippetOverlay(QWidget):
+    """Frameless window covering one screen with a translucent dim and the part of the selection on that screen."""
+    #Dim painted over the screen (black at 40% opacity)
+    DIM_COLOR = QColor(0, 0, 0, 102)
+    #Fill and border of the selected area
+    SELECTION_COLOR = QColor(255, 255, 255, 40)
+    SELECTION_BORDER_COLOR = QColor(0, 120, 215)
+
+    def __init__(self, snippet, screen, screen_index):
+        super().__init__(None, Qt.FramelessWindowHint | Qt.WindowStaysOnTopHint | Qt.Tool)
+        #CreateSnippet holding the shared selection
+        self.snippet = snippet
+        #Index of the screen in QGuiApplication.screens(), and of its still image in snippet.frames
+        self.screen_index = screen_index
+        #Painted without a backing pixmap, the window itself is transparent
+        self.setAttribute(Qt.WA_TranslucentBackground)
+        self.setAttribute(Qt.WA_NoSystemBackground)
         #Change cursor to cross when inside snippet functionality
         self.setCursor(QCursor(Qt.CrossCursor))
-        
-        x_values = []
-        y_values = []
-        #Loop through all screens to set coordinates that matches monitor positions
-        for screen in all_screens:
-            #Updates the leftmost and topmost coordinates
-            if self.x_min > screen.geometry().left():
-                self.x_min = screen.geometry().left()
-            if self.y_min > screen.geometry().top():
-                self.y_min = screen.geometry().top()
-
-            #Create a list based on maximum x and y coordinates for every monitor
-            x_values.append(screen.geometry().right())
-            y_values.append(screen.geometry().bottom())
-        
-        width = 0
-        height = 0
-        if len(all_screens) % 2 == 0:
-            #If even number of monitors, multiply width by 1.5 if monitors are stacked horizontally and vice versa
-            #Normal width/height doesn't work for even amount of monitors
-            if max(x_values)-min(x_values) > max(y_values)-min(y_values):
-                #If the disparity between top and bottom x-values are greater than the y-values it means the monitors are stacked horizontally
-                width = int(screen_geometry.width()*1.5)
-                height = screen_geometry.height()
-            else:
-                #If the monitors are stacked vertically
-                width = screen_geometry.width()
-                height = int(screen_geometry.height()*1.5)
-        else:
-            #If odd number of monitors, proceed as usual
-            width = screen_geometry.width()
-            height = screen_geometry.height()
+        self.setFocusPolicy(Qt.StrongFocus)
+        self.setGeometry(screen.geometry())
+
+    def paintEvent(self, event):
+        """Dim the screen (or its still image) and draw the part of the selection that is on it."""
+        painter = QPainter(self)
+        if self.snippet.frames is not None and self.screen_index < len(self.snippet.frames):
+            painter.drawPixmap(self.rect(), self.snippet.frames[self.screen_index].pixmap)
+        painter.fillRect(self.rect(), self.DIM_COLOR)
+        selection = self.snippet.get_selection()
+        if not selection.isEmpty():
+            #Selection in global coordinates moved into this window's coordinates
+            local_selection = selection.translated(-self.geometry().topLeft())
+            painter.setCompositionMode(QPainter.CompositionMode_Source)
+            painter.fillRect(local_selection, self.SELECTION_COLOR)
+            painter.setCompositionMode(QPainter.CompositionMode_SourceOver)
+            painter.setPen(self.SELECTION_BORDER_COLOR)
+            painter.drawRect(local_selection.adjusted(0, 0, -1, -1))
+        painter.end()
 
-        #Fill all screens with black color
-        screen_pixelmap = QPixmap(width, height)
-        screen_pixelmap.fill(QColor(0,0,0))
-
-        #Always place dim/pixmap in center regardless of monitor position
-        avg_x = int(sum(x_values)/len(x_values))
-        avg_y = int(sum(y_values)/len(y_values))
-        self.move(avg_x, avg_y)
-
-        self.setPixmap(screen_pixelmap)
-        #Minimize MainWindow so user can snippet what's behind it
-        self.mainwindow.hide()
-        #Set opacity of black color to 40%
-        self.setWindowOpacity(0.4)
-    
     def keyPressEvent(self, event):
         """Interrupt snippet function when pressing escape."""
         if event.key() == Qt.Key_Escape:
-            self.rubberband.hide()
-            self.hide()
-            self.mainwindow.show()
+            self.snippet.cancel()
 
     def mousePressEvent(self, event):
-        """Show rectangle at mouse position when left-clicked."""
+        """Start selection at mouse position when left-clicked."""
         if event.button() == Qt.LeftButton:
-            #Get start coordinates
-            self.origin = event.pos()
-            self.rubberband.setGeometry(QRect(self.origin, QSize()))
-            self.rubberband.show()
+            self.snippet.start_selection(event.globalPos())
 
     def mouseMoveEvent(self, event):
-        """Resize rectangle as we move mouse, after left-clicked."""
-        self.rubberband.setGeometry(QRect(self.origin, event.pos()).normalized())
+        """Resize selection as we move mouse, after left-clicked (also when moved onto another screen)."""
+        self.snippet.move_selection(event.globalPos())
 
     def mouseReleaseEvent(self, event):
-        """Upon mouse released, ask the main desktop's QScreen to capture screen on defined area."""
+        """Upon mouse released, capture the selected area."""
         if event.button() == Qt.LeftButton:
-            #Get end coordinates
-            self.end = event.pos()
-            #Hide QSplashScreen
-            self.rubberband.hide()
-            self.hide()
-
-            x_pos = 0
-            y_pos = 0
-            width = 0
-            height = 0
-            #Creates proper coordinates even if mouse traveled right to left or bottom to top
-            if self.end.x() - self.origin.x() > 0:
-                x_pos = self.origin.x()
-                width = self.end.x() - self.origin.x()
-            else:
-                x_pos = self.end.x()
-                width = self.origin.x() - self.end.x()
-
-            if self.end.y() - self.origin.y() > 0:
-                y_pos = self.origin.y()
-                height = self.end.y() - self.origin.y()
-            else:
-                y_pos = self.end.y()
-                height = self.origin.y() - self.end.y()
-
-            screen = QGuiApplication.primaryScreen()
-            #Corrects grabWindow to the right coordinates if x_min or y_min are negative
-            selected_pixel_map = screen.grabWindow(0, x_pos+self.x_min, y_pos+self.y_min, width, height)
-            #Convert QPixmap to PIL Image and OCR image
-            self.mainwindow.read_image_buffer(selected_pixel_map)
-            
-            if self.mainwindow.auto_save_img:
-                #Save screenshot snippet as png file if save_img_textbox is checked
-                date_string = get_time_string()
-                save_path = self.mainwindow.get_save_folder("saveimgpath")
-                full_path = f"{save_path}{date_string}.png"
-                selected_pixel_map.save(full_path, "png")
-
-            #Return to MainWindow
-            self.mainwindow.show()
-
-#Dictionary to convert TesseractOCR language codes to their full names
-lang_codes_dict = {
-    "afr": "Afrikaans",
-    "amh": "Amharic",
-    "ara": "Arabic",
-    "asm": "Assamese",
-    "aze": "Azerbaijani",
-    "aze_cyrl": "Azerbaijani - Cyrilic",
-    "bel": "Belarusian",
-    "ben": "Bengali",
-    "bod": "Tibetan",
-    "bos": "Bosnian",
-    "bre": "Breton",
-    "bul": "Bulgarian",
-    "cat": "Catalan; Valencian",
-    "ceb": "Cebuano",
-    "ces": "Czech",
-    "chi_sim": "Chinese - Simplified",
-    "chi_tra": "Chinese - Traditional",
-    "chr": "Cherokee",
-    "cos": "Corsican",
-    "cym": "Welsh",
-    "dan": "Danish",
-    "dan_frak": "Danish - Fraktur (contrib)",
-    "deu": "German",
-    "deu_frak": "German - Fraktur (contrib)",
-    "dzo": "Dzongkha",
-    "ell": "Greek, Modern (1453-)",
-    "eng": "English",
-    "enm": "English, Middle (1100-1500)",
-    "epo": "Esperanto",
-    "equ": "Math / equation detection module",
-    "est": "Estonian",
-    "eus": "Basque",
-    "fao": "Faroese",
-    "fas": "Persian",
-    "fil": "Filipino (old - Tagalog)",
-    "fin": "Finnish",
-    "fra": "French",
-    "frk": "German - Fraktur",
-    "frm": "French, Middle (ca.1400-1600)",
-    "fry": "Western Frisian",
-    "gla": "Scottish Gaelic",
-    "gle": "Irish",
-    "glg": "Galician",
-    "grc": "Greek, Ancient (to 1453) (contrib)",
-    "guj": "Gujarati",
-    "hat": "Haitian; Haitian Creole",
-    "heb": "Hebrew",
-    "hin": "Hindi",
-    "hrv": "Croatian",
-    "hun": "Hungarian",
-    "hye": "Armenian",
-    "iku": "Inuktitut",
-    "ind": "Indonesian",
-    "isl": "Icelandic",
-    "ita": "Italian",
-    "ita_old": "Italian - Old",
-    "jav": "Javanese",
-    "jpn": "Japanese",
-    "kan": "Kannada",
-    "kat": "Georgian",
-    "kat_old": "Georgian - Old",
-    "kaz": "Kazakh",
-    "khm": "Central Khmer",
-    "kir": "Kirghiz; Kyrgyz",
-    "kmr": "Kurmanji (Kurdish - Latin Script)",
-    "kor": "Korean",
-    "kor_vert": "Korean (vertical)",
-    "kur": "Kurdish (Arabic Script)",
-    "lao": "Lao",
-    "lat": "Latin",
-    "lav": "Latvian",
-    "lit": "Lithuanian",
-    "ltz": "Luxembourgish",
-    "mal": "Malayalam",
-    "mar": "Marathi",
-    "mkd": "Macedonian",
-    "mlt": "Maltese",
-    "mon": "Mongolian",
-    "mri": "Maori",
-    "msa": "Malay",
-    "mya": "Burmese",
-    "nep": "Nepali",
-    "nld": "Dutch; Flemish",
-    "nor": "Norwegian",
-    "oci": "Occitan (post 1500)",
-    "ori": "Oriya",
-    "osd": "Orientation and script detection module",
-    "pan": "Panjabi; Punjabi",
-    "pol": "Polish",
-    "por": "Portuguese",
-    "pus": "Pushto; Pashto",
-    "que": "Quechua",
-    "ron": "Romanian; Moldavian; Moldovan",
-    "rus": "Russian",
-    "san": "Sanskrit",
-    "sin": "Sinhala; Sinhalese",
-    "slk": "Slovak",
-    "slk_frak": "Slovak - Fraktur (contrib)",
-    "slv": "Slovenian",
-    "snd": "Sindhi",
-    "spa": "Spanish; Castilian",
-    "spa_old": "Spanish; Castilian - Old",
-    "sqi": "Albanian",
-    "srp": "Serbian",
-    "srp_latn": "Serbian - Latin",
-    "sun": "Sundanese",
-    "swa": "Swahili",
-    "swe": "Swedish",
-    "syr": "Syriac",
-    "tam": "Tamil",
-    "tat": "Tatar",
-    "tel": "Telugu",
-    "tgk": "Tajik",
-    "tgl": "Tagalog (new - Filipino)",
-    "tha": "Thai",
-    "tir": "Tigrinya",
-    "ton": "Tonga",
-    "tur": "Turkish",
-    "uig": "Uighur; Uyghur",
-    "ukr": "Ukrainian",
-    "urd": "Urdu",
-    "uzb": "Uzbek",
-    "uzb_cyrl": "Uzbek - Cyrilic",
-    "vie": "Vietnamese",
-    "yid": "Yiddish",
-    "yor": "Yoruba"
-}
+            self.snippet.finish_selection(event.globalPos())
+
+class MetricsDialog(QDialog):
+    """Dialog listing the recorded timings of every measured step, refreshed every second."""
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.setWindowTitle("Metrics")
+        self.resize(560, 320)
+        #Checkbox that turns recording of timings on or off
+        self.record_checkbox = QCheckBox("Record timings", self)
+        self.record_checkbox.setChecked(metrics.enabled)
+        self.record_checkbox.stateChanged.connect(self.record_clicked)
+        #Button that forgets all recorded timings
+        self.reset_button = QPushButton("Reset", self)
+        self.reset_button.clicked.connect(self.reset_clicked)
+        #Table of timings in milliseconds
+        self.table = QPlainTextEdit(self)
+        self.table.setReadOnly(True)
+        self.table.setFont(QFont("courier", 10))
+        self.table.setLineWrapMode(QPlainTextEdit.NoWrap)
+
+        buttons = QHBoxLayout()
+        buttons.addWidget(self.record_checkbox)
+        buttons.addStretch()
+        buttons.addWidget(self.reset_button)
+        layout = QVBoxLayout(self)
+        layout.addLayout(buttons)
+        layout.addWidget(self.table)
+
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.timeout.connect(self.refresh)
+        self.refresh_timer.start(1000)
+        self.refresh()
+
+    def refresh(self):
+        """Show the current timings."""
+        if not self.isVisible() and self.table.toPlainText() != "":
+            return
+        summaries = metrics.snapshot()
+        if not summaries:
+            self.table.setPlainText("Nothing recorded yet." if metrics.enabled else
+                                    "Recording is off. Check 'Record timings' to measure capturing, reading and saving.")
+            return
+        lines = [f"{'step':<20}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}{'last ms':>10}"]
+        for name, summary in summaries.items():
+            lines.append(f"{name:<20}{summary['count']:>7}{summary['p50_seconds'] * 1000:>10.1f}"
+                         f"{summary['p95_seconds'] * 1000:>10.1f}{summary['max_seconds'] * 1000:>10.1f}"
+                         f"{summary['last_seconds'] * 1000:>10.1f}")
+        self.table.setPlainText("\n".join(lines))
+
+    def record_clicked(self):
+        """Turn recording of timings on or off and save the setting to config.ini."""
+        config.set("USERCONFIG", "metrics_enabled", str(self.record_checkbox.isChecked()))
+        start_metrics()
+        self.refresh()
+
+    def reset_clicked(self):
+        """Forget all recorded timings."""
+        metrics.reset()
+        self.refresh()
+
+class HistoryDialog(QDialog):
+    """Dialog for searching the recorded OCR results while typing, newest matches first."""
+    #Number of matches listed
+    MAX_RESULTS = 200
+    #Milliseconds after the last keystroke before searching
+    SEARCH_DELAY = 120
+
+    def __init__(self, parent, history):
+        super().__init__(parent)
+        self.setWindowTitle("History")
+        self.resize(640, 480)
+        self.history = history
+        #Search field, words must all appear, "quoted text" as a phrase and the last word may be unfinished
+        self.search_field = QLineEdit(self)
+        self.search_field.setPlaceholderText('Search, e.g. invoice "order number"')
+        self.search_field.setClearButtonEnabled(True)
+        self.search_field.textChanged.connect(self.search_changed)
+        #Number of matches and how long the search took
+        self.status_label = QLabel(self)
+        #Matching entries with their date, source and an excerpt
+        self.results_list = QListWidget(self)
+        self.results_list.currentItemChanged.connect(self.entry_selected)
+        self.results_list.itemDoubleClicked.connect(self.entry_opened)
+        #Whole text of the selected entry
+        self.preview = QPlainTextEdit(self)
+        self.preview.setReadOnly(True)
+        #Button that shows the selected entry in the main window
+        self.open_button = QPushButton("Show in main window", self)
+        self.open_button.clicked.connect(lambda: self.entry_opened(self.results_list.currentItem()))
+
+        buttons = QHBoxLayout()
+        buttons.addWidget(self.status_label)
+        buttons.addStretch()
+        buttons.addWidget(self.open_button)
+        layout = QVBoxLayout(self)
+        layout.addWidget(self.search_field)
+        layout.addWidget(self.results_list, 3)
+        layout.addWidget(self.preview, 2)
+        layout.addLayout(buttons)
+
+        #Search once typing pauses instead of on every keystroke
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.timeout.connect(self.refresh)
+
+    def search_changed(self):
+        """Search again shortly after the search text changed."""
+        self.search_timer.start(self.SEARCH_DELAY)
+
+    def refresh(self):
+        """List entries matching the search text."""
+        start_time = time.perf_counter()
+        try:
+            entries = self.history.search(self.search_field.text(), self.MAX_RESULTS)
+        except Exception as e:
+            self.status_label.setText(f"Could not search the history: {e}")
+            return
+        milliseconds = (time.perf_counter() - start_time) * 1000
+        self.results_list.clear()
+        self.preview.clear()
+        for entry in entries:
+            excerpt = " ".join(entry.text.split())
+            item = QListWidgetItem(f"{datetime.fromtimestamp(entry.created):%Y-%m-%d %H:%M}  {entry.source}  "
+                                   f"[{entry.lang}]\n{excerpt}")
+            item.setData(Qt.UserRole, entry.id)
+            if entry.thumbnail:
+                item.setToolTip(self.thumbnail_text(entry.thumbnail))
+            self.results_list.addItem(item)
+        more = "+" if len(entries) >= self.MAX_RESULTS else ""
+        self.status_label.setText(f"{len(entries)}{more} entries ({milliseconds:.0f} ms)")
+
+    def thumbnail_text(self, thumbnail) -> str:
+        """Return tooltip naming the saved image of an entry, looking up images saved to a snippet archive."""
+        from image_archive import REFERENCE_PREFIX
+        if not thumbnail.startswith(REFERENCE_PREFIX):
+            return f"Saved image: {thumbnail}"
+        folder, name = os.path.split(thumbnail[len(REFERENCE_PREFIX):])
+        archive = self.parent().get_image_archive(folder)
+        try:
+            location = archive.lookup(name)
+        except Exception as e:
+            return f"Saved image: {name} (archive could not be read: {e})"
+        if location is None:
+            return f"Saved image: {name} (not in the snippet archive)"
+        return f"Saved image: {name} in {archive.shard_path(location[0])}"
+
+    def entry_selected(self, item):
+        """Show whole text of the selected entry."""
+        entry = self.history.get(item.data(Qt.UserRole)) if item is not None else None
+        self.preview.setPlainText(entry.text if entry is not None else "")
+
+    def entry_opened(self, item):
+        """Show selected entry in the main window."""
+        entry = self.history.get(item.data(Qt.UserRole)) if item is not None else None
+        if entry is not None:
+            self.parent().show_history_entry(entry.text)
 
 class ErrorWindow(QWidget):
     """
@@ -1082,7 +1817,6 @@ class ErrorWindow(QWidget):
         if check:
             ocr.pytesseract.tesseract_cmd = file
             config.set("USERCONFIG", "tesseract_path", file)
-            write_config()
             try:
                 #If selected file is valid
                 mw = MainWindow()
@@ -1110,6 +1844,12 @@ def unexpected_error(exception):
 
 def main():
     """Main function."""
+    global config
+    #Changes variables to saved settings in config.ini, or creates default config.ini if it doesn't exist
+    config = ocr_core.load_config()
+    ocr.pytesseract.tesseract_cmd = config.get("USERCONFIG", "tesseract_path")
+    #Start timing spans before the window loads languages
+    start_metrics()
     app = QApplication([])
     try:
         mw = MainWindow()
@@ -1118,7 +1858,11 @@ def main():
         ErrorWindow()
     except Exception as e:
         unexpected_error(str(e))
-    sys.exit(app.exec_())
+    exit_code = app.exec_()
+    if metrics_exporter is not None:
+        #Write the final timings
+        metrics_exporter.stop()
+    sys.exit(exit_code)
 
 
 if __name__ == "__main__":
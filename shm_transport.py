@@ -0,0 +1,190 @@
+"""
+Hand images to worker processes through shared memory instead of pickling them into a pipe.
+
+The sending process copies the raw pixels of an image once into a slot, a shared memory block taken from a pool,
+and sends only the slot name, mode and size. Images created in a slot with wrap (such as screen captures decoded
+straight into one) are sent without copying them again. The worker maps the block as a NumPy array without copying it. Slots
+are reference counted and go back to the pool when the last reference is released, and blocks are kept and reused
+for later images of the same or a smaller size, so a steady stream of captures allocates no new shared memory.
+"""
+import threading
+import weakref
+from collections import OrderedDict
+from multiprocessing import shared_memory
+import numpy as np
+
+#Smallest block created, images smaller than this share the same block size
+MIN_BLOCK_SIZE = 1 << 20
+#Modes sent as they are, other modes are converted to RGB first
+SHARED_MODES = {"L": 1, "RGB": 3, "RGBA": 4}
+#Number of blocks a worker keeps mapped
+MAX_ATTACHED = 8
+#Python 3.13 can map a block without registering it with the resource tracker, which would remove it on exit
+TRACK_ARGUMENT = "track" in shared_memory.SharedMemory.__init__.__code__.co_varnames
+
+
+def block_size(nbytes) -> int:
+    """Return size of the block created for nbytes, the next power of two of at least MIN_BLOCK_SIZE."""
+    return max(MIN_BLOCK_SIZE, 1 << (max(1, nbytes) - 1).bit_length())
+
+
+class Slot:
+    """Shared memory block of a SharedImagePool and the number of references to the image in it."""
+    def __init__(self, pool, size):
+        self.pool = pool
+        self.block = shared_memory.SharedMemory(create=True, size=size)
+        self.name = self.block.name
+        self.size = size
+        self.refcount = 0
+
+    def retain(self):
+        """Add a reference, for every further user of the image in the slot."""
+        with self.pool.lock:
+            self.refcount += 1
+
+    def release(self):
+        """Remove a reference, the slot goes back to the pool when none are left."""
+        self.pool.release(self)
+
+
+class SharedImagePool:
+    """
+    Pool of at most max_slots shared memory blocks images are written into.
+
+    Blocks are only created when no free block is large enough, replacing the smallest free one once max_slots
+    exist. If every block is in use, write returns None and the caller should send the image another way.
+    """
+    def __init__(self, max_slots=8):
+        self.max_slots = max(1, max_slots)
+        self.slots = []
+        self.lock = threading.Lock()
+        #Number of blocks created, stays the same while a steady stream of images reuses them
+        self.created = 0
+        #PIL Images whose pixels are in a slot, created with wrap (k = id of the Image, v = Slot)
+        self.images = {}
+
+    def acquire(self, nbytes):
+        """Return a free slot of at least nbytes with one reference, or None if every slot is in use."""
+        with self.lock:
+            free = [slot for slot in self.slots if slot.refcount == 0]
+            fitting = [slot for slot in free if slot.size >= nbytes]
+            if fitting:
+                slot = min(fitting, key=lambda slot: slot.size)
+            else:
+                if len(self.slots) >= self.max_slots:
+                    if not free:
+                        return None
+                    smallest = min(free, key=lambda slot: slot.size)
+                    self.slots.remove(smallest)
+                    self.destroy(smallest)
+                slot = Slot(self, block_size(nbytes))
+                self.slots.append(slot)
+                self.created += 1
+            slot.refcount = 1
+            return slot
+
+    def release(self, slot):
+        """Remove a reference to slot."""
+        with self.lock:
+            slot.refcount -= 1
+            if slot.refcount < 0:
+                raise RuntimeError(f"Slot '{slot.name}' was released more often than retained")
+
+    def wrap(self, slot, size):
+        """
+        Return RGBA PIL Image of size using the pixels written to slot without copying them.
+
+        Takes over the reference to slot, which is released when the Image is garbage collected. Until then write
+        hands the Image to workers without copying it.
+        """
+        from PIL import Image
+        width, height = size
+        image = Image.frombuffer("RGBA", size, slot.block.buf[:width * height * 4], "raw", "RGBA", 0, 1)
+        key = id(image)
+        with self.lock:
+            self.images[key] = slot
+        weakref.finalize(image, self.forget, key, slot)
+        return image
+
+    def forget(self, key, slot):
+        """Release slot of a garbage collected Image created with wrap."""
+        with self.lock:
+            self.images.pop(key, None)
+        slot.release()
+
+    def write(self, image) -> tuple:
+        """
+        Copy pixels of PIL Image into a free slot, return (slot, mode, size) or None if every slot is in use.
+
+        Images created with wrap are already in a slot and only get another reference. Images in modes other
+        than L, RGB and RGBA are converted to RGB.
+        """
+        with self.lock:
+            slot = self.images.get(id(image))
+            if slot is not None:
+                slot.refcount += 1
+        if slot is not None:
+            return slot, image.mode, image.size
+        if image.mode not in SHARED_MODES:
+            image = image.convert("RGB")
+        channels = SHARED_MODES[image.mode]
+        shape = (image.height, image.width, channels) if channels > 1 else (image.height, image.width)
+        nbytes = image.width * image.height * channels
+        slot = self.acquire(nbytes)
+        if slot is None:
+            return None
+        target = np.ndarray(shape, dtype=np.uint8, buffer=slot.block.buf)
+        #np.asarray makes the only copy of the pixels that isn't in shared memory
+        target[...] = np.asarray(image)
+        #Drop the view so the block can be closed while it is not in use
+        del target
+        return slot, image.mode, image.size
+
+    @staticmethod
+    def destroy(slot):
+        """Close and remove the block of slot."""
+        try:
+            slot.block.close()
+        except BufferError:
+            #An Image created with wrap still uses the block, it is unmapped once that Image is gone
+            pass
+        slot.block.unlink()
+
+    def close(self):
+        """Remove every block, images still being read keep their mapping until the reader closes it."""
+        with self.lock:
+            slots, self.slots = self.slots, []
+        for slot in slots:
+            self.destroy(slot)
+
+
+class AttachedBlocks:
+    """Blocks mapped in a worker process, the most recently used MAX_ATTACHED stay mapped between images."""
+    def __init__(self, max_attached=MAX_ATTACHED):
+        self.max_attached = max_attached
+        #Mapped blocks, least recently used first (k = block name, v = SharedMemory)
+        self.blocks = OrderedDict()
+
+    def view(self, name, mode, size) -> np.ndarray:
+        """Return array of shape (height, width[, channels]) sharing the pixels in block name."""
+        block = self.blocks.get(name)
+        if block is None:
+            #Blocks are owned by the pool, the worker only maps them
+            if TRACK_ARGUMENT:
+                block = shared_memory.SharedMemory(name=name, track=False)
+            else:
+                block = shared_memory.SharedMemory(name=name)
+            self.blocks[name] = block
+            while len(self.blocks) > self.max_attached:
+                self.blocks.popitem(last=False)[1].close()
+        self.blocks.move_to_end(name)
+        width, height = size
+        channels = SHARED_MODES[mode]
+        shape = (height, width, channels) if channels > 1 else (height, width)
+        return np.ndarray(shape, dtype=np.uint8, buffer=block.buf)
+
+    def close(self):
+        """Unmap every block."""
+        for block in self.blocks.values():
+            block.close()
+        self.blocks.clear()
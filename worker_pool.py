@@ -0,0 +1,276 @@
+"""
+OCR engine that reads images in a pool of persistent worker processes.
+
+Every worker process keeps its own engine (normally "capi", which keeps the models of the language combinations
+it read last loaded), so a job sent to a worker that already read its language combination skips loading models.
+Jobs go to an idle worker that has the combination loaded, then to a newly started worker while the pool is smaller
+than size, then to the least recently used idle worker. Workers idle for longer than idle_timeout are stopped, and
+a worker that crashes is replaced and its job is read once more by another worker.
+
+Images are handed to the workers through shared memory (see shm_transport), falling back to sending the pixels
+through the pipe while every shared memory slot is in use.
+"""
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+import metrics
+
+#Engine the workers read images with
+DEFAULT_WORKER_ENGINE = "capi"
+#Seconds a worker may stay idle before it is stopped, 0 keeps workers running
+DEFAULT_IDLE_TIMEOUT = 300.0
+#Seconds close waits for a worker to exit before killing it
+STOP_TIMEOUT = 5.0
+
+
+def run_worker(conn, engine_name, tesseract_cmd, max_loaded, timeout):
+    """
+    Read images received on conn until None is received, sending back (True, text) or (False, error).
+
+    The fallback_reason of the engine (None if engine_name could be loaded) is sent first. Jobs with tsv set are
+    answered with Tesseract TSV output instead of plain text.
+    """
+    import pytesseract
+    from PIL import Image
+    import ocr_engine
+    from shm_transport import AttachedBlocks, SHARED_MODES
+    pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+    engine = ocr_engine.get_engine(engine_name, tesseract_cmd, max_loaded, timeout)
+    attached = AttachedBlocks()
+    try:
+        conn.send(getattr(engine, "fallback_reason", None))
+        while True:
+            try:
+                job = conn.recv()
+            except (EOFError, OSError):
+                #Pool was closed without saying so
+                return
+            if job is None:
+                return
+            lang, mode, size, data, info, tsv = job
+            read_image = engine.image_to_data if tsv else engine.image_to_string
+            try:
+                if isinstance(data, str):
+                    #Name of a shared memory block holding the pixels
+                    pixels = attached.view(data, mode, size)
+                    if hasattr(engine, "pixels_to_string"):
+                        dpi = info.get("dpi", (ocr_engine.DEFAULT_DPI,))[0] or ocr_engine.DEFAULT_DPI
+                        text = engine.pixels_to_string(pixels.ctypes.data, size[0], size[1], SHARED_MODES[mode],
+                                                       dpi, lang, tsv)
+                    else:
+                        image = Image.fromarray(pixels)
+                        image.info.update(info)
+                        text = read_image(image, lang)
+                        del image
+                    #The block can only be unmapped once no array uses it
+                    del pixels
+                else:
+                    image = Image.frombytes(mode, size, data)
+                    image.info.update(info)
+                    text = read_image(image, lang)
+                conn.send((True, text))
+            except Exception as e:
+                conn.send((False, str(e) or type(e).__name__))
+    finally:
+        attached.close()
+        engine.close()
+
+
+class WorkerCrashed(Exception):
+    """Raised when a worker process exits while reading an image."""
+
+
+class PoolWorker:
+    """One worker process and the language combinations it has loaded."""
+    def __init__(self, context, engine_name, tesseract_cmd, max_loaded, timeout):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=run_worker, name="OcrWorker", daemon=True,
+                                       args=(child_conn, engine_name, tesseract_cmd, max_loaded, timeout))
+        self.process.start()
+        #The child has its own copy, closing this one lets recv notice when the child exits
+        child_conn.close()
+        self.max_loaded = max(1, max_loaded)
+        #Language parameter strings read by the worker, least recently used first, mirrors what it keeps loaded
+        self.langs = OrderedDict()
+        self.busy = False
+        self.last_used = time.monotonic()
+        #Whether the fallback_reason the worker sends once its engine is loaded was received
+        self.started = False
+        self.fallback_reason = None
+
+    def read(self, image, lang, shared=None, tsv=False) -> tuple:
+        """
+        Send image to the worker and return (True, text) or (False, error message), text being TSV if tsv is True.
+
+        shared is (slot, mode, size) of the image already written to shared memory, or None to send the pixels.
+        """
+        info = {"dpi": image.info["dpi"]} if "dpi" in image.info else {}
+        if shared is not None:
+            slot, mode, size = shared
+            job = (lang, mode, size, slot.name, info, tsv)
+        else:
+            if image.mode not in ("1", "L", "LA", "RGB", "RGBA"):
+                #Palette and other modes can't be rebuilt from their raw bytes alone
+                image = image.convert("RGB")
+            job = (lang, image.mode, image.size, image.tobytes(), info, tsv)
+        try:
+            if not self.started:
+                self.fallback_reason = self.conn.recv()
+                self.started = True
+            self.conn.send(job)
+            result = self.conn.recv()
+        except (EOFError, OSError):
+            raise WorkerCrashed()
+        self.langs[lang] = None
+        self.langs.move_to_end(lang)
+        while len(self.langs) > self.max_loaded:
+            self.langs.popitem(last=False)
+        return result
+
+    def stop(self, timeout=STOP_TIMEOUT):
+        """Ask the worker to exit and kill it if it doesn't."""
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+class WorkerPool:
+    """
+    OCR engine reading images in up to size worker processes (0 uses the number of cores), see module docstring.
+
+    image_to_string may be called from any number of threads, calls beyond size wait for a free worker.
+    """
+    name = "pool"
+
+    def __init__(self, engine_name=DEFAULT_WORKER_ENGINE, tesseract_cmd=None, size=0, max_loaded=3, timeout=0,
+                 idle_timeout=DEFAULT_IDLE_TIMEOUT, shared_memory=True):
+        self.engine_name = engine_name
+        self.tesseract_cmd = tesseract_cmd
+        self.size = size if size > 0 else os.cpu_count() or 1
+        self.max_loaded = max_loaded
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        #Workers are started fresh instead of forked, forking a process with GUI threads isn't safe
+        self.context = multiprocessing.get_context("spawn")
+        self.workers = []
+        self.condition = threading.Condition()
+        self.closed = False
+        #Why the workers read with another engine than engine_name, None unless a worker had to fall back
+        self.fallback_reason = None
+        #Shared memory images are handed to workers through, None sends the pixels through the pipe
+        self.shared_images = None
+        if shared_memory:
+            try:
+                from shm_transport import SharedImagePool
+                #Every worker reading plus one image being written per worker
+                self.shared_images = SharedImagePool(self.size * 2)
+            except ImportError:
+                pass
+        if idle_timeout > 0:
+            threading.Thread(target=self.reap_idle, name="WorkerPoolReaper", daemon=True).start()
+
+    def acquire(self, lang) -> PoolWorker:
+        """Return an idle worker for lang and mark it busy, starting a new one or waiting if needed."""
+        with self.condition:
+            while True:
+                if self.closed:
+                    raise RuntimeError("Worker pool is closed")
+                idle = [worker for worker in self.workers if not worker.busy]
+                warm = [worker for worker in idle if lang in worker.langs]
+                if warm:
+                    worker = max(warm, key=lambda worker: worker.last_used)
+                elif len(self.workers) < self.size:
+                    with metrics.span("pool_spawn"):
+                        worker = PoolWorker(self.context, self.engine_name, self.tesseract_cmd, self.max_loaded,
+                                            self.timeout)
+                    self.workers.append(worker)
+                elif idle:
+                    #Evict the combination used longest ago instead of one another job may need soon
+                    worker = min(idle, key=lambda worker: worker.last_used)
+                else:
+                    self.condition.wait()
+                    continue
+                worker.busy = True
+                return worker
+
+    def release(self, worker, crashed=False):
+        """Mark worker idle again, or remove it if it crashed."""
+        with self.condition:
+            worker.busy = False
+            worker.last_used = time.monotonic()
+            if crashed:
+                self.workers.remove(worker)
+            self.condition.notify()
+        if crashed:
+            worker.stop(0)
+
+    def image_to_string(self, image, lang) -> str:
+        """Return text read from PIL Image with the language parameter string lang by a worker process."""
+        return self.read(image, lang, False)
+
+    def image_to_data(self, image, lang) -> str:
+        """Return words read from PIL Image with their boxes and confidences as Tesseract TSV by a worker process."""
+        return self.read(image, lang, True)
+
+    def read(self, image, lang, tsv) -> str:
+        """Return text or TSV read from PIL Image by a worker process, trying another worker if it crashes."""
+        from ocr_engine import EngineError
+        shared = None
+        if self.shared_images is not None:
+            with metrics.span("pool_write_shared"):
+                shared = self.shared_images.write(image)
+        try:
+            for attempt in range(2):
+                with metrics.span("pool_wait"):
+                    worker = self.acquire(lang)
+                try:
+                    ok, result = worker.read(image, lang, shared, tsv)
+                except WorkerCrashed:
+                    self.release(worker, crashed=True)
+                    continue
+                if worker.fallback_reason is not None:
+                    self.fallback_reason = worker.fallback_reason
+                self.release(worker)
+                if not ok:
+                    raise EngineError(result)
+                return result
+        finally:
+            if shared is not None:
+                shared[0].release()
+        raise EngineError("OCR worker process crashed while reading the image")
+
+    def reap_idle(self):
+        """Stop workers that have been idle for longer than idle_timeout until the pool is closed."""
+        interval = max(1.0, self.idle_timeout / 4)
+        while True:
+            time.sleep(interval)
+            with self.condition:
+                if self.closed:
+                    return
+                now = time.monotonic()
+                idle = [worker for worker in self.workers
+                        if not worker.busy and now - worker.last_used > self.idle_timeout]
+                for worker in idle:
+                    self.workers.remove(worker)
+            for worker in idle:
+                worker.stop()
+
+    def close(self):
+        """Stop every worker, waiting for the ones that are reading an image."""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+            workers = list(self.workers)
+            self.workers.clear()
+        for worker in workers:
+            worker.stop()
+        if self.shared_images is not None:
+            self.shared_images.close()